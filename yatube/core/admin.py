@@ -0,0 +1,57 @@
+from django.contrib import admin
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.html import format_html
+
+from .models import OutboxMessage, RequestProfile
+
+
+class RequestProfileAdmin(admin.ModelAdmin):
+    list_display = (
+        'created', 'path', 'view_name', 'user', 'duration', 'samples',
+        'download',
+    )
+    list_filter = ('view_name', 'created')
+    search_fields = ('path',)
+    readonly_fields = (
+        'path', 'view_name', 'user', 'duration', 'samples', 'filename',
+    )
+
+    def download(self, obj):
+        links = (
+            (reverse('core:profile_download', args=(obj.pk, fmt)), fmt)
+            for fmt in ('speedscope', 'collapsed')
+        )
+        return format_html(
+            '<a href="{}">{}</a> / <a href="{}">{}</a>',
+            *(part for link in links for part in link)
+        )
+    download.short_description = 'Файлы'
+
+
+admin.site.register(RequestProfile, RequestProfileAdmin)
+
+
+class OutboxMessageAdmin(admin.ModelAdmin):
+    list_display = (
+        'created', 'subject', 'recipients', 'status', 'attempts', 'sent',
+    )
+    list_filter = ('status', 'created')
+    search_fields = ('subject', 'recipients')
+    exclude = ('message',)
+    readonly_fields = (
+        'from_email', 'recipients', 'subject', 'attempts', 'last_error',
+        'sent',
+    )
+    actions = ('retry',)
+
+    def retry(self, request, queryset):
+        updated = queryset.exclude(status=OutboxMessage.SENT).update(
+            status=OutboxMessage.QUEUED, attempts=0,
+            send_after=timezone.now(),
+        )
+        self.message_user(request, f'Возвращено в очередь: {updated}')
+    retry.short_description = 'Отправить ещё раз'
+
+
+admin.site.register(OutboxMessage, OutboxMessageAdmin)
@@ -1,5 +1,37 @@
 from django.apps import AppConfig
+from django.conf import settings
+from django.db.models.signals import (
+    m2m_changed, post_delete, post_save, pre_save,
+)
 
 
 class CoreConfig(AppConfig):
     name = 'core'
+
+    def ready(self):
+        from . import auth
+        from .db import querycache, writes
+
+        post_save.connect(
+            querycache.on_save_or_delete,
+            dispatch_uid='core.querycache.save',
+        )
+        post_delete.connect(
+            querycache.on_save_or_delete,
+            dispatch_uid='core.querycache.delete',
+        )
+        m2m_changed.connect(
+            querycache.on_m2m_changed,
+            dispatch_uid='core.querycache.m2m',
+        )
+        pre_save.connect(
+            writes.track_files, dispatch_uid='core.writes.track_files',
+        )
+        post_save.connect(
+            auth.bump_user_version, sender=settings.AUTH_USER_MODEL,
+            dispatch_uid='core.auth.save',
+        )
+        post_delete.connect(
+            auth.bump_user_version, sender=settings.AUTH_USER_MODEL,
+            dispatch_uid='core.auth.delete',
+        )
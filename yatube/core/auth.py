@@ -0,0 +1,98 @@
+"""Пользователь запроса из сессии без запроса к ``auth_user``.
+
+В сессии вместе с версией хранятся только ``SESSION_USER_FIELDS`` и
+хеш для проверки сессии — хеш пароля в данные сессии не попадает.
+Остальные поля восстановленного пользователя отложены и грузятся из
+базы при обращении, как у ``.only()``; связи many-to-many (группы,
+права) — тоже. Версия лежит в кеше сессий и меняется при любом
+сохранении или удалении пользователя (смена пароля, профиля,
+``last_login``), после чего пользователь один раз загружается из базы
+заново.
+"""
+import random
+
+from django.conf import settings
+from django.contrib import auth
+from django.core.cache import caches
+from django.utils.crypto import constant_time_compare
+
+SESSION_USER_KEY = '_cached_user'
+SESSION_USER_FIELDS = ('username', 'is_active', 'is_staff', 'is_superuser')
+
+
+def _version_key(user_id):
+    return f'core.auth.user_version:{user_id}'
+
+
+def user_version(user_id):
+    cache = caches[settings.SESSION_CACHE_ALIAS]
+    key = _version_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, random.getrandbits(63), None)
+        version = cache.get(key)
+    return version
+
+
+def bump_user_version(sender, instance, **kwargs):
+    caches[settings.SESSION_CACHE_ALIAS].set(
+        _version_key(instance.pk), random.getrandbits(63), None
+    )
+
+
+def _session_fields(model):
+    """Поля из сессии в порядке полей модели, как ждёт ``from_db``."""
+    return [
+        field.attname for field in model._meta.concrete_fields
+        if field.primary_key or field.attname in SESSION_USER_FIELDS
+    ]
+
+
+def _from_session(session, user_id, version):
+    try:
+        stored_version, values, auth_hash = session[SESSION_USER_KEY]
+        backend = session[auth.BACKEND_SESSION_KEY]
+    except (KeyError, ValueError, TypeError):
+        return None
+    if stored_version != version or (
+            backend not in settings.AUTHENTICATION_BACKENDS):
+        return None
+    if not constant_time_compare(
+            session.get(auth.HASH_SESSION_KEY, ''), auth_hash):
+        return None
+    model = auth.get_user_model()
+    names = _session_fields(model)
+    try:
+        user = model.from_db(None, names, [values[name] for name in names])
+    except KeyError:
+        return None
+    if str(user.pk) != str(user_id):
+        return None
+    user.backend = backend
+    return user
+
+
+def _to_session(user):
+    return {name: getattr(user, name) for name in _session_fields(user)}
+
+
+def get_user(request):
+    """Как ``django.contrib.auth.get_user``, но сначала из сессии.
+
+    Версия читается до загрузки из базы, чтобы изменение пользователя
+    между этими шагами не сохранилось в сессии под новой версией.
+    """
+    try:
+        user_id = auth._get_user_session_key(request)
+    except KeyError:
+        return auth.get_user(request)
+    version = user_version(user_id)
+    user = _from_session(request.session, user_id, version)
+    if user is not None:
+        return user
+    user = auth.get_user(request)
+    if user.is_authenticated:
+        request.session[SESSION_USER_KEY] = (
+            version, _to_session(user), user.get_session_auth_hash(),
+        )
+    return user
@@ -0,0 +1,336 @@
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import caches
+from django.core.cache.backends import filebased, locmem
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+from ..metrics import CACHE_REQUESTS
+from .generations import GenerationTable
+from .shm import SharedMemoryStore
+
+_MISSING = object()
+_generation_tables = {}
+_l1_caches = {}
+_shm_stores = {}
+
+
+class MetricsCacheMixin:
+    """Считает попадания и промахи кеша.
+
+    Имя алиаса для метки берётся из ``OPTIONS['ALIAS']``, так как сам
+    бэкенд не знает, под каким алиасом он подключён.
+    """
+
+    def __init__(self, location, params):
+        super().__init__(location, params)
+        self.metrics_alias = params.get('OPTIONS', {}).get(
+            'ALIAS', location or 'default'
+        )
+
+    def get(self, key, default=None, version=None):
+        value = super().get(key, _MISSING, version=version)
+        if value is _MISSING:
+            CACHE_REQUESTS.inc(alias=self.metrics_alias, result='miss')
+            return default
+        CACHE_REQUESTS.inc(alias=self.metrics_alias, result='hit')
+        return value
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        found = super().get_many(keys, version=version)
+        if found:
+            CACHE_REQUESTS.inc(
+                len(found), alias=self.metrics_alias, result='hit'
+            )
+        if len(keys) > len(found):
+            CACHE_REQUESTS.inc(
+                len(keys) - len(found),
+                alias=self.metrics_alias,
+                result='miss',
+            )
+        return found
+
+
+class LocMemCache(MetricsCacheMixin, locmem.LocMemCache):
+    pass
+
+
+class FileBasedCache(MetricsCacheMixin, filebased.FileBasedCache):
+    pass
+
+
+class BaseTwoTierCache(BaseCache):
+    """Маленький LRU в процессе поверх общего кеша.
+
+    ``LOCATION`` — путь к файлу поколений, ``OPTIONS``:
+
+    * ``L2`` — алиас общего кеша из ``CACHES`` (файловый, SQLite, mmap);
+    * ``L1_MAX_ENTRIES`` — размер LRU процесса;
+    * ``L1_TIMEOUT`` — сколько держать в L1 значение, прочитанное из L2;
+    * ``GENERATION_SLOTS`` — число слотов в файле поколений.
+
+    Каждая запись, удаление или ``clear`` меняют поколение ключа в
+    файле, отображённом в память всеми воркерами, и при следующем
+    чтении остальные процессы видят, что их копия в L1 устарела.
+
+    В L2 значение лежит вместе со временем истечения: L1 держит копию не
+    дольше ``L1_TIMEOUT`` и не дольше, чем значение проживёт в L2.
+    Поэтому ``incr`` и ``touch`` перезаписывают значение и не атомарны.
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._l2_alias = options['L2']
+        self._l1_max_entries = options.get('L1_MAX_ENTRIES', 1000)
+        self._l1_timeout = options.get('L1_TIMEOUT', 60)
+        if location not in _generation_tables:
+            _generation_tables[location] = GenerationTable(
+                location, options.get('GENERATION_SLOTS', 4096)
+            )
+        self._generations = _generation_tables[location]
+        self._l1, self._lock = _l1_caches.setdefault(
+            location, (OrderedDict(), threading.Lock())
+        )
+
+    @property
+    def l2(self):
+        return caches[self._l2_alias]
+
+    def _l1_get(self, key):
+        with self._lock:
+            entry = self._l1.get(key)
+            if entry is None:
+                return _MISSING
+            value, expires, generation = entry
+            if expires < time.monotonic() or (
+                    generation != self._generations.get(key)):
+                del self._l1[key]
+                return _MISSING
+            self._l1.move_to_end(key)
+            return value
+
+    def _l1_set(self, key, value, expires, generation):
+        """``expires`` — время истечения в L2 по ``time.time()`` или
+        None."""
+        timeout = self._l1_timeout
+        if expires is not None:
+            timeout = min(timeout, expires - time.time())
+        with self._lock:
+            if timeout <= 0:
+                self._l1.pop(key, None)
+                return
+            self._l1[key] = (value, time.monotonic() + timeout, generation)
+            self._l1.move_to_end(key)
+            while len(self._l1) > self._l1_max_entries:
+                self._l1.popitem(last=False)
+
+    def _l1_delete(self, key):
+        with self._lock:
+            self._l1.pop(key, None)
+
+    def get(self, key, default=None, version=None):
+        return self._get(key, default, version)
+
+    def get_many(self, keys, version=None):
+        found = {}
+        for key in keys:
+            value = self._get(key, _MISSING, version)
+            if value is not _MISSING:
+                found[key] = value
+        return found
+
+    def _get(self, key, default, version):
+        l1_key = self.make_key(key, version)
+        value = self._l1_get(l1_key)
+        if value is not _MISSING:
+            return value
+        generation = self._generations.get(l1_key)
+        stored = self.l2.get(key, _MISSING, version=version)
+        if stored is _MISSING:
+            return default
+        value, expires = stored
+        self._l1_set(l1_key, value, expires, generation)
+        return value
+
+    def _timeouts(self, timeout):
+        """Срок жизни для L2 и время истечения, которое хранится рядом со
+        значением; ``DEFAULT_TIMEOUT`` — свой, а не тот, что у L2."""
+        if timeout is DEFAULT_TIMEOUT:
+            timeout = self.default_timeout
+        return timeout, self.get_backend_timeout(timeout)
+
+    def _changed(self, key, version):
+        l1_key = self.make_key(key, version)
+        self._generations.bump(l1_key)
+        self._l1_delete(l1_key)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        l1_key = self.make_key(key, version)
+        timeout, expires = self._timeouts(timeout)
+        self.l2.set(key, (value, expires), timeout, version=version)
+        generation = self._generations.bump(l1_key)
+        self._l1_set(l1_key, value, expires, generation)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        timeout, expires = self._timeouts(timeout)
+        added = self.l2.add(key, (value, expires), timeout, version=version)
+        if added:
+            self._changed(key, version)
+        return added
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        stored = self.l2.get(key, _MISSING, version=version)
+        if stored is _MISSING:
+            return False
+        timeout, expires = self._timeouts(timeout)
+        self.l2.set(key, (stored[0], expires), timeout, version=version)
+        self._changed(key, version)
+        return True
+
+    def delete(self, key, version=None):
+        self.l2.delete(key, version=version)
+        self._changed(key, version)
+
+    def incr(self, key, delta=1, version=None):
+        stored = self.l2.get(key, _MISSING, version=version)
+        if stored is _MISSING:
+            raise ValueError("Key '%s' not found" % key)
+        value, expires = stored[0] + delta, stored[1]
+        timeout = None if expires is None else expires - time.time()
+        self.l2.set(key, (value, expires), timeout, version=version)
+        self._changed(key, version)
+        return value
+
+    def has_key(self, key, version=None):
+        return self.get(key, _MISSING, version=version) is not _MISSING
+
+    def clear(self):
+        self.l2.clear()
+        self._generations.bump_all()
+        with self._lock:
+            self._l1.clear()
+
+
+class TwoTierCache(MetricsCacheMixin, BaseTwoTierCache):
+    pass
+
+
+class BaseSharedMemoryCache(BaseCache):
+    """Кеш в общем для воркеров файле, отображённом в память.
+
+    ``LOCATION`` — путь к файлу, ``OPTIONS``: ``SIZE`` (байт),
+    ``SLOTS`` (размер хеш-таблицы), ``PAGE_SIZE`` (размер страницы слаба
+    и верхняя граница размера значения).
+    """
+
+    pickle_protocol = pickle.HIGHEST_PROTOCOL
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        if location not in _shm_stores:
+            options = params.get('OPTIONS', {})
+            _shm_stores[location] = SharedMemoryStore(
+                location,
+                size=options.get('SIZE', 64 * 1024 * 1024),
+                slots=options.get('SLOTS', 65536),
+                page_size=options.get('PAGE_SIZE', 1024 * 1024),
+            )
+        self._store = _shm_stores[location]
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key.encode('utf-8')
+
+    def _expires(self, timeout):
+        expires = self.get_backend_timeout(timeout)
+        return 0.0 if expires is None else expires
+
+    def _set(self, key, value, expires):
+        if expires and expires <= time.time():
+            self._store.delete(key)
+            return False
+        return self._store.set(
+            key, pickle.dumps(value, self.pickle_protocol), expires
+        )
+
+    def get(self, key, default=None, version=None):
+        key = self._key(key, version)
+        with self._store.locked(exclusive=False):
+            found = self._store.get(key)
+        if found is None:
+            return default
+        return pickle.loads(found[0])
+
+    def get_many(self, keys, version=None):
+        encoded = {self._key(key, version): key for key in keys}
+        found = {}
+        with self._store.locked(exclusive=False):
+            for key, original in encoded.items():
+                value = self._store.get(key)
+                if value is not None:
+                    found[original] = value[0]
+        return {key: pickle.loads(value) for key, value in found.items()}
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        with self._store.locked():
+            self._set(key, value, self._expires(timeout))
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        expires = self._expires(timeout)
+        failed = []
+        with self._store.locked():
+            for key, value in data.items():
+                if not self._set(self._key(key, version), value, expires):
+                    failed.append(key)
+        return failed
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        with self._store.locked():
+            if self._store.get(key) is not None:
+                return False
+            return self._set(key, value, self._expires(timeout))
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        with self._store.locked():
+            found = self._store.get(key)
+            if found is None:
+                return False
+            return self._store.set(key, found[0], self._expires(timeout))
+
+    def incr(self, key, delta=1, version=None):
+        key = self._key(key, version)
+        with self._store.locked():
+            found = self._store.get(key)
+            if found is None:
+                raise ValueError("Key '%s' not found" % key.decode())
+            value = pickle.loads(found[0]) + delta
+            self._store.set(
+                key, pickle.dumps(value, self.pickle_protocol), found[1]
+            )
+        return value
+
+    def delete(self, key, version=None):
+        key = self._key(key, version)
+        with self._store.locked():
+            self._store.delete(key)
+
+    def has_key(self, key, version=None):
+        key = self._key(key, version)
+        with self._store.locked(exclusive=False):
+            return self._store.get(key) is not None
+
+    def clear(self):
+        with self._store.locked():
+            self._store.clear()
+
+
+class SharedMemoryCache(MetricsCacheMixin, BaseSharedMemoryCache):
+    pass
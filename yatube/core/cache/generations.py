@@ -0,0 +1,54 @@
+import mmap
+import os
+import random
+import struct
+import zlib
+
+SLOT = struct.Struct('Q')
+
+
+class GenerationTable:
+    """Поколения ключей кеша в общем для процессов файле.
+
+    Слот 0 — общее поколение (``clear``), остальные выбираются по
+    crc32 ключа. Инвалидация записывает в слот случайное число: это
+    одна 8-байтовая запись без чтения и без блокировок, и два процесса,
+    инвалидирующих один слот одновременно, не могут записать
+    одинаковое «следующее» значение.
+    """
+
+    def __init__(self, path, slots):
+        self.slots = slots
+        size = SLOT.size * (slots + 1)
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            if os.fstat(fd).st_size < size:
+                os.ftruncate(fd, size)
+            self._map = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+
+    def _slot(self, key):
+        return 1 + zlib.crc32(key.encode('utf-8')) % self.slots
+
+    def get(self, key):
+        """Пара (общее поколение, поколение слота ключа)."""
+        return (
+            SLOT.unpack_from(self._map, 0)[0],
+            SLOT.unpack_from(self._map, SLOT.size * self._slot(key))[0],
+        )
+
+    def bump(self, key):
+        """Меняет поколение слота ключа и возвращает пару, как ``get``,
+        с записанным этим вызовом значением: повторное чтение могло бы
+        вернуть уже поколение следующей записи другого процесса."""
+        everything = SLOT.unpack_from(self._map, 0)[0]
+        generation = random.getrandbits(64)
+        SLOT.pack_into(self._map, SLOT.size * self._slot(key), generation)
+        return everything, generation
+
+    def bump_all(self):
+        SLOT.pack_into(self._map, 0, random.getrandbits(64))
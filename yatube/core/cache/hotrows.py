@@ -0,0 +1,74 @@
+"""Кеш редко меняющихся строк в памяти процесса.
+
+Поиск по уникальному полю (группа по ``slug``, пользователь по
+``username``) отдаётся из ``OrderedDict`` с вытеснением LRU и сроком
+жизни записи. Отсутствие строки тоже кешируется, на меньший срок, чтобы
+перебор адресов ботами не доходил до базы.
+
+``post_save``/``post_delete`` модели сбрасывают кеш процесса целиком;
+в других воркерах изменение видно не позже чем через ``HOT_ROW_TTL``.
+Отдаваемые объекты общие для всех запросов процесса и не должны
+изменяться.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save
+from django.http import Http404
+
+from ..db.querycache import cached
+
+_MISSING = object()
+
+
+class HotRowCache:
+    def __init__(self, model, field, maxsize=None, ttl=None,
+                 negative_ttl=None):
+        self.model = model
+        self.field = field
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._rows = OrderedDict()
+        self._lock = threading.Lock()
+        post_save.connect(self.clear, sender=model)
+        post_delete.connect(self.clear, sender=model)
+
+    def _setting(self, value, name):
+        return getattr(settings, name) if value is None else value
+
+    def get(self, value):
+        """Объект или None, если строки нет."""
+        now = time.monotonic()
+        with self._lock:
+            found, expires = self._rows.get(value, (_MISSING, 0.0))
+            if found is not _MISSING and expires > now:
+                self._rows.move_to_end(value)
+                return found
+        found = cached(self.model).filter(**{self.field: value}).first()
+        ttl = self._setting(
+            self.ttl if found is not None else self.negative_ttl,
+            'HOT_ROW_TTL' if found is not None else 'HOT_ROW_NEGATIVE_TTL',
+        )
+        with self._lock:
+            self._rows[value] = (found, now + ttl)
+            self._rows.move_to_end(value)
+            while len(self._rows) > self._setting(
+                    self.maxsize, 'HOT_ROW_CACHE_SIZE'):
+                self._rows.popitem(last=False)
+        return found
+
+    def get_or_404(self, value):
+        found = self.get(value)
+        if found is None:
+            raise Http404(
+                f'{self.model._meta.object_name} matching query does not '
+                'exist.'
+            )
+        return found
+
+    def clear(self, **kwargs):
+        with self._lock:
+            self._rows.clear()
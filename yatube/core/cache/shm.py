@@ -0,0 +1,367 @@
+"""Хранилище кеша в файле, отображённом в память всеми воркерами.
+
+Устройство файла::
+
+    заголовок | классы слабов | хеш-таблица | классы страниц | страницы
+
+Хеш-таблица с линейным пробированием хранит смещения чанков. Страницы
+(``PAGE_SIZE``) по мере надобности отдаются классам слабов и режутся на
+чанки одного размера; размеры классов растут в 1.25 раза. Когда
+свободных чанков и страниц нет, вытесняется самый давно читанный из
+нескольких случайных чанков того же класса (приближённый LRU, как в
+Redis).
+
+Между процессами записи разделяет ``fcntl.flock``, внутри процесса —
+``threading.RLock``.
+"""
+import fcntl
+import hashlib
+import mmap
+import os
+import random
+import struct
+import threading
+import time
+from contextlib import contextmanager
+
+MAGIC = b'YTSHM001'
+HEADER = struct.Struct('<8sIIIII')
+CLASS = struct.Struct('<IQ')
+SLOT = struct.Struct('<Q')
+CHUNK = struct.Struct('<QIIddI')
+PAGE_CLASS = struct.Struct('<B')
+
+MIN_CHUNK = 128
+GROWTH = 1.25
+UNASSIGNED = 255
+FREE = 0xFFFFFFFF
+EVICTION_SAMPLES = 8
+MAX_LOAD = 0.75
+
+
+def _chunk_sizes(page_size):
+    sizes = []
+    size = MIN_CHUNK
+    while size < page_size and len(sizes) < UNASSIGNED - 1:
+        sizes.append(size)
+        size = (int(size * GROWTH) + 7) & ~7
+    sizes.append(page_size)
+    return sizes
+
+
+def key_hash(key):
+    return int.from_bytes(
+        hashlib.blake2b(key, digest_size=8).digest(), 'little'
+    ) or 1
+
+
+class SharedMemoryStore:
+    def __init__(self, path, size=64 * 1024 * 1024, slots=65536,
+                 page_size=1024 * 1024):
+        self.path = path
+        self.slots = slots
+        self.page_size = page_size
+        self.sizes = _chunk_sizes(page_size)
+        self.classes_offset = HEADER.size
+        self.table_offset = self.classes_offset + CLASS.size * len(self.sizes)
+        self.page_classes_offset = self.table_offset + SLOT.size * slots
+        pages_start = self.page_classes_offset + (size // page_size)
+        self.pages_offset = (pages_start + page_size - 1) // page_size * (
+            page_size
+        )
+        self.pages = max(1, (size - self.pages_offset) // page_size)
+        self.file_size = self.pages_offset + self.pages * page_size
+        self._local = threading.RLock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._open()
+        with self._flock(fcntl.LOCK_EX):
+            if os.fstat(self._fd).st_size < self.file_size:
+                os.ftruncate(self._fd, self.file_size)
+            self._map = mmap.mmap(self._fd, self.file_size)
+            magic, slots, page_size, pages = HEADER.unpack_from(
+                self._map, 0
+            )[:4]
+            if (magic, slots, page_size, pages) != (
+                    MAGIC, self.slots, self.page_size, self.pages):
+                self._format()
+
+    def _open(self):
+        """После fork дескриптор переоткрывается: flock, взятый через
+        общий с родителем дескриптор, процессы друг от друга не отделяет.
+        """
+        self._pid = os.getpid()
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+
+    @contextmanager
+    def _flock(self, operation):
+        if self._pid != os.getpid():
+            self._open()
+        fcntl.flock(self._fd, operation)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    @contextmanager
+    def locked(self, exclusive=True):
+        with self._local, self._flock(
+                fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH):
+            yield
+
+    def _format(self):
+        self._map[:self.pages_offset] = bytes(self.pages_offset)
+        HEADER.pack_into(
+            self._map, 0, MAGIC, self.slots, self.page_size, self.pages, 0, 0
+        )
+        for index, chunk_size in enumerate(self.sizes):
+            CLASS.pack_into(
+                self._map, self.classes_offset + CLASS.size * index,
+                chunk_size, 0,
+            )
+        for page in range(self.pages):
+            self._set_page_class(page, UNASSIGNED)
+
+    # Заголовок: число страниц в работе и число ключей.
+
+    def _next_page(self):
+        return HEADER.unpack_from(self._map, 0)[4]
+
+    def _count(self):
+        return HEADER.unpack_from(self._map, 0)[5]
+
+    def _set_counters(self, next_page, count):
+        HEADER.pack_into(
+            self._map, 0, MAGIC, self.slots, self.page_size, self.pages,
+            next_page, count,
+        )
+
+    # Хеш-таблица.
+
+    def _slot(self, index):
+        return SLOT.unpack_from(
+            self._map, self.table_offset + SLOT.size * index
+        )[0]
+
+    def _set_slot(self, index, offset):
+        SLOT.pack_into(
+            self._map, self.table_offset + SLOT.size * index, offset
+        )
+
+    def _chunk(self, offset):
+        return CHUNK.unpack_from(self._map, offset)
+
+    def _find(self, key, hashed):
+        """Индекс слота ключа или None."""
+        index = hashed % self.slots
+        for _ in range(self.slots):
+            offset = self._slot(index)
+            if offset == 0:
+                return None
+            chunk_hash, key_len = self._chunk(offset)[:2]
+            start = offset + CHUNK.size
+            if chunk_hash == hashed and (
+                    self._map[start:start + key_len] == key):
+                return index
+            index = (index + 1) % self.slots
+        return None
+
+    def _remove_slot(self, index):
+        """Удаление с обратным сдвигом, без надгробий."""
+        self._set_slot(index, 0)
+        hole = index
+        current = (index + 1) % self.slots
+        while True:
+            offset = self._slot(current)
+            if offset == 0:
+                break
+            ideal = self._chunk(offset)[0] % self.slots
+            if (current > hole and (ideal <= hole or ideal > current)) or (
+                    current < hole and ideal <= hole and ideal > current):
+                self._set_slot(hole, offset)
+                self._set_chunk_slot(offset, hole)
+                self._set_slot(current, 0)
+                hole = current
+            current = (current + 1) % self.slots
+
+    def _set_chunk_slot(self, offset, index):
+        fields = list(self._chunk(offset))
+        fields[5] = index
+        CHUNK.pack_into(self._map, offset, *fields)
+
+    # Слабы.
+
+    def _class_for(self, size):
+        for index, chunk_size in enumerate(self.sizes):
+            if chunk_size >= size:
+                return index
+        return None
+
+    def _class_free(self, index):
+        return CLASS.unpack_from(
+            self._map, self.classes_offset + CLASS.size * index
+        )[1]
+
+    def _set_class_free(self, index, offset):
+        CLASS.pack_into(
+            self._map, self.classes_offset + CLASS.size * index,
+            self.sizes[index], offset,
+        )
+
+    def _page_class(self, page):
+        return PAGE_CLASS.unpack_from(
+            self._map, self.page_classes_offset + page
+        )[0]
+
+    def _set_page_class(self, page, index):
+        PAGE_CLASS.pack_into(self._map, self.page_classes_offset + page, index)
+
+    def _chunk_class(self, offset):
+        return self._page_class(
+            (offset - self.pages_offset) // self.page_size
+        )
+
+    def _free_chunk(self, offset):
+        index = self._chunk_class(offset)
+        CHUNK.pack_into(
+            self._map, offset, self._class_free(index), 0, 0, 0.0, 0.0, FREE
+        )
+        self._set_class_free(index, offset)
+
+    def _allocate(self, index):
+        offset = self._class_free(index)
+        if offset:
+            self._set_class_free(index, self._chunk(offset)[0])
+            return offset
+        next_page = self._next_page()
+        if next_page < self.pages:
+            self._set_page_class(next_page, index)
+            self._set_counters(next_page + 1, self._count())
+            chunk_size = self.sizes[index]
+            start = self.pages_offset + next_page * self.page_size
+            for offset in reversed(range(
+                    start, start + self.page_size - chunk_size + 1,
+                    chunk_size)):
+                CHUNK.pack_into(
+                    self._map, offset, self._class_free(index),
+                    0, 0, 0.0, 0.0, FREE,
+                )
+                self._set_class_free(index, offset)
+            return self._allocate(index)
+        return self._evict_from_class(index)
+
+    def _evict_from_class(self, index):
+        pages = [
+            page for page in range(self._next_page())
+            if self._page_class(page) == index
+        ]
+        if not pages:
+            return None
+        chunk_size = self.sizes[index]
+        per_page = self.page_size // chunk_size
+        victim = None
+        for _ in range(EVICTION_SAMPLES):
+            offset = (
+                self.pages_offset + random.choice(pages) * self.page_size
+                + random.randrange(per_page) * chunk_size
+            )
+            accessed, slot = self._chunk(offset)[4:]
+            if slot == FREE or self._slot(slot) != offset:
+                continue
+            if victim is None or accessed < victim[0]:
+                victim = (accessed, slot, offset)
+        if victim is None:
+            return None
+        self._remove_slot(victim[1])
+        self._set_counters(self._next_page(), self._count() - 1)
+        return victim[2]
+
+    def _evict_any(self):
+        """Вытеснение при заполненной хеш-таблице."""
+        victim = None
+        for _ in range(EVICTION_SAMPLES * 4):
+            index = random.randrange(self.slots)
+            offset = self._slot(index)
+            if offset == 0:
+                continue
+            accessed = self._chunk(offset)[4]
+            if victim is None or accessed < victim[0]:
+                victim = (accessed, index, offset)
+        if victim is not None:
+            self._delete_at(victim[1])
+
+    def _delete_at(self, index):
+        offset = self._slot(index)
+        self._remove_slot(index)
+        self._free_chunk(offset)
+        self._set_counters(self._next_page(), self._count() - 1)
+
+    # Публичные операции; вызываются под locked().
+
+    def get(self, key):
+        """Пара (байты значения, срок) или None.
+
+        Выполняется под разделяемой блокировкой, поэтому просроченный
+        ключ не удаляется, а просто не возвращается. Время последнего
+        чтения пишется без исключительной блокировки: гонка здесь лишь
+        слегка искажает порядок вытеснения.
+        """
+        index = self._find(key, key_hash(key))
+        if index is None:
+            return None
+        offset = self._slot(index)
+        chunk_hash, key_len, value_len, expires, _, slot = self._chunk(offset)
+        now = time.time()
+        if expires and expires <= now:
+            return None
+        CHUNK.pack_into(
+            self._map, offset, chunk_hash, key_len, value_len, expires,
+            now, slot,
+        )
+        start = offset + CHUNK.size + key_len
+        return bytes(self._map[start:start + value_len]), expires
+
+    def set(self, key, value, expires):
+        """Записывает значение; False, если оно не помещается в чанк."""
+        hashed = key_hash(key)
+        size = CHUNK.size + len(key) + len(value)
+        index = self._class_for(size)
+        existing = self._find(key, hashed)
+        if existing is not None:
+            self._delete_at(existing)
+        if index is None:
+            return False
+        if self._count() >= self.slots * MAX_LOAD:
+            self._evict_any()
+        offset = self._allocate(index)
+        if offset is None:
+            return False
+        slot = hashed % self.slots
+        while self._slot(slot):
+            slot = (slot + 1) % self.slots
+        CHUNK.pack_into(
+            self._map, offset, hashed, len(key), len(value), expires or 0.0,
+            time.time(), slot,
+        )
+        start = offset + CHUNK.size
+        self._map[start:start + len(key)] = key
+        self._map[start + len(key):start + len(key) + len(value)] = value
+        self._set_slot(slot, offset)
+        self._set_counters(self._next_page(), self._count() + 1)
+        return True
+
+    def delete(self, key):
+        index = self._find(key, key_hash(key))
+        if index is None:
+            return False
+        self._delete_at(index)
+        return True
+
+    def clear(self):
+        self._format()
+
+    def close(self):
+        self._map.close()
+        os.close(self._fd)
@@ -0,0 +1,132 @@
+"""Защита от лавины пересчётов при истечении кеша.
+
+Значение хранится в конверте ``(значение, время пересчёта, срок)``;
+сам ключ живёт в кеше ещё ``STAMPEDE_STALE_SECONDS`` после срока.
+
+* Пересчёт раньше срока с вероятностью, растущей к его концу
+  (XFetch: ``now - delta * beta * log(rand) >= expires``), разносит
+  пересчёты разных процессов по времени.
+* Пересчитывает один — тот, кто взял блокировку ``cache.add``.
+  Остальные при наличии старого значения отдают его, а без него ждут
+  до ``STAMPEDE_WAIT_SECONDS`` и лишь потом считают сами.
+* Устаревшее значение отдаётся сразу, а пересчёт идёт в фоновом
+  потоке (stale-while-revalidate).
+"""
+import logging
+import math
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.db import connections
+
+from ..metrics import CACHE_RECOMPUTES
+
+logger = logging.getLogger(__name__)
+
+WAIT_STEP = 0.05
+
+
+def _lock_key(key):
+    return key + ':lock'
+
+
+def _unpack(entry):
+    """Конверт или значение, положенное обычным ``cache.set``."""
+    if isinstance(entry, tuple) and len(entry) == 3:
+        return entry
+    return entry, 0.0, math.inf
+
+
+def should_refresh(delta, expires, beta=None, now=None):
+    if beta is None:
+        beta = settings.STAMPEDE_BETA
+    if now is None:
+        now = time.time()
+    return now - delta * beta * math.log(1.0 - random.random()) >= expires
+
+
+def _never_cached(timeout):
+    """Как в Django: нулевой или отрицательный срок — не кешировать."""
+    return timeout is not None and timeout <= 0
+
+
+def compute_and_set(cache, key, compute, timeout):
+    start = time.time()
+    value = compute()
+    if _never_cached(timeout):
+        return value
+    delta = time.time() - start
+    stale = settings.STAMPEDE_STALE_SECONDS
+    cache.set(
+        key,
+        (value, delta, start + timeout if timeout else math.inf),
+        None if timeout is None else timeout + stale,
+    )
+    return value
+
+
+def _refresh(cache, key, compute, timeout):
+    """Тело фонового потока; соединения с БД потока закрываются."""
+    try:
+        compute_and_set(cache, key, compute, timeout)
+    except Exception:
+        logger.exception('Фоновый пересчёт %s не удался', key)
+    finally:
+        cache.delete(_lock_key(key))
+        connections.close_all()
+
+
+def _wait(cache, key):
+    deadline = time.monotonic() + settings.STAMPEDE_WAIT_SECONDS
+    while time.monotonic() < deadline:
+        time.sleep(WAIT_STEP)
+        entry = cache.get(key)
+        if entry is not None:
+            return entry
+    return None
+
+
+def _lock(cache, key):
+    return cache.add(_lock_key(key), 1, settings.STAMPEDE_LOCK_SECONDS)
+
+
+def get_or_set(cache, key, compute, timeout, background=None):
+    """Значение из кеша, при необходимости пересчитанное ``compute()``.
+
+    ``background=False`` отключает фоновый пересчёт: устаревшее
+    значение отдаётся, а пересчитывает тот, кто взял блокировку.
+    """
+    if _never_cached(timeout):
+        return compute_and_set(cache, key, compute, timeout)
+    if background is None:
+        background = settings.STAMPEDE_BACKGROUND
+    entry = cache.get(key)
+    locked = _lock(cache, key) if entry is None else False
+    if entry is not None:
+        value, delta, expires = _unpack(entry)
+        if not should_refresh(delta, expires):
+            return value
+        if not _lock(cache, key):
+            CACHE_RECOMPUTES.inc(result='stale')
+            return value
+        if background:
+            CACHE_RECOMPUTES.inc(result='background')
+            threading.Thread(
+                target=_refresh, args=(cache, key, compute, timeout),
+                daemon=True,
+            ).start()
+            return value
+        locked = True
+    elif not locked:
+        entry = _wait(cache, key)
+        if entry is not None:
+            CACHE_RECOMPUTES.inc(result='waited')
+            return _unpack(entry)[0]
+    CACHE_RECOMPUTES.inc(result='sync')
+    try:
+        return compute_and_set(cache, key, compute, timeout)
+    finally:
+        if locked:
+            cache.delete(_lock_key(key))
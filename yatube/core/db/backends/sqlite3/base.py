@@ -0,0 +1,67 @@
+"""SQLite с настройкой PRAGMA для продакшена.
+
+Дополнительные ключи ``OPTIONS``:
+
+* ``pragmas`` — словарь PRAGMA, выполняемых на каждом новом соединении
+  (``journal_mode``, ``synchronous``, ``mmap_size``, ``cache_size``,
+  ``busy_timeout`` и т.п.);
+* ``optimize_on_close`` — выполнять ``PRAGMA optimize`` перед закрытием
+  соединения.
+
+Постоянные соединения включаются штатным ``CONN_MAX_AGE``. Флаг
+``begin_immediate`` на соединении (его ставит
+``core.db.writes.immediate_atomic``) открывает транзакцию через
+``BEGIN IMMEDIATE``.
+"""
+import re
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.sqlite3 import base
+
+Database = base.Database
+
+PRAGMA_NAME = re.compile(r'^[a-z_]+$')
+PRAGMA_VALUE = re.compile(r'^(-?\d+|[A-Za-z_]+)$')
+
+
+def apply_pragmas(connection, pragmas):
+    """Выполняет PRAGMA на соединении sqlite3."""
+    for name, value in pragmas.items():
+        value = str(value)
+        if not PRAGMA_NAME.match(name) or not PRAGMA_VALUE.match(value):
+            raise ImproperlyConfigured(
+                f'Недопустимая PRAGMA: {name} = {value}'
+            )
+        connection.execute(f'PRAGMA {name} = {value}')
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    begin_immediate = False
+
+    def get_connection_params(self):
+        options = self.settings_dict['OPTIONS']
+        self.pragmas = options.get('pragmas', {})
+        self.optimize_on_close = options.get('optimize_on_close', False)
+        kwargs = super().get_connection_params()
+        kwargs.pop('pragmas', None)
+        kwargs.pop('optimize_on_close', None)
+        return kwargs
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        apply_pragmas(conn, self.pragmas)
+        return conn
+
+    def _close(self):
+        if self.connection is not None and self.optimize_on_close:
+            try:
+                self.connection.execute('PRAGMA optimize')
+            except Database.Error:
+                pass
+        super()._close()
+
+    def _start_transaction_under_autocommit(self):
+        if self.begin_immediate:
+            self.cursor().execute('BEGIN IMMEDIATE')
+        else:
+            super()._start_transaction_under_autocommit()
@@ -0,0 +1,117 @@
+"""Карта идентичности на время запроса.
+
+Пока запрос обрабатывается (``IdentityMapMiddleware``), связанные
+объекты у полей, подключённых через ``install()``, берутся из карты:
+каждая строка загружается один раз, а ``id`` всех уже загруженных, но
+ещё не запрошенных объектов собираются и грузятся одним ``IN``-запросом
+при первом обращении (как DataLoader). Так ``post.author`` в цикле
+шаблона стоит один запрос на всю страницу даже без ``select_related``.
+
+``id`` попадают в очередь при создании экземпляра (``post_init``, в
+том числе из ``from_db``) и при распаковке из кеша (``__setstate__``).
+"""
+import threading
+from collections import defaultdict
+
+from django.db.models.fields.related_descriptors import (
+    ForwardManyToOneDescriptor,
+)
+from django.db.models.signals import post_init
+from django.utils.functional import empty
+
+_state = threading.local()
+
+
+def active():
+    return getattr(_state, 'objects', None) is not None
+
+
+def activate(request=None):
+    _state.objects = defaultdict(dict)
+    _state.pending = defaultdict(set)
+    _state.request = request
+
+
+def deactivate():
+    _state.objects = None
+    _state.pending = None
+    _state.request = None
+
+
+def add(obj, using=None):
+    """Кладёт в карту уже загруженный объект."""
+    if active() and obj is not None:
+        key = (type(obj)._meta.concrete_model, using or obj._state.db)
+        _state.objects[key].setdefault(obj.pk, obj)
+
+
+def _seed_user(model, using):
+    """Пользователь запроса, если он уже загружен, запросов не стоит."""
+    user = getattr(getattr(_state, 'request', None), 'user', None)
+    if getattr(user, '_wrapped', None) not in (None, empty) and (
+            user.is_authenticated
+            and type(user._wrapped)._meta.concrete_model is model):
+        add(user._wrapped, using)
+
+
+def register(instance):
+    if not active():
+        return
+    for field in type(instance)._identity_map_fields:
+        value = getattr(instance, field.attname)
+        if value is not None:
+            _state.pending[field.related_model._meta.concrete_model].add(
+                value
+            )
+
+
+def fetch(queryset, pk):
+    """Объект с ``pk`` из карты; при промахе грузит все ожидающие."""
+    model = queryset.model._meta.concrete_model
+    objects = _state.objects[(model, queryset.db)]
+    if pk in objects:
+        return objects[pk]
+    _seed_user(model, queryset.db)
+    if pk in objects:
+        return objects[pk]
+    pending = _state.pending.pop(model, set()) - objects.keys()
+    pending.add(pk)
+    objects.update(queryset.in_bulk(pending))
+    return objects.get(pk)
+
+
+class IdentityMapDescriptor(ForwardManyToOneDescriptor):
+    def __get__(self, instance, cls=None):
+        if instance is None or not active() or self.field.is_cached(instance):
+            return super().__get__(instance, cls)
+        pk = getattr(instance, self.field.attname)
+        if pk is None:
+            return super().__get__(instance, cls)
+        obj = fetch(self.get_queryset(instance=instance), pk)
+        if obj is None:
+            return super().__get__(instance, cls)
+        self.field.set_cached_value(instance, obj)
+        return obj
+
+
+def _on_post_init(sender, instance, **kwargs):
+    register(instance)
+
+
+def install(model, *field_names):
+    """Подключает карту к прямым связям ``field_names`` модели."""
+    fields = [model._meta.get_field(name) for name in field_names]
+    for field in fields:
+        setattr(model, field.name, IdentityMapDescriptor(field))
+    model._identity_map_fields = fields
+    post_init.connect(
+        _on_post_init, sender=model,
+        dispatch_uid=f'core.identity.{model._meta.label}',
+    )
+    setstate = model.__setstate__
+
+    def __setstate__(self, state):
+        setstate(self, state)
+        register(self)
+
+    model.__setstate__ = __setstate__
@@ -0,0 +1,176 @@
+"""Кеш результатов запросов ORM, включаемый вызовом ``.cache()``.
+
+Ключ записи — алиас и имя базы (кеш в общем файле переживает
+пересоздание базы и общий у тестовой и рабочей), SQL, параметры и
+версии всех таблиц, которые запрос читает. Версия таблицы — случайное
+число в кеше ``QUERY_CACHE_ALIAS``; его меняет любая запись в таблицу: сигналы
+``post_save``, ``post_delete``, ``m2m_changed`` для всех моделей и
+``update``/``delete``/``bulk_create`` у ``CachedQuerySet`` (массовые
+операции через обычный менеджер, например ``User.objects.update()``,
+версию не меняют). Старые
+записи после смены версии просто перестают читаться и истекают сами.
+Внутри ``atomic`` кеш не читается и не пишется.
+
+``QUERY_CACHE_ALIAS`` должен указывать на общий для воркеров кеш
+(по умолчанию ``shm``), иначе смена версии видна только процессу,
+сделавшему запись.
+"""
+import hashlib
+import random
+import re
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import EmptyResultSet
+from django.db import connections, models, router, transaction
+
+TABLE_RE = re.compile(r'(?:FROM|JOIN)\s+[`"]?(\w+)')
+
+_NOT_CACHED = object()
+
+
+def _cache():
+    return caches[settings.QUERY_CACHE_ALIAS]
+
+
+def _version_key(table):
+    return f'querycache:table:{table}'
+
+
+def _new_version():
+    return random.getrandbits(63)
+
+
+def table_versions(tables):
+    cache = _cache()
+    keys = {_version_key(table): table for table in tables}
+    versions = cache.get_many(keys)
+    for key in keys.keys() - versions.keys():
+        cache.add(key, _new_version(), None)
+        versions[key] = cache.get(key)
+    return [versions[key] for key in sorted(keys)]
+
+
+def bump_tables(tables, using=None):
+    """Меняет версии таблиц сейчас и ещё раз после коммита, чтобы
+    чтение до коммита не закешировало старые данные под новой версией.
+    """
+    tables = set(tables)
+
+    def bump():
+        _cache().set_many(
+            {_version_key(table): _new_version() for table in tables}, None
+        )
+
+    bump()
+    if using is not None and connections[using].in_atomic_block:
+        transaction.on_commit(bump, using=using)
+
+
+def bump_model(model, using=None):
+    bump_tables([model._meta.db_table], using)
+
+
+class CachedQuerySet(models.QuerySet):
+    _cache_timeout = _NOT_CACHED
+
+    def cache(self, timeout=None):
+        """Копия выборки, результаты которой берутся из кеша.
+
+        ``timeout=None`` означает ``QUERY_CACHE_TIMEOUT``.
+        """
+        clone = self._chain()
+        clone._cache_timeout = (
+            settings.QUERY_CACHE_TIMEOUT if timeout is None else timeout
+        )
+        return clone
+
+    def _clone(self):
+        clone = super()._clone()
+        clone._cache_timeout = self._cache_timeout
+        return clone
+
+    def _cache_key(self, kind):
+        """Ключ записи или None, если запрос заведомо пуст."""
+        query = self.query.chain()
+        try:
+            sql, params = query.get_compiler(using=self.db).as_sql()
+        except EmptyResultSet:
+            return None
+        tables = set(TABLE_RE.findall(sql))
+        tables.update(join.table_name for join in query.alias_map.values())
+        digest = hashlib.sha1(repr((
+            self.db, connections[self.db].settings_dict['NAME'], kind, sql,
+            params, table_versions(tables),
+        )).encode()).hexdigest()
+        return f'querycache:{digest}'
+
+    def _cached(self, kind, compute):
+        """Внутри транзакции кеш не используется: в ней видны ещё не
+        закоммиченные данные, которые может отменить откат."""
+        if connections[self.db].in_atomic_block:
+            return compute()
+        key = self._cache_key(kind)
+        if key is None:
+            return compute()
+        cache = _cache()
+        value = cache.get(key, _NOT_CACHED)
+        if value is _NOT_CACHED:
+            value = compute()
+            cache.set(key, value, self._cache_timeout)
+        return value
+
+    def _fetch_all(self):
+        if (self._result_cache is None
+                and self._cache_timeout is not _NOT_CACHED):
+            self._result_cache = self._cached(
+                self._iterable_class.__name__,
+                lambda: list(self._iterable_class(self)),
+            )
+        super()._fetch_all()
+
+    def count(self):
+        if (self._result_cache is not None
+                or self._cache_timeout is _NOT_CACHED):
+            return super().count()
+        return self._cached('count', super().count)
+
+    def update(self, **kwargs):
+        rows = super().update(**kwargs)
+        bump_model(self.model, self.db)
+        return rows
+
+    update.alters_data = True
+
+    def delete(self):
+        deleted = super().delete()
+        bump_model(self.model, self.db)
+        return deleted
+
+    delete.alters_data = True
+    delete.queryset_only = True
+
+    def _raw_delete(self, using):
+        deleted = super()._raw_delete(using)
+        bump_model(self.model, using)
+        return deleted
+
+    def bulk_create(self, objs, *args, **kwargs):
+        created = super().bulk_create(objs, *args, **kwargs)
+        bump_model(self.model, router.db_for_write(self.model))
+        return created
+
+
+def cached(model, timeout=None):
+    """``.cache()`` для моделей, чей менеджер не ``CachedQuerySet``,
+    например ``User``."""
+    return CachedQuerySet(model=model).cache(timeout)
+
+
+def on_save_or_delete(sender, instance, using, **kwargs):
+    bump_model(sender, using)
+
+
+def on_m2m_changed(sender, action, using, **kwargs):
+    if action.startswith('post_'):
+        bump_model(sender, using)
@@ -0,0 +1,52 @@
+"""Чтение с реплик для страниц, которые только читают.
+
+Реплики перечисляются в ``REPLICA_DATABASES`` и описываются в
+``DATABASES`` как обычные базы SQLite; их файлы обновляет команда
+``replicate_db``. ``ReplicaMiddleware`` включает чтение с реплики для
+представлений из ``REPLICA_VIEWS``, если у пользователя нет cookie
+привязки к основной базе: её ставит любой пишущий запрос, чтобы автор
+сразу видел свои изменения.
+"""
+import random
+import threading
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+_state = threading.local()
+
+PRIMARY_ONLY_APPS = ('sessions',)
+
+
+def reads_from_replica():
+    return getattr(_state, 'use_replica', False)
+
+
+def set_replica_reads(enabled):
+    _state.use_replica = enabled
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if not settings.REPLICA_DATABASES:
+            return None
+        if (reads_from_replica()
+                and model._meta.app_label not in PRIMARY_ONLY_APPS):
+            return random.choice(settings.REPLICA_DATABASES)
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        if not settings.REPLICA_DATABASES:
+            return None
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *settings.REPLICA_DATABASES}
+        if {obj1._state.db, obj2._state.db} <= databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in settings.REPLICA_DATABASES:
+            return False
+        return None
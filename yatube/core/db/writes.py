@@ -0,0 +1,199 @@
+"""Запись в SQLite без ``database is locked``.
+
+Записи процесса проходят по одной через ``SerializedWriter`` с
+ограниченной очередью, транзакция открывается ``BEGIN IMMEDIATE``, а
+при блокировке базы запись повторяется с экспоненциальной задержкой и
+случайным разбросом. Если повторы не помогли, сайт на
+``WRITE_DEGRADE_SECONDS`` переходит в режим только для чтения: чтение
+работает, запись получает страницу 503.
+
+``BEGIN IMMEDIATE`` открывается в каждой базе, куда пишет функция: при
+шардировании это шард записи и ``default``. Файлы, сохранённые
+``FileField`` во время попытки, которую откатили, удаляются из
+хранилища, чтобы повтор не оставлял в media сирот.
+"""
+import random
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connections
+from django.db import router, transaction
+from django.db.models import FileField
+from django.shortcuts import render
+
+READ_ONLY_CACHE_KEY = 'core:writes:read_only'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS', 'TRACE')
+
+
+class WritesUnavailable(Exception):
+    """Запись сейчас невозможна: очередь полна или база заблокирована."""
+
+
+class SerializedWriter:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending_lock = threading.Lock()
+        self._pending = 0
+
+    @contextmanager
+    def slot(self):
+        with self._pending_lock:
+            if self._pending >= settings.WRITE_QUEUE_SIZE:
+                raise WritesUnavailable('Очередь записи переполнена')
+            self._pending += 1
+        try:
+            if not self._lock.acquire(timeout=settings.WRITE_QUEUE_TIMEOUT):
+                raise WritesUnavailable('Истекло ожидание очереди записи')
+            try:
+                yield
+            finally:
+                self._lock.release()
+        finally:
+            with self._pending_lock:
+                self._pending -= 1
+
+
+writer = SerializedWriter()
+
+
+@contextmanager
+def immediate_atomic(using=DEFAULT_DB_ALIAS):
+    """``transaction.atomic``, начинающий транзакцию с ``BEGIN IMMEDIATE``,
+    чтобы блокировка на запись бралась сразу, а не при первом UPDATE."""
+    connection = connections[using]
+    previous = getattr(connection, 'begin_immediate', False)
+    connection.begin_immediate = True
+    try:
+        with transaction.atomic(using=using):
+            connection.begin_immediate = previous
+            yield
+    finally:
+        connection.begin_immediate = previous
+
+
+_attempt = threading.local()
+
+
+def track_files(sender, instance, **kwargs):
+    """Обработчик ``pre_save``: запоминает файлы, которые ``save()``
+    сейчас запишет в хранилище."""
+    files = getattr(_attempt, 'files', None)
+    if files is None:
+        return
+    for field in instance._meta.concrete_fields:
+        if isinstance(field, FileField):
+            file = getattr(instance, field.attname)
+            if file and not file._committed:
+                files.append(file)
+
+
+@contextmanager
+def discard_files_on_error():
+    """Удаляет файлы, сохранённые внутри блока, если он упал."""
+    _attempt.files = files = []
+    try:
+        yield
+    except BaseException:
+        for file in files:
+            if file._committed and file.name:
+                file.storage.delete(file.name)
+        raise
+    finally:
+        _attempt.files = None
+
+
+def write_databases(model, **hints):
+    """Базы для ``run_write``: ``default`` и база записи ``model``."""
+    return {DEFAULT_DB_ALIAS, router.db_for_write(model, **hints)}
+
+
+def is_locked_error(error):
+    message = str(error).lower()
+    return 'locked' in message or 'busy' in message
+
+
+def backoff(attempt):
+    delay = min(
+        settings.WRITE_RETRY_BACKOFF * 2 ** attempt,
+        settings.WRITE_RETRY_MAX_BACKOFF,
+    )
+    return random.uniform(delay / 2, delay)
+
+
+def _flags():
+    return caches[settings.READ_ONLY_CACHE_ALIAS]
+
+
+def is_read_only():
+    return settings.READ_ONLY_MODE or bool(_flags().get(READ_ONLY_CACHE_KEY))
+
+
+def set_read_only(seconds):
+    """Переводит все процессы в режим только для чтения на время: флаг
+    лежит в общем для воркеров кеше ``READ_ONLY_CACHE_ALIAS``."""
+    _flags().set(READ_ONLY_CACHE_KEY, True, seconds)
+
+
+def clear_read_only():
+    _flags().delete(READ_ONLY_CACHE_KEY)
+
+
+def run_write(func, *args, using=DEFAULT_DB_ALIAS, **kwargs):
+    """Выполняет ``func`` в сериализованной транзакции с повторами.
+
+    ``using`` — алиас или несколько алиасов баз, куда пишет ``func``.
+    """
+    if is_read_only():
+        raise WritesUnavailable('Сайт в режиме только для чтения')
+    databases = sorted({using} if isinstance(using, str) else set(using))
+    for attempt in range(settings.WRITE_RETRIES + 1):
+        try:
+            with writer.slot(), discard_files_on_error(), ExitStack() as tx:
+                for database in databases:
+                    tx.enter_context(immediate_atomic(database))
+                return func(*args, **kwargs)
+        except OperationalError as error:
+            if not is_locked_error(error):
+                raise
+            if attempt == settings.WRITE_RETRIES:
+                set_read_only(settings.WRITE_DEGRADE_SECONDS)
+                raise WritesUnavailable('База данных заблокирована') from error
+            time.sleep(backoff(attempt))
+
+
+def write_view(view=None, safe_methods=SAFE_METHODS, databases=None):
+    """Проводит небезопасные запросы к представлению через ``run_write``.
+
+    Представление целиком повторяется при блокировке базы, поэтому до
+    записи в базу оно не должно иметь побочных эффектов, кроме файлов
+    ``FileField``; загруженные файлы перед каждой попыткой перематываются.
+    Для представлений, пишущих и на GET, передаётся ``safe_methods=()``.
+    ``databases(request, *args, **kwargs)`` возвращает базы, куда пишет
+    представление; без него — ``default``.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method in safe_methods:
+                return view(request, *args, **kwargs)
+            using = DEFAULT_DB_ALIAS
+            if databases is not None:
+                using = databases(request, *args, **kwargs)
+
+            def attempt():
+                for upload in request.FILES.values():
+                    upload.seek(0)
+                return view(request, *args, **kwargs)
+
+            try:
+                return run_write(attempt, using=using)
+            except WritesUnavailable:
+                return render(request, 'core/503.html', status=503)
+        return wrapper
+    if view is not None:
+        return decorator(view)
+    return decorator
@@ -0,0 +1,160 @@
+"""Исходящая почта через таблицу ``OutboxMessage``.
+
+``OutboxEmailBackend`` (``EMAIL_BACKEND``) только сохраняет готовое
+MIME-письмо, поэтому запрос не ждёт почтовый сервер. Команда
+``send_outbox`` отправляет письма пачками через одно соединение
+бэкенда ``OUTBOX_EMAIL_BACKEND``, не быстрее ``OUTBOX_RATE_LIMIT``
+писем в секунду, и повторяет неудачные с растущей задержкой.
+"""
+import json
+import logging
+import random
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import get_connection
+from django.core.mail.backends.base import BaseEmailBackend
+from django.core.mail.message import EmailMessage
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+
+class OutboxEmailBackend(BaseEmailBackend):
+    def send_messages(self, email_messages):
+        from .models import OutboxMessage
+
+        OutboxMessage.objects.bulk_create(
+            OutboxMessage(
+                from_email=message.from_email,
+                recipients=json.dumps(message.recipients()),
+                subject=str(message.subject)[:255],
+                message=message.message().as_bytes(),
+            )
+            for message in email_messages
+            if message.recipients()
+        )
+        return len(email_messages)
+
+
+class StoredMIME:
+    def __init__(self, data):
+        self.data = data
+
+    def get_charset(self):
+        return None
+
+    def as_bytes(self, linesep='\n'):
+        return self.data.replace(b'\r\n', b'\n').replace(
+            b'\n', linesep.encode()
+        )
+
+
+class StoredEmail(EmailMessage):
+    """Письмо из outbox: отдаёт бэкендам сохранённый MIME как есть."""
+
+    def __init__(self, outbox_message):
+        super().__init__(
+            from_email=outbox_message.from_email,
+            to=json.loads(outbox_message.recipients),
+        )
+        self.stored = bytes(outbox_message.message)
+
+    def message(self):
+        return StoredMIME(self.stored)
+
+
+class RateLimiter:
+    """Не больше ``rate`` вызовов ``wait()`` в секунду."""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0.0
+        self.next_at = time.monotonic()
+
+    def wait(self):
+        now = time.monotonic()
+        if now < self.next_at:
+            time.sleep(self.next_at - now)
+        self.next_at = max(now, self.next_at) + self.interval
+
+
+def retry_delay(attempts):
+    delay = min(
+        settings.OUTBOX_RETRY_BACKOFF * 2 ** (attempts - 1),
+        settings.OUTBOX_RETRY_MAX_BACKOFF,
+    )
+    return random.uniform(delay / 2, delay)
+
+
+class OutboxSender:
+    def __init__(self, batch_size=None, rate=None):
+        self.batch_size = batch_size or settings.OUTBOX_BATCH_SIZE
+        self.limiter = RateLimiter(
+            settings.OUTBOX_RATE_LIMIT if rate is None else rate
+        )
+        self.connection = None
+
+    def batch(self):
+        from .models import OutboxMessage
+
+        return list(
+            OutboxMessage.objects.filter(
+                status=OutboxMessage.QUEUED,
+                send_after__lte=timezone.now(),
+            ).order_by('send_after', 'id')[:self.batch_size]
+        )
+
+    def send_batch(self):
+        """Отправляет одну пачку; возвращает число взятых писем."""
+        messages = self.batch()
+        for outbox_message in messages:
+            self.limiter.wait()
+            self.send(outbox_message)
+        return len(messages)
+
+    def open(self):
+        if self.connection is None:
+            self.connection = get_connection(
+                settings.OUTBOX_EMAIL_BACKEND, fail_silently=False
+            )
+            self.connection.open()
+
+    def send(self, outbox_message):
+        try:
+            self.open()
+            self.connection.send_messages([StoredEmail(outbox_message)])
+        except Exception as error:
+            self.failed(outbox_message, error)
+            self.close()
+            return False
+        outbox_message.status = outbox_message.SENT
+        outbox_message.sent = timezone.now()
+        outbox_message.attempts += 1
+        outbox_message.save(update_fields=('status', 'sent', 'attempts'))
+        return True
+
+    def failed(self, outbox_message, error):
+        """Ошибка письма закрывает и соединение: следующее письмо пачки
+        откроет новое."""
+        outbox_message.attempts += 1
+        outbox_message.last_error = repr(error)
+        if outbox_message.attempts >= settings.OUTBOX_MAX_ATTEMPTS:
+            outbox_message.status = outbox_message.FAILED
+            logger.error('Письмо %s не отправлено: %r',
+                         outbox_message.pk, error)
+        else:
+            outbox_message.send_after = timezone.now() + timedelta(
+                seconds=retry_delay(outbox_message.attempts)
+            )
+        outbox_message.save(update_fields=(
+            'attempts', 'last_error', 'status', 'send_after',
+        ))
+
+    def close(self):
+        if self.connection is not None:
+            try:
+                self.connection.close()
+            except Exception:
+                pass
+            self.connection = None
@@ -0,0 +1,86 @@
+import multiprocessing
+import os
+import random
+import shutil
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.cache.backends import (FileBasedCache, LocMemCache,
+                                 SharedMemoryCache)
+
+BACKENDS = (
+    ('locmem', LocMemCache, None),
+    ('filebased', FileBasedCache, 'files'),
+    ('shm', SharedMemoryCache, 'cache.shm'),
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает LocMemCache, FileBasedCache и SharedMemoryCache на '
+        'нагрузке, похожей на кеш фрагментов: HTML по 5–20 КБ, '
+        'чтения и записи в соотношении 90/10, несколько процессов.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4)
+        parser.add_argument('--seconds', type=float, default=3.0)
+        parser.add_argument('--keys', type=int, default=200)
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f'{"бэкенд":<12}{"операций/с":>12}{"попаданий":>12}'
+        )
+        for name, backend, location in BACKENDS:
+            operations, hits = self.run(backend, location, options)
+            self.stdout.write(
+                f'{name:<12}{operations / options["seconds"]:>12.0f}'
+                f'{hits / max(operations, 1):>12.1%}'
+            )
+
+    def run(self, backend, location, options):
+        directory = tempfile.mkdtemp()
+        params = {'OPTIONS': {'SIZE': 64 * 1024 * 1024, 'SLOTS': 4096}}
+        if location is None:
+            params['OPTIONS'] = {}
+        path = os.path.join(directory, location or 'locmem')
+        context = multiprocessing.get_context('fork')
+        results = context.Queue()
+        workers = [
+            context.Process(
+                target=worker,
+                args=(backend, path, params, options, results),
+            )
+            for _ in range(options['workers'])
+        ]
+        for process in workers:
+            process.start()
+        totals = [results.get() for _ in workers]
+        for process in workers:
+            process.join()
+        shutil.rmtree(directory, ignore_errors=True)
+        return (
+            sum(operations for operations, _ in totals),
+            sum(hits for _, hits in totals),
+        )
+
+
+def worker(backend, path, params, options, results):
+    """LocMemCache у каждого процесса свой, остальные — общие."""
+    cache = backend(path, params)
+    fragments = [
+        '<article>{}</article>'.format('x' * random.randint(5000, 20000))
+        for _ in range(16)
+    ]
+    operations = hits = 0
+    deadline = time.perf_counter() + options['seconds']
+    while time.perf_counter() < deadline:
+        key = f'template.cache.index_page.{random.randrange(options["keys"])}'
+        if random.random() < 0.9:
+            hits += cache.get(key) is not None
+        else:
+            cache.set(key, random.choice(fragments), 60)
+        operations += 1
+    results.put((operations, hits))
@@ -0,0 +1,47 @@
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+
+
+class Command(BaseCommand):
+    help = (
+        'Копирует основную базу SQLite в файлы реплик из '
+        'REPLICA_DATABASES через backup API.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval', type=float, default=0,
+            help='Повторять копирование каждые N секунд.',
+        )
+        parser.add_argument(
+            '--pages', type=int, default=1024,
+            help='Страниц за шаг backup, между шагами читатели не ждут.',
+        )
+
+    def handle(self, *args, **options):
+        if not settings.REPLICA_DATABASES:
+            raise CommandError('REPLICA_DATABASES не заданы')
+        while True:
+            for alias in settings.REPLICA_DATABASES:
+                started = time.monotonic()
+                self.replicate(alias, options['pages'])
+                self.stdout.write(
+                    f'{alias}: {time.monotonic() - started:.3f} с'
+                )
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
+
+    @staticmethod
+    def replicate(alias, pages):
+        source = sqlite3.connect(settings.DATABASES[DEFAULT_DB_ALIAS]['NAME'])
+        target = sqlite3.connect(settings.DATABASES[alias]['NAME'])
+        try:
+            source.backup(target, pages=pages)
+        finally:
+            target.close()
+            source.close()
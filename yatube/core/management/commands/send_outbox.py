@@ -0,0 +1,44 @@
+import signal
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.mail import OutboxSender
+
+
+class Command(BaseCommand):
+    help = 'Отправляет письма из таблицы исходящих.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch', type=int, default=None)
+        parser.add_argument(
+            '--rate', type=float, default=None,
+            help='Писем в секунду, по умолчанию OUTBOX_RATE_LIMIT.',
+        )
+        parser.add_argument(
+            '--drain', action='store_true',
+            help='Завершиться, когда готовых писем не останется.',
+        )
+
+    def handle(self, *args, **options):
+        sender = OutboxSender(options['batch'], options['rate'])
+        self.stopped = False
+        signal.signal(signal.SIGTERM, self.stop)
+        sent = 0
+        try:
+            while not self.stopped:
+                taken = sender.send_batch()
+                sent += taken
+                if taken:
+                    continue
+                sender.close()
+                if options['drain']:
+                    break
+                time.sleep(settings.OUTBOX_POLL_INTERVAL)
+        finally:
+            sender.close()
+        self.stdout.write(f'Обработано писем: {sent}')
+
+    def stop(self, signum, frame):
+        self.stopped = True
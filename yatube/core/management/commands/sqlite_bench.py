@@ -0,0 +1,114 @@
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.db.backends.sqlite3.base import apply_pragmas
+
+DEFAULT_PRAGMAS = {'journal_mode': 'DELETE', 'synchronous': 'FULL'}
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает параллельное чтение и запись в SQLite с настройками '
+        'по умолчанию и с PRAGMA из DATABASES["default"].'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=4)
+        parser.add_argument('--seconds', type=float, default=5.0)
+        parser.add_argument('--rows', type=int, default=10000)
+
+    def handle(self, *args, **options):
+        tuned = settings.DATABASES['default']['OPTIONS'].get('pragmas', {})
+        timeout = settings.DATABASES['default']['OPTIONS'].get('timeout', 5)
+        self.stdout.write(
+            f'{"режим":<10}{"чтений/с":>12}{"записей/с":>12}'
+            f'{"locked":>10}'
+        )
+        for name, pragmas in (('default', DEFAULT_PRAGMAS), ('tuned', tuned)):
+            reads, writes, locked = self.run(pragmas, timeout, options)
+            seconds = options['seconds']
+            self.stdout.write(
+                f'{name:<10}{reads / seconds:>12.0f}'
+                f'{writes / seconds:>12.0f}{locked:>10}'
+            )
+
+    def run(self, pragmas, timeout, options):
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, 'bench.sqlite3')
+        create_database(path, pragmas, options['rows'])
+        stop = threading.Event()
+        counters = Counter()
+        context = (path, pragmas, timeout, stop, counters)
+        threads = [threading.Thread(target=writer, args=context)] + [
+            threading.Thread(
+                target=reader, args=context + (options['rows'],)
+            )
+            for _ in range(options['readers'])
+        ]
+        for thread in threads:
+            thread.start()
+        time.sleep(options['seconds'])
+        stop.set()
+        for thread in threads:
+            thread.join()
+        for suffix in ('', '-wal', '-shm', '-journal'):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+        os.rmdir(directory)
+        return counters['reads'], counters['writes'], counters['locked']
+
+
+def create_database(path, pragmas, rows):
+    conn = sqlite3.connect(path)
+    apply_pragmas(conn, pragmas)
+    conn.execute(
+        'CREATE TABLE post (id INTEGER PRIMARY KEY, author_id INTEGER, '
+        'text TEXT, pub_date REAL)'
+    )
+    conn.execute('CREATE INDEX post_pub_date ON post (pub_date)')
+    conn.executemany(
+        'INSERT INTO post (author_id, text, pub_date) VALUES (?, ?, ?)',
+        ((i % 100, 'x' * 200, i) for i in range(rows)),
+    )
+    conn.commit()
+    conn.close()
+
+
+def reader(path, pragmas, timeout, stop, counters, rows):
+    conn = sqlite3.connect(path, timeout=timeout)
+    apply_pragmas(conn, pragmas)
+    while not stop.is_set():
+        try:
+            conn.execute(
+                'SELECT * FROM post ORDER BY pub_date DESC '
+                'LIMIT 10 OFFSET ?', (random.randrange(rows),)
+            ).fetchall()
+            counters['reads'] += 1
+        except sqlite3.OperationalError:
+            counters['locked'] += 1
+    conn.close()
+
+
+def writer(path, pragmas, timeout, stop, counters):
+    conn = sqlite3.connect(path, timeout=timeout)
+    apply_pragmas(conn, pragmas)
+    while not stop.is_set():
+        try:
+            conn.execute(
+                'INSERT INTO post (author_id, text, pub_date) '
+                'VALUES (?, ?, ?)', (1, 'x' * 200, time.time())
+            )
+            conn.commit()
+            counters['writes'] += 1
+        except sqlite3.OperationalError:
+            conn.rollback()
+            counters['locked'] += 1
+    conn.close()
@@ -0,0 +1,98 @@
+"""Слежение за ростом памяти воркера через ``tracemalloc``.
+
+Снимки делаются не чаще раза в ``MEMORY_SNAPSHOT_INTERVAL`` секунд по
+завершении запроса; разница с предыдущим снимком пишется в лог
+``core.memory`` и доступна персоналу на ``/memory/``.
+"""
+import logging
+import os
+import resource
+import signal
+import threading
+import time
+import tracemalloc
+
+from django.conf import settings
+from django.core.signals import request_finished
+
+logger = logging.getLogger(__name__)
+
+
+def rss_bytes():
+    """Текущий RSS процесса; без /proc — пиковый из getrusage."""
+    try:
+        with open('/proc/self/statm') as statm:
+            pages = int(statm.read().split()[1])
+        return pages * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class MemoryMonitor:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._taken_at = 0.0
+        self._recycling = False
+        self.report = ''
+
+    def start(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(settings.MEMORY_TRACE_FRAMES)
+
+    def maybe_snapshot(self, force=False):
+        now = time.monotonic()
+        if not force and (
+                now - self._taken_at < settings.MEMORY_SNAPSHOT_INTERVAL):
+            return
+        if not self._lock.acquire(blocking=False):
+            return
+        try:
+            snapshot = tracemalloc.take_snapshot().filter_traces((
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+            ))
+            if self._snapshot is not None:
+                self.report = self._format(
+                    snapshot.compare_to(self._snapshot, 'lineno')
+                )
+                logger.info('Рост памяти в процессе %s:\n%s',
+                            os.getpid(), self.report)
+            self._snapshot = snapshot
+            self._taken_at = now
+        finally:
+            self._lock.release()
+
+    @staticmethod
+    def _format(stats):
+        growing = [stat for stat in stats if stat.size_diff > 0]
+        return '\n'.join(
+            str(stat) for stat in growing[:settings.MEMORY_TOP_STATS]
+        )
+
+    def check_rss(self):
+        """Перезапускает воркер, если RSS превысил порог."""
+        limit = settings.MEMORY_MAX_RSS_MB
+        if limit is None or self._recycling:
+            return
+        rss = rss_bytes()
+        if rss <= limit * 1024 * 1024:
+            return
+        self._recycling = True
+        logger.warning(
+            'RSS процесса %s равен %.1f МБ при пороге %s МБ, перезапуск',
+            os.getpid(), rss / 1024 / 1024, limit,
+        )
+        request_finished.connect(
+            _recycle, dispatch_uid='core.memory.recycle', weak=False
+        )
+
+
+def _recycle(**kwargs):
+    """Сигнал воркеру отправляется после ответа, чтобы сервер приложений
+    (gunicorn, uWSGI) завершил его штатно и поднял новый."""
+    request_finished.disconnect(dispatch_uid='core.memory.recycle')
+    os.kill(os.getpid(), getattr(signal, settings.MEMORY_RECYCLE_SIGNAL))
+
+
+monitor = MemoryMonitor()
@@ -0,0 +1,430 @@
+"""Метрики в формате Prometheus.
+
+Каждый процесс пишет свои значения в собственный файл, отображённый в
+память (``METRICS_DIR/metrics_<pid>.db``), поэтому запись не требует
+межпроцессных блокировок. Эндпоинт ``/metrics/`` читает файлы всех
+воркеров и суммирует значения.
+
+Файл завершившегося процесса (при выходе или, если процесс убит, при
+следующем чтении метрик) переносится в ``metrics_archive.db`` и
+удаляется, как ``mark_process_dead`` у prometheus_client: счётчики и
+гистограммы прибавляются к архиву, значения, которые не копятся
+(``cumulative = False``, например gauge), отбрасываются.
+"""
+import atexit
+import fcntl
+import glob
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+from contextlib import contextmanager
+from multiprocessing import util as multiprocessing_util
+
+from django.conf import settings
+
+INITIAL_SIZE = 64 * 1024
+HEADER = struct.Struct('i4x')
+ENTRY_HEADER = struct.Struct('i')
+VALUE = struct.Struct('d')
+
+DEFAULT_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75,
+    1.0, 2.5, 5.0, 7.5, 10.0,
+)
+SIZE_BUCKETS = (
+    1024, 10 * 1024, 100 * 1024, 512 * 1024,
+    1024 * 1024, 5 * 1024 * 1024, 10 * 1024 * 1024,
+)
+
+ARCHIVE = 'metrics_archive.db'
+ARCHIVE_LOCK = 'metrics_archive.lock'
+
+REGISTRY = {}
+
+
+def _padded(key):
+    """Кодирует ключ и дополняет его до границы в 8 байт."""
+    encoded = key.encode('utf-8')
+    padding = 8 - (ENTRY_HEADER.size + len(encoded)) % 8
+    return encoded + b' ' * padding
+
+
+class MmapedValues:
+    """Словарь ``ключ -> float`` в файле, отображённом в память.
+
+    Формат: заголовок с числом занятых байт, затем записи вида
+    ``<длина ключа><ключ><значение>``. Заголовок обновляется после
+    записи, поэтому читатели из других процессов не видят
+    недописанных записей.
+    """
+
+    def __init__(self, path, read_only=False):
+        self.path = path
+        self._lock = threading.Lock()
+        self._positions = {}
+        mode = 'rb' if read_only else 'a+b'
+        self._file = open(path, mode)
+        if not read_only and os.fstat(self._file.fileno()).st_size == 0:
+            self._file.truncate(INITIAL_SIZE)
+        self._capacity = os.fstat(self._file.fileno()).st_size
+        self._map = mmap.mmap(
+            self._file.fileno(), self._capacity,
+            access=mmap.ACCESS_READ if read_only else mmap.ACCESS_WRITE,
+        )
+        self._used = HEADER.unpack_from(self._map, 0)[0]
+        if self._used == 0:
+            self._used = HEADER.size
+            if not read_only:
+                HEADER.pack_into(self._map, 0, self._used)
+        for key, _, position in self._read_all():
+            self._positions[key] = position
+
+    def _read_all(self):
+        position = HEADER.size
+        while position < self._used:
+            length = ENTRY_HEADER.unpack_from(self._map, position)[0]
+            position += ENTRY_HEADER.size
+            key = self._map[position:position + length].decode('utf-8')
+            position += length + (8 - (ENTRY_HEADER.size + length) % 8)
+            value = VALUE.unpack_from(self._map, position)[0]
+            yield key, value, position
+            position += VALUE.size
+
+    def items(self):
+        for key, value, _ in self._read_all():
+            yield key, value
+
+    def _grow(self, needed):
+        capacity = self._capacity
+        while capacity < needed:
+            capacity *= 2
+        self._map.close()
+        self._file.truncate(capacity)
+        self._capacity = capacity
+        self._map = mmap.mmap(self._file.fileno(), capacity)
+
+    def _init_key(self, key):
+        encoded = _padded(key)
+        entry = (
+            ENTRY_HEADER.pack(len(key.encode('utf-8')))
+            + encoded + VALUE.pack(0.0)
+        )
+        if self._used + len(entry) > self._capacity:
+            self._grow(self._used + len(entry))
+        self._map[self._used:self._used + len(entry)] = entry
+        self._positions[key] = self._used + len(entry) - VALUE.size
+        self._used += len(entry)
+        HEADER.pack_into(self._map, 0, self._used)
+
+    def add(self, key, amount):
+        with self._lock:
+            if key not in self._positions:
+                self._init_key(key)
+            position = self._positions[key]
+            value = VALUE.unpack_from(self._map, position)[0]
+            VALUE.pack_into(self._map, position, value + amount)
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_metrics_dir():
+    return getattr(
+        settings, 'METRICS_DIR', os.path.join(settings.BASE_DIR, 'metrics')
+    )
+
+
+def _get_store():
+    """Возвращает файл значений текущего процесса.
+
+    После ``fork`` pid меняется, и дочерний процесс открывает свой файл.
+    """
+    global _store
+    directory = get_metrics_dir()
+    pid = os.getpid()
+    store = _store
+    if store is not None and store[0] == (pid, directory):
+        return store[1]
+    with _store_lock:
+        os.makedirs(directory, exist_ok=True)
+        _store = ((pid, directory), MmapedValues(_pid_path(directory, pid)))
+        atexit.register(_on_exit, pid, directory)
+        # Дочерние процессы multiprocessing выходят через ``os._exit``
+        # без ``atexit``, но вызывают свои финализаторы.
+        multiprocessing_util.Finalize(
+            None, _on_exit, (pid, directory), exitpriority=0
+        )
+        return _store[1]
+
+
+def _pid_path(directory, pid):
+    return os.path.join(directory, f'metrics_{pid}.db')
+
+
+def _on_exit(pid, directory):
+    # Обработчики ``atexit`` наследуются после ``fork``: файл родителя
+    # дочерний процесс не трогает.
+    if os.getpid() == pid and os.path.exists(_pid_path(directory, pid)):
+        mark_process_dead(pid, directory)
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+@contextmanager
+def _archive_locked(directory):
+    with open(os.path.join(directory, ARCHIVE_LOCK), 'a') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def mark_process_dead(pid, directory=None):
+    """Переносит значения завершившегося процесса ``pid`` в архив и
+    удаляет его файл. Возвращает False, если файла уже нет."""
+    directory = directory or get_metrics_dir()
+    path = _pid_path(directory, pid)
+    with _archive_locked(directory):
+        if not os.path.exists(path):
+            return False
+        try:
+            values = MmapedValues(path, read_only=True)
+        except (OSError, ValueError):
+            values = None
+        if values is not None:
+            archive = MmapedValues(os.path.join(directory, ARCHIVE))
+            try:
+                for key, value in values.items():
+                    metric = REGISTRY.get(json.loads(key)[0])
+                    if metric is None or metric.cumulative:
+                        archive.add(key, value)
+            finally:
+                archive.close()
+                values.close()
+        os.remove(path)
+    return True
+
+
+def _key(name, sample, labels):
+    return json.dumps([name, sample, sorted(labels.items())])
+
+
+class Metric:
+    type = None
+    # Значения умерших процессов остаются в сумме.
+    cumulative = True
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        REGISTRY[name] = self
+
+    def _check_labels(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(
+                f'{self.name}: ожидаются метки {self.labelnames}'
+            )
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        self._check_labels(labels)
+        _get_store().add(_key(self.name, '_total', labels), amount)
+
+    def samples(self, values):
+        for (sample, labels), value in sorted(values.items()):
+            yield self.name + sample, dict(labels), value
+
+
+class Histogram(Metric):
+    """Гистограмма. Бакеты хранятся не накопленными и суммируются при
+    выводе, так что наблюдение стоит три записи в файл."""
+
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(),
+                 buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+
+    def observe(self, value, **labels):
+        self._check_labels(labels)
+        store = _get_store()
+        for bound in self.buckets:
+            if value <= bound:
+                break
+        store.add(_key(self.name, '_bucket', dict(labels, le=bound)), 1)
+        store.add(_key(self.name, '_sum', labels), value)
+        store.add(_key(self.name, '_count', labels), 1)
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self, values):
+        series = {}
+        for (sample, labels), value in values.items():
+            labels = dict(labels)
+            bound = labels.pop('le', None)
+            key = tuple(sorted(labels.items()))
+            entry = series.setdefault(key, {'buckets': {}})
+            if sample == '_bucket':
+                entry['buckets'][bound] = value
+            else:
+                entry[sample] = value
+        for key, entry in sorted(series.items()):
+            labels = dict(key)
+            accumulated = 0.0
+            for bound in self.buckets:
+                accumulated += entry['buckets'].get(bound, 0.0)
+                yield (
+                    self.name + '_bucket',
+                    dict(labels, le=_format_value(bound)),
+                    accumulated,
+                )
+            yield self.name + '_sum', labels, entry.get('_sum', 0.0)
+            yield self.name + '_count', labels, entry.get('_count', 0.0)
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if value == int(value):
+        return repr(float(value))
+    return repr(value)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    pairs = ','.join(
+        '{}="{}"'.format(
+            name,
+            str(value).replace('\\', r'\\').replace('"', r'\"'),
+        )
+        for name, value in sorted(labels.items())
+    )
+    return '{' + pairs + '}'
+
+
+def _process_files(directory):
+    """Файлы живых процессов и архив; файлы умерших переносятся в
+    архив."""
+    paths = []
+    for path in glob.glob(os.path.join(directory, 'metrics_*.db')):
+        pid = os.path.basename(path)[len('metrics_'):-len('.db')]
+        if pid.isdigit() and not _alive(int(pid)):
+            mark_process_dead(int(pid), directory)
+        else:
+            paths.append(path)
+    archive = os.path.join(directory, ARCHIVE)
+    if archive not in paths and os.path.exists(archive):
+        paths.append(archive)
+    return paths
+
+
+def collect():
+    """Суммирует значения из файлов всех процессов и архива."""
+    totals = {}
+    for path in _process_files(get_metrics_dir()):
+        try:
+            values = MmapedValues(path, read_only=True)
+        except (OSError, ValueError):
+            continue
+        try:
+            for key, value in values.items():
+                name, sample, labels = json.loads(key)
+                labels = tuple(tuple(pair) for pair in labels)
+                family = totals.setdefault(name, {})
+                family[(sample, labels)] = (
+                    family.get((sample, labels), 0.0) + value
+                )
+        finally:
+            values.close()
+    return totals
+
+
+def generate_latest():
+    """Текст в формате Prometheus exposition 0.0.4."""
+    totals = collect()
+    lines = []
+    for name, metric in sorted(REGISTRY.items()):
+        lines.append(f'# HELP {name} {metric.documentation}')
+        lines.append(f'# TYPE {name} {metric.type}')
+        for sample, labels, value in metric.samples(totals.get(name, {})):
+            lines.append(
+                f'{sample}{_format_labels(labels)} {_format_value(value)}'
+            )
+    return '\n'.join(lines) + '\n'
+
+
+REQUEST_LATENCY = Histogram(
+    'yatube_request_latency_seconds',
+    'Время обработки запроса по имени URL.',
+    ('view',),
+)
+DB_QUERY_SECONDS = Histogram(
+    'yatube_db_query_seconds',
+    'Время выполнения SQL-запросов.',
+    ('view', 'database'),
+)
+CACHE_REQUESTS = Counter(
+    'yatube_cache_requests',
+    'Обращения к кешу по алиасу: попадания и промахи.',
+    ('alias', 'result'),
+)
+THUMBNAIL_SECONDS = Histogram(
+    'yatube_thumbnail_seconds',
+    'Генерация миниатюр sorl-thumbnail.',
+)
+UPLOAD_BYTES = Histogram(
+    'yatube_upload_bytes',
+    'Размер загруженных файлов.',
+    ('view',),
+    buckets=SIZE_BUCKETS,
+)
+CACHE_RECOMPUTES = Counter(
+    'yatube_cache_recomputes',
+    'Пересчёты значений под защитой от лавины: синхронно, в фоне, '
+    'ожидание чужого пересчёта, отдача устаревшего.',
+    ('result',),
+)
+JOB_SECONDS = Histogram(
+    'yatube_job_seconds',
+    'Время выполнения фоновых задач по имени и результату.',
+    ('name', 'result'),
+)
+WEBHOOK_SECONDS = Histogram(
+    'yatube_webhook_seconds',
+    'Время отправки пачек вебхуков по результату.',
+    ('result',),
+)
+DUPLICATE_CHECK_SECONDS = Histogram(
+    'yatube_duplicate_check_seconds',
+    'Проверка текста на почти дубли: без совпадений или с ними.',
+    ('result',),
+)
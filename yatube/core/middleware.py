@@ -0,0 +1,151 @@
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.contrib.auth.middleware import AuthenticationMiddleware
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.utils.functional import SimpleLazyObject
+
+from . import auth, metrics, profiler
+from .db import identity
+from .db.routers import set_replica_reads
+from .db.writes import SAFE_METHODS
+from .memory import monitor
+
+
+def _view_label(request):
+    """Имя URL для метрик или ``other`` для прочих адресов."""
+    match = getattr(request, 'resolver_match', None)
+    if match is None or match.namespace not in settings.METRICS_NAMESPACES:
+        return 'other'
+    return match.view_name
+
+
+class MetricsMiddleware:
+    """Собирает время ответа, время SQL-запросов и размеры загрузок."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(
+                    self._query_timer(request, connection.alias)
+                ))
+            response = self.get_response(request)
+        view = _view_label(request)
+        if view != 'other':
+            metrics.REQUEST_LATENCY.observe(
+                time.perf_counter() - start, view=view
+            )
+        if request.method == 'POST' and request.FILES:
+            for files in request.FILES.lists():
+                for uploaded in files[1]:
+                    metrics.UPLOAD_BYTES.observe(uploaded.size, view=view)
+        return response
+
+    @staticmethod
+    def _query_timer(request, alias):
+        def timer(execute, sql, params, many, context):
+            start = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                metrics.DB_QUERY_SECONDS.observe(
+                    time.perf_counter() - start,
+                    view=_view_label(request),
+                    database=alias,
+                )
+        return timer
+
+
+class ProfilerMiddleware:
+    """Профилирует запрос по подписанному заголовку или флагу персонала.
+
+    Ставится после ``AuthenticationMiddleware``.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not profiler.profile_requested(request):
+            return self.get_response(request)
+        return profiler.run_profiled(request, self.get_response)
+
+
+class MemoryMonitorMiddleware:
+    """Периодические снимки tracemalloc и перезапуск по порогу RSS.
+
+    Включается настройкой ``MEMORY_MONITOR_ENABLED``.
+    """
+
+    def __init__(self, get_response):
+        if not settings.MEMORY_MONITOR_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        monitor.start()
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        monitor.maybe_snapshot()
+        monitor.check_rss()
+        return response
+
+
+class ReplicaMiddleware:
+    """Направляет чтение на реплики и привязывает писавших к основной
+    базе на ``REPLICA_PIN_SECONDS``."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        try:
+            response = self.get_response(request)
+        finally:
+            set_replica_reads(False)
+        match = getattr(request, 'resolver_match', None)
+        wrote = request.method not in SAFE_METHODS or (
+            match is not None and match.view_name in settings.REPLICA_PIN_VIEWS
+        )
+        if wrote and response.status_code < 400:
+            response.set_cookie(
+                settings.REPLICA_PIN_COOKIE,
+                '1',
+                max_age=settings.REPLICA_PIN_SECONDS,
+                httponly=True,
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        set_replica_reads(
+            request.method in SAFE_METHODS
+            and request.resolver_match.view_name in settings.REPLICA_VIEWS
+            and settings.REPLICA_PIN_COOKIE not in request.COOKIES
+        )
+
+
+class IdentityMapMiddleware:
+    """Карта идентичности на время запроса; ставится после
+    ``AuthenticationMiddleware``."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        identity.activate(request)
+        try:
+            return self.get_response(request)
+        finally:
+            identity.deactivate()
+
+
+class CachedUserMiddleware(AuthenticationMiddleware):
+    """``AuthenticationMiddleware``, берущий пользователя из сессии."""
+
+    def process_request(self, request):
+        request.user = SimpleLazyObject(lambda: auth.get_user(request))
@@ -0,0 +1,35 @@
+# Generated by Django 2.2.16 on 2026-10-19 09:04
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RequestProfile',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('path', models.CharField(max_length=255, verbose_name='Адрес')),
+                ('view_name', models.CharField(blank=True, max_length=100, verbose_name='Имя URL')),
+                ('duration', models.FloatField(verbose_name='Длительность, с')),
+                ('samples', models.PositiveIntegerField(verbose_name='Сэмплов')),
+                ('filename', models.CharField(max_length=255, verbose_name='Файл speedscope')),
+                ('created', models.DateTimeField(auto_now_add=True, verbose_name='Дата')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='request_profiles', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'профиль запроса',
+                'verbose_name_plural': 'профили запросов',
+                'ordering': ['-created'],
+            },
+        ),
+    ]
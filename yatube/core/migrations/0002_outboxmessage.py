@@ -0,0 +1,39 @@
+# Generated by Django 2.2.16 on 2026-10-19 09:26
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutboxMessage',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('from_email', models.CharField(max_length=255, verbose_name='Отправитель')),
+                ('recipients', models.TextField(verbose_name='Получатели, JSON')),
+                ('subject', models.CharField(blank=True, max_length=255, verbose_name='Тема')),
+                ('message', models.BinaryField(verbose_name='Письмо, MIME')),
+                ('status', models.CharField(choices=[('queued', 'В очереди'), ('sent', 'Отправлено'), ('failed', 'Не отправлено')], default='queued', max_length=10, verbose_name='Состояние')),
+                ('attempts', models.PositiveSmallIntegerField(default=0, verbose_name='Попыток')),
+                ('send_after', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Отправить не раньше')),
+                ('last_error', models.TextField(blank=True, verbose_name='Последняя ошибка')),
+                ('created', models.DateTimeField(auto_now_add=True, verbose_name='Создано')),
+                ('sent', models.DateTimeField(blank=True, null=True, verbose_name='Отправлено')),
+            ],
+            options={
+                'verbose_name': 'письмо',
+                'verbose_name_plural': 'исходящие письма',
+                'ordering': ['-created'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='outboxmessage',
+            index=models.Index(fields=['status', 'send_after'], name='core_outbox_ready_idx'),
+        ),
+    ]
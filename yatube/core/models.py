@@ -0,0 +1,68 @@
+from django.conf import settings
+from django.db import models
+from django.utils import timezone
+
+
+class RequestProfile(models.Model):
+    path = models.CharField('Адрес', max_length=255)
+    view_name = models.CharField('Имя URL', max_length=100, blank=True)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        blank=True,
+        null=True,
+        on_delete=models.SET_NULL,
+        related_name='request_profiles',
+        verbose_name='Пользователь',
+    )
+    duration = models.FloatField('Длительность, с')
+    samples = models.PositiveIntegerField('Сэмплов')
+    filename = models.CharField('Файл speedscope', max_length=255)
+    created = models.DateTimeField('Дата', auto_now_add=True)
+
+    def __str__(self):
+        return f'{self.path} ({self.duration:.3f} с)'
+
+    class Meta:
+        ordering = ['-created']
+        verbose_name = 'профиль запроса'
+        verbose_name_plural = 'профили запросов'
+
+
+class OutboxMessage(models.Model):
+    QUEUED = 'queued'
+    SENT = 'sent'
+    FAILED = 'failed'
+    STATUS_CHOICES = (
+        (QUEUED, 'В очереди'),
+        (SENT, 'Отправлено'),
+        (FAILED, 'Не отправлено'),
+    )
+
+    from_email = models.CharField('Отправитель', max_length=255)
+    recipients = models.TextField('Получатели, JSON')
+    subject = models.CharField('Тема', max_length=255, blank=True)
+    message = models.BinaryField('Письмо, MIME')
+    status = models.CharField(
+        'Состояние', max_length=10, choices=STATUS_CHOICES, default=QUEUED
+    )
+    attempts = models.PositiveSmallIntegerField('Попыток', default=0)
+    send_after = models.DateTimeField(
+        'Отправить не раньше', default=timezone.now
+    )
+    last_error = models.TextField('Последняя ошибка', blank=True)
+    created = models.DateTimeField('Создано', auto_now_add=True)
+    sent = models.DateTimeField('Отправлено', blank=True, null=True)
+
+    def __str__(self):
+        return f'{self.subject} → {self.recipients}'
+
+    class Meta:
+        ordering = ['-created']
+        indexes = [
+            models.Index(
+                fields=['status', 'send_after'],
+                name='core_outbox_ready_idx',
+            ),
+        ]
+        verbose_name = 'письмо'
+        verbose_name_plural = 'исходящие письма'
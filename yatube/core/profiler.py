@@ -0,0 +1,199 @@
+"""Семплирующий профайлер для отдельных запросов.
+
+Поток-семплер периодически снимает стек потока, обрабатывающего запрос,
+через ``sys._current_frames()``. Результат сохраняется в форматах
+collapsed stacks (для flamegraph.pl) и speedscope.
+"""
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+
+from django.conf import settings
+from django.core import signing
+
+TOKEN_SALT = 'core.profiler'
+# Форматы файлов профиля и их суффиксы.
+SUFFIXES = {
+    'speedscope': '.speedscope.json',
+    'collapsed': '.collapsed',
+}
+
+_busy = threading.Semaphore(1)
+
+
+def make_token(user, path):
+    """Подписанный токен для заголовка ``X-Yatube-Profile``: действует
+    только для страницы ``path`` и только пока ``user`` — персонал."""
+    return signing.dumps({'user': user.pk, 'path': path}, salt=TOKEN_SALT)
+
+
+def check_token(token, request):
+    """id выдавшего токен сотрудника или None, если токен не подходит
+    к запросу."""
+    from django.contrib.auth import get_user_model
+
+    try:
+        data = signing.loads(
+            token, salt=TOKEN_SALT, max_age=settings.PROFILER_TOKEN_MAX_AGE
+        )
+    except signing.BadSignature:
+        return None
+    if not isinstance(data, dict) or data.get('path') != request.path:
+        return None
+    user = request.user
+    if user.is_authenticated and user.pk != data.get('user'):
+        return None
+    staff = get_user_model().objects.filter(
+        pk=data.get('user'), is_staff=True, is_active=True
+    )
+    return data['user'] if staff.exists() else None
+
+
+class SamplingProfiler:
+    def __init__(self, thread_id, interval, max_seconds):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.max_seconds = max_seconds
+        self.samples = Counter()
+        self.duration = 0.0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+        self.duration = time.perf_counter() - self._started
+
+    def _run(self):
+        deadline = time.perf_counter() + self.max_seconds
+        while not self._stop.wait(self.interval):
+            if time.perf_counter() > deadline:
+                break
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                break
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(
+                    (code.co_name, code.co_filename, code.co_firstlineno)
+                )
+                frame = frame.f_back
+            self.samples[tuple(reversed(stack))] += 1
+
+    def collapsed(self):
+        """Формат ``func;func;func count`` по строке на стек."""
+        return ''.join(
+            '{} {}\n'.format(
+                ';'.join(f'{name} ({path}:{line})'
+                         for name, path, line in stack),
+                count,
+            )
+            for stack, count in self.samples.most_common()
+        )
+
+    def speedscope(self, name):
+        frames = []
+        indexes = {}
+        samples = []
+        weights = []
+        for stack, count in self.samples.items():
+            sample = []
+            for frame in stack:
+                if frame not in indexes:
+                    indexes[frame] = len(frames)
+                    frames.append(
+                        {'name': frame[0], 'file': frame[1], 'line': frame[2]}
+                    )
+                sample.append(indexes[frame])
+            samples.append(sample)
+            weights.append(count * self.interval)
+        return {
+            '$schema': 'https://www.speedscope.app/file-format-schema.json',
+            'exporter': 'yatube',
+            'name': name,
+            'activeProfileIndex': 0,
+            'shared': {'frames': frames},
+            'profiles': [{
+                'type': 'sampled',
+                'name': name,
+                'unit': 'seconds',
+                'startValue': 0,
+                'endValue': self.duration,
+                'samples': samples,
+                'weights': weights,
+            }],
+        }
+
+    def save(self, basename, name):
+        """Сохраняет оба формата и возвращает имя файла speedscope."""
+        directory = settings.PROFILER_DIR
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, basename)
+        with open(path + SUFFIXES['collapsed'], 'w') as collapsed:
+            collapsed.write(self.collapsed())
+        with open(path + SUFFIXES['speedscope'], 'w') as speedscope:
+            json.dump(self.speedscope(name), speedscope)
+        return basename + SUFFIXES['speedscope']
+
+
+def profile_requested(request):
+    """Профилирование включается подписанным заголовком или флагом в
+    строке запроса для персонала. Без них проверка стоит два поиска
+    в словарях. Профиль по токену записывается на выдавшего его."""
+    token = request.META.get('HTTP_X_YATUBE_PROFILE')
+    if token is not None:
+        request.profile_token_user = check_token(token, request)
+        return request.profile_token_user is not None
+    if settings.PROFILER_QUERY_PARAM in request.GET:
+        return request.user.is_staff
+    return False
+
+
+def run_profiled(request, get_response):
+    """Выполняет запрос под профайлером, если профайлер свободен."""
+    from .models import RequestProfile
+
+    if not _busy.acquire(blocking=False):
+        return get_response(request)
+    try:
+        profiler = SamplingProfiler(
+            threading.get_ident(),
+            settings.PROFILER_INTERVAL,
+            settings.PROFILER_MAX_SECONDS,
+        )
+        with profiler:
+            response = get_response(request)
+    finally:
+        _busy.release()
+    match = getattr(request, 'resolver_match', None)
+    view_name = match.view_name if match else ''
+    basename = '{}_{}_{}'.format(
+        time.strftime('%Y%m%d-%H%M%S'),
+        (view_name or 'unknown').replace(':', '-'),
+        uuid.uuid4().hex,
+    )
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        user_id = user.pk
+    else:
+        user_id = getattr(request, 'profile_token_user', None)
+    profile = RequestProfile.objects.create(
+        path=request.get_full_path()[:255],
+        view_name=view_name,
+        user_id=user_id,
+        duration=profiler.duration,
+        samples=sum(profiler.samples.values()),
+        filename=profiler.save(basename, f'{request.method} {request.path}'),
+    )
+    response['X-Yatube-Profile-Id'] = str(profile.pk)
+    return response
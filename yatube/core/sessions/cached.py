@@ -0,0 +1,87 @@
+"""Сессии в кеше с отложенной записью в базу.
+
+Как ``cached_db``, но обновлённая сессия пишется в базу не чаще раза в
+``SESSION_WRITE_BEHIND_SECONDS``: остальные сохранения идут только в
+кеш, а ключ сессии попадает в очередь процесса, которую фоновый поток
+сбрасывает в базу с тем же интервалом. Новые сессии, смена ключа и
+удаление пишутся в базу сразу. При остановке воркера несброшенные
+изменения остаются только в кеше, откуда их и прочитает следующий.
+
+Кеш ``SESSION_CACHE_ALIAS`` должен быть общим для воркеров: иначе
+воркер без сессии в кеше прочитает из базы устаревшую копию.
+"""
+import logging
+import threading
+
+from django.conf import settings
+from django.contrib.sessions.backends import cached_db, db
+from django.contrib.sessions.backends.base import UpdateError
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'core.sessions.cached'
+
+_pending = set()
+_lock = threading.Lock()
+_flusher = None
+
+
+class SessionStore(cached_db.SessionStore):
+    cache_key_prefix = KEY_PREFIX
+
+    def save(self, must_create=False):
+        if self.session_key is None:
+            return super().save(must_create)
+        due = self._cache.add(
+            self.cache_key + ':db', 1, settings.SESSION_WRITE_BEHIND_SECONDS
+        )
+        if must_create or due:
+            with _lock:
+                _pending.discard(self.session_key)
+            return super().save(must_create)
+        self._cache.set(self.cache_key, self._session, self.get_expiry_age())
+        _defer(self.session_key)
+
+    def delete(self, session_key=None):
+        with _lock:
+            _pending.discard(session_key or self.session_key)
+        super().delete(session_key)
+
+
+def _defer(session_key):
+    global _flusher
+    with _lock:
+        _pending.add(session_key)
+        if _flusher is None:
+            _flusher = threading.Thread(target=_flush_forever, daemon=True)
+            _flusher.start()
+
+
+def flush():
+    """Пишет в базу отложенные сессии; возвращает их число."""
+    with _lock:
+        keys = list(_pending)
+        _pending.clear()
+    for session_key in keys:
+        store = SessionStore(session_key)
+        data = store._cache.get(store.cache_key)
+        if data is None:
+            continue
+        store._session_cache = data
+        try:
+            db.SessionStore.save(store)
+        except UpdateError:
+            pass
+    return len(keys)
+
+
+def _flush_forever():
+    event = threading.Event()
+    while not event.wait(settings.SESSION_WRITE_BEHIND_SECONDS):
+        try:
+            flush()
+        except Exception:
+            logger.exception('Не удалось записать сессии в базу')
+        finally:
+            connections.close_all()
@@ -0,0 +1,80 @@
+"""Тег ``{% cache %}`` с защитой от лавины пересчётов.
+
+Синтаксис тот же, что у встроенного тега::
+
+    {% load stampede_cache %}
+    {% cache 20 index_page page_obj.number using="shm" %}...{% endcache %}
+"""
+from copy import copy
+
+from django.core.cache import InvalidCacheBackendError, caches
+from django.core.cache.utils import make_template_fragment_key
+from django.template import Library, TemplateSyntaxError, VariableDoesNotExist
+from django.templatetags.cache import CacheNode, do_cache
+
+from ..cache import stampede
+
+register = Library()
+
+
+class StampedeCacheNode(CacheNode):
+    def expire_time(self, context):
+        try:
+            expire_time = self.expire_time_var.resolve(context)
+        except VariableDoesNotExist:
+            raise TemplateSyntaxError(
+                '"cache" tag got an unknown variable: %r'
+                % self.expire_time_var.var
+            )
+        if expire_time is None:
+            return None
+        try:
+            return int(expire_time)
+        except (ValueError, TypeError):
+            raise TemplateSyntaxError(
+                '"cache" tag got a non-integer timeout value: %r'
+                % expire_time
+            )
+
+    def fragment_cache(self, context):
+        if not self.cache_name:
+            try:
+                return caches['template_fragments']
+            except InvalidCacheBackendError:
+                return caches['default']
+        try:
+            cache_name = self.cache_name.resolve(context)
+        except VariableDoesNotExist:
+            raise TemplateSyntaxError(
+                '"cache" tag got an unknown variable: %r'
+                % self.cache_name.var
+            )
+        try:
+            return caches[cache_name]
+        except InvalidCacheBackendError:
+            raise TemplateSyntaxError(
+                'Invalid cache name specified for cache tag: %r' % cache_name
+            )
+
+    def render(self, context):
+        """Фоновый пересчёт рендерит копию контекста: исходный к тому
+        времени уже будет разобран шаблоном."""
+        expire_time = self.expire_time(context)
+        fragment_cache = self.fragment_cache(context)
+        vary_on = [var.resolve(context) for var in self.vary_on]
+        snapshot = copy(context)
+        return stampede.get_or_set(
+            fragment_cache,
+            make_template_fragment_key(self.fragment_name, vary_on),
+            lambda: self.nodelist.render(snapshot),
+            expire_time,
+        )
+
+
+@register.tag('cache')
+def do_stampede_cache(parser, token):
+    node = do_cache(parser, token)
+    return StampedeCacheNode(
+        node.nodelist, node.expire_time_var, node.fragment_name,
+        node.vary_on, node.cache_name,
+    )
@@ -0,0 +1,48 @@
+from django.http import Http404
+from django.test import TestCase, override_settings
+
+from posts.models import Group
+
+from ..cache.hotrows import HotRowCache
+
+
+@override_settings(HOT_ROW_TTL=60, HOT_ROW_NEGATIVE_TTL=60)
+class HotRowCacheTests(TestCase):
+    def setUp(self):
+        self.rows = HotRowCache(Group, 'slug', maxsize=2)
+        self.group = Group.objects.create(
+            title='Группа', slug='group', description=''
+        )
+
+    def tearDown(self):
+        self.rows.clear()
+
+    def test_read_through(self):
+        self.assertEqual(self.rows.get('group'), self.group)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.rows.get_or_404('group'), self.group)
+
+    def test_missing_rows_are_cached(self):
+        with self.assertRaises(Http404):
+            self.rows.get_or_404('missing')
+        with self.assertNumQueries(0):
+            self.assertIsNone(self.rows.get('missing'))
+
+    def test_save_and_delete_invalidate(self):
+        self.rows.get('group')
+        self.rows.get('other')
+        Group.objects.create(title='Другая', slug='other', description='')
+        self.assertIsNotNone(self.rows.get('other'))
+        self.group.delete()
+        self.assertIsNone(self.rows.get('group'))
+
+    def test_size_is_bounded(self):
+        for slug in ('group', 'a', 'b'):
+            self.rows.get(slug)
+        self.assertEqual(list(self.rows._rows), ['a', 'b'])
+
+    def test_ttl(self):
+        self.rows = HotRowCache(Group, 'slug', negative_ttl=0)
+        self.rows.get('later')
+        Group.objects.filter(slug='group').update(slug='later')
+        self.assertIsNotNone(self.rows.get('later'))
@@ -0,0 +1,62 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Comment, Group, Post
+
+from ..db import identity
+
+User = get_user_model()
+
+
+class IdentityMapTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def create_posts(self, count):
+        for _ in range(count):
+            author = User.objects.create(
+                username=f'author{Post.objects.count()}'
+            )
+            group = Group.objects.create(
+                title='Группа', slug=f'group{author.pk}', description=''
+            )
+            Post.objects.create(text='Пост', author=author, group=group)
+
+    def index_queries(self):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('posts:index'))
+        return len(queries)
+
+    def test_index_queries_do_not_grow_with_posts(self):
+        self.create_posts(2)
+        few = self.index_queries()
+        self.create_posts(6)
+        self.assertEqual(self.index_queries(), few)
+
+    def test_related_objects_are_batched_and_shared(self):
+        author = User.objects.create(username='leo')
+        post = Post.objects.create(text='Пост', author=author)
+        for _ in range(3):
+            Comment.objects.create(post=post, author=author, text='...')
+        identity.activate()
+        try:
+            comments = list(Comment.objects.all())
+            with self.assertNumQueries(1):
+                authors = {id(comment.author) for comment in comments}
+            self.assertEqual(len(authors), 1)
+        finally:
+            identity.deactivate()
+
+    def test_inactive_outside_request(self):
+        author = User.objects.create(username='leo')
+        Post.objects.create(text='Пост', author=author)
+        Post.objects.create(text='Пост', author=author)
+        posts = list(Post.objects.all())
+        with self.assertNumQueries(2):
+            for post in posts:
+                post.author
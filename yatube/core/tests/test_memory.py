@@ -0,0 +1,62 @@
+import os
+import signal
+import tracemalloc
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from ..memory import monitor
+
+User = get_user_model()
+
+
+@override_settings(
+    MEMORY_MONITOR_ENABLED=True, MEMORY_SNAPSHOT_INTERVAL=0
+)
+class MemoryMonitorTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.staff = User.objects.create_user(username='staff', is_staff=True)
+
+    def setUp(self):
+        self.staff_client = Client()
+        self.staff_client.force_login(self.staff)
+
+    def tearDown(self):
+        tracemalloc.stop()
+        monitor._snapshot = None
+        monitor._recycling = False
+
+    def test_report_available_to_staff(self):
+        """После двух снимков отчёт о росте доступен персоналу."""
+        self.staff_client.get(reverse('posts:index'))
+        self.staff_client.get(reverse('posts:index'))
+        response = self.staff_client.get(reverse('core:memory'))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, f'pid {os.getpid()}')
+        self.assertTrue(tracemalloc.is_tracing())
+
+    def test_snapshot_on_demand(self):
+        """?snapshot делает снимок, только если слежение включено."""
+        url = reverse('core:memory') + '?snapshot'
+        with self.settings(MEMORY_MONITOR_ENABLED=False):
+            response = self.staff_client.get(url)
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(tracemalloc.is_tracing())
+        self.assertEqual(self.staff_client.get(url).status_code, 200)
+        self.assertIsNotNone(monitor._snapshot)
+
+    def test_memory_report_requires_staff(self):
+        """Гость перенаправляется на вход в админку."""
+        response = self.client.get(reverse('core:memory'))
+        self.assertEqual(response.status_code, 302)
+
+    @override_settings(MEMORY_MAX_RSS_MB=1)
+    def test_worker_recycled_over_rss_limit(self):
+        """При превышении порога RSS воркер получает сигнал после ответа."""
+        with mock.patch('core.memory.os.kill') as kill:
+            self.client.get(reverse('posts:index'))
+        kill.assert_called_once_with(os.getpid(), signal.SIGTERM)
@@ -0,0 +1,76 @@
+import os
+import shutil
+import subprocess
+import tempfile
+
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from ..metrics import REGISTRY, Metric, MmapedValues, collect
+
+TEMP_METRICS_DIR = tempfile.mkdtemp()
+
+
+@override_settings(METRICS_DIR=TEMP_METRICS_DIR)
+class MetricsTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_METRICS_DIR, ignore_errors=True)
+
+    def setUp(self):
+        self.guest_client = Client()
+
+    def test_request_latency_exported(self):
+        """Время ответа попадает в /metrics/ с именем URL."""
+        self.guest_client.get(reverse('posts:index'))
+        response = self.guest_client.get(reverse('core:metrics'))
+        content = response.content.decode()
+        self.assertIn(
+            'yatube_request_latency_seconds_count{view="posts:index"}',
+            content,
+        )
+        self.assertIn('yatube_db_query_seconds_bucket', content)
+
+    def test_values_of_all_processes_are_summed(self):
+        """Значения из файлов разных процессов суммируются."""
+        key = '["yatube_upload_bytes", "_count", [["view", "x"]]]'
+        for name in ('metrics_1.db', 'metrics_2.db'):
+            values = MmapedValues(os.path.join(TEMP_METRICS_DIR, name))
+            values.add(key, 2)
+            values.close()
+        totals = collect()
+        self.assertEqual(
+            totals['yatube_upload_bytes'][('_count', (('view', 'x'),))], 4
+        )
+
+    def test_files_of_dead_processes_are_archived(self):
+        """Файл умершего процесса переносится в архив, значения gauge
+        из него отбрасываются."""
+        gauge = Metric('yatube_test_gauge', 'Тест.')
+        gauge.cumulative = False
+        self.addCleanup(REGISTRY.pop, 'yatube_test_gauge')
+        counter = '["yatube_upload_bytes", "_count", [["view", "dead"]]]'
+        for amount in (2, 3):
+            process = subprocess.Popen(['true'])
+            process.wait()
+            path = os.path.join(
+                TEMP_METRICS_DIR, f'metrics_{process.pid}.db'
+            )
+            values = MmapedValues(path)
+            values.add(counter, amount)
+            values.add('["yatube_test_gauge", "", []]', 7)
+            values.close()
+            totals = collect()
+            self.assertFalse(os.path.exists(path))
+        self.assertEqual(
+            totals['yatube_upload_bytes'][('_count', (('view', 'dead'),))],
+            5,
+        )
+        self.assertNotIn('yatube_test_gauge', totals)
+
+    @override_settings(INTERNAL_IPS=[])
+    def test_metrics_forbidden_for_guests(self):
+        """Посторонним /metrics/ недоступен."""
+        response = self.guest_client.get(reverse('core:metrics'))
+        self.assertEqual(response.status_code, 403)
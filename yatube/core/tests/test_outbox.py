@@ -0,0 +1,150 @@
+import socketserver
+import threading
+import time
+from io import StringIO
+
+from django.core import mail
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from ..mail import OutboxSender, RateLimiter
+from ..models import OutboxMessage
+
+
+class SMTPHandler(socketserver.StreamRequestHandler):
+    """Минимальный SMTP-сервер: принимает письма и отклоняет адреса
+    из ``server.rejected``."""
+
+    def reply(self, line):
+        self.wfile.write(line.encode() + b'\r\n')
+
+    def handle(self):
+        self.server.connections += 1
+        self.reply('220 localhost')
+        recipients = []
+        while True:
+            line = self.rfile.readline().decode().strip()
+            command = line[:4].upper()
+            if not line or command == 'QUIT':
+                self.reply('221 bye')
+                return
+            if command in ('EHLO', 'HELO'):
+                self.reply('250 localhost')
+            elif command == 'RCPT':
+                address = line.split(':', 1)[1].strip('<> ')
+                if address in self.server.rejected:
+                    self.reply('550 no such user')
+                    continue
+                recipients.append(address)
+                self.reply('250 ok')
+            elif command == 'DATA':
+                self.reply('354 go ahead')
+                data = b''.join(iter(self.rfile.readline, b'.\r\n'))
+                self.server.messages.append((recipients, data))
+                recipients = []
+                self.reply('250 queued')
+            else:
+                self.reply('250 ok')
+
+
+class SMTPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), SMTPHandler)
+        self.connections = 0
+        self.messages = []
+        self.rejected = set()
+
+
+class OutboxTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = SMTPServer()
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        self.server.connections = 0
+        self.server.messages.clear()
+        self.server.rejected.clear()
+        self.settings = override_settings(
+            EMAIL_BACKEND='core.mail.OutboxEmailBackend',
+            OUTBOX_EMAIL_BACKEND='django.core.mail.backends.smtp.EmailBackend',
+            EMAIL_HOST='127.0.0.1',
+            EMAIL_PORT=self.server.server_address[1],
+            OUTBOX_RATE_LIMIT=0,
+            OUTBOX_MAX_ATTEMPTS=2,
+        )
+        self.settings.enable()
+
+    def tearDown(self):
+        self.settings.disable()
+
+    def send(self, *recipients):
+        for recipient in recipients:
+            mail.send_mail('Сброс пароля', 'Ссылка', 'yatube@example.com',
+                           [recipient])
+
+    def test_backend_only_stores_messages(self):
+        self.send('leo@example.com')
+        self.assertEqual(self.server.connections, 0)
+        stored = OutboxMessage.objects.get()
+        self.assertEqual(stored.status, OutboxMessage.QUEUED)
+        self.assertIn(b'leo@example.com', bytes(stored.message))
+
+    def test_batch_is_sent_over_one_connection(self):
+        self.send('a@example.com', 'b@example.com', 'c@example.com')
+        sender = OutboxSender()
+        self.assertEqual(sender.send_batch(), 3)
+        sender.close()
+        self.assertEqual(self.server.connections, 1)
+        self.assertEqual(
+            [recipients for recipients, _ in self.server.messages],
+            [['a@example.com'], ['b@example.com'], ['c@example.com']],
+        )
+        self.assertIn('Subject: =?utf-8?b?', self.server.messages[0][1]
+                      .decode())
+        self.assertEqual(
+            OutboxMessage.objects.filter(status=OutboxMessage.SENT).count(),
+            3,
+        )
+
+    def test_failed_messages_are_retried_then_given_up(self):
+        self.server.rejected.add('bad@example.com')
+        self.send('bad@example.com', 'good@example.com')
+        sender = OutboxSender()
+        sender.send_batch()
+        bad = OutboxMessage.objects.get(recipients__contains='bad')
+        self.assertEqual((bad.status, bad.attempts),
+                         (OutboxMessage.QUEUED, 1))
+        self.assertGreater(bad.send_after, bad.created)
+        self.assertEqual(len(self.server.messages), 1)
+        OutboxMessage.objects.filter(pk=bad.pk).update(
+            send_after=bad.created
+        )
+        sender.send_batch()
+        sender.close()
+        bad.refresh_from_db()
+        self.assertEqual(bad.status, OutboxMessage.FAILED)
+
+    def test_command_drains_outbox(self):
+        self.send('a@example.com', 'b@example.com')
+        out = StringIO()
+        call_command('send_outbox', drain=True, stdout=out)
+        self.assertIn('2', out.getvalue())
+        self.assertEqual(len(self.server.messages), 2)
+
+    def test_rate_limit(self):
+        limiter = RateLimiter(50)
+        start = time.monotonic()
+        for _ in range(6):
+            limiter.wait()
+        self.assertGreaterEqual(time.monotonic() - start, 0.09)
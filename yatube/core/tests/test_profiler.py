@@ -0,0 +1,94 @@
+import os
+import shutil
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from ..models import RequestProfile
+
+User = get_user_model()
+TEMP_PROFILER_DIR = tempfile.mkdtemp()
+
+
+@override_settings(PROFILER_DIR=TEMP_PROFILER_DIR, PROFILER_INTERVAL=0.001)
+class ProfilerTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.staff = User.objects.create_user(username='staff', is_staff=True)
+        cls.user = User.objects.create_user(username='user')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_PROFILER_DIR, ignore_errors=True)
+
+    def setUp(self):
+        self.staff_client = Client()
+        self.staff_client.force_login(self.staff)
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def test_staff_flag_saves_profile(self):
+        """Флаг _profile у персонала сохраняет профиль запроса."""
+        response = self.staff_client.get(
+            reverse('posts:index'), {'_profile': 1}
+        )
+        profile = RequestProfile.objects.get()
+        self.assertEqual(response['X-Yatube-Profile-Id'], str(profile.pk))
+        self.assertEqual(profile.view_name, 'posts:index')
+        self.assertTrue(
+            os.path.exists(os.path.join(TEMP_PROFILER_DIR, profile.filename))
+        )
+        download = self.staff_client.get(
+            reverse('core:profile_download', args=(profile.pk, 'collapsed'))
+        )
+        self.assertEqual(download.status_code, 200)
+        unknown = self.staff_client.get(
+            reverse('core:profile_download', args=(profile.pk, 'pprof'))
+        )
+        self.assertEqual(unknown.status_code, 404)
+
+    def test_profiles_get_distinct_files(self):
+        """Профили одного представления в одну секунду не затирают друг
+        друга."""
+        for _ in range(2):
+            self.staff_client.get(reverse('posts:index'), {'_profile': 1})
+        filenames = set(
+            RequestProfile.objects.values_list('filename', flat=True)
+        )
+        self.assertEqual(len(filenames), 2)
+
+    def test_flag_ignored_for_regular_users(self):
+        """Обычный пользователь не может включить профайлер."""
+        response = self.authorized_client.get(
+            reverse('posts:index'), {'_profile': 1}
+        )
+        self.assertNotIn('X-Yatube-Profile-Id', response)
+        self.assertFalse(RequestProfile.objects.exists())
+
+    def test_signed_header(self):
+        """Заголовок с токеном персонала включает профайлер только для
+        той страницы, для которой токен выдан."""
+        index = reverse('posts:index')
+        token = self.staff_client.get(
+            reverse('core:profile_token'), {'path': index}
+        ).content.decode().strip()
+        self.client.get(index, HTTP_X_YATUBE_PROFILE='forged')
+        self.client.get(reverse('about:author'), HTTP_X_YATUBE_PROFILE=token)
+        self.authorized_client.get(index, HTTP_X_YATUBE_PROFILE=token)
+        self.assertFalse(RequestProfile.objects.exists())
+        self.client.get(index, HTTP_X_YATUBE_PROFILE=token)
+        self.assertEqual(RequestProfile.objects.get().user, self.staff)
+        User.objects.filter(pk=self.staff.pk).update(is_staff=False)
+        self.client.get(index, HTTP_X_YATUBE_PROFILE=token)
+        self.assertEqual(RequestProfile.objects.count(), 1)
+
+    def test_tokens_issued_only_to_staff(self):
+        url = reverse('core:profile_token')
+        response = self.authorized_client.get(url, {'path': '/'})
+        self.assertEqual(response.status_code, 302)
+        response = self.staff_client.get(url)
+        self.assertEqual(response.status_code, 400)
@@ -0,0 +1,90 @@
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test import TransactionTestCase
+
+from posts.models import Group, Post
+
+from ..db.querycache import cached
+
+User = get_user_model()
+
+
+class QueryCacheTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание'
+        )
+
+    def test_repeated_query_hits_cache(self):
+        Group.objects.cache().get(slug='group')
+        Group.objects.cache().count()
+        with self.assertNumQueries(0):
+            self.assertEqual(Group.objects.cache().get(slug='group'),
+                             self.group)
+            self.assertEqual(Group.objects.cache().count(), 1)
+
+    def test_other_database_file_does_not_share_results(self):
+        """Тестовая и рабочая база под одним алиасом не делят записи."""
+        Group.objects.cache().get(slug='group')
+        with mock.patch.dict(connection.settings_dict, NAME='other.sqlite3'):
+            with self.assertNumQueries(1):
+                Group.objects.cache().get(slug='group')
+
+    def test_shared_caches_are_per_test_run(self):
+        location = settings.CACHES['shm']['LOCATION']
+        self.assertFalse(location.startswith(settings.BASE_DIR))
+
+    def test_uncached_queryset_queries_database(self):
+        Group.objects.get(slug='group')
+        with self.assertNumQueries(1):
+            Group.objects.get(slug='group')
+
+    def test_save_and_delete_invalidate(self):
+        self.assertEqual(Group.objects.cache().get(slug='group').title,
+                         'Группа')
+        self.group.title = 'Новая'
+        self.group.save()
+        self.assertEqual(Group.objects.cache().get(slug='group').title,
+                         'Новая')
+        self.group.delete()
+        self.assertFalse(Group.objects.cache().filter(slug='group'))
+
+    def test_update_and_bulk_create_invalidate(self):
+        self.assertEqual(len(Group.objects.cache()), 1)
+        Group.objects.filter(slug='group').update(title='Новая')
+        self.assertEqual(Group.objects.cache().get().title, 'Новая')
+        Group.objects.bulk_create([
+            Group(title='Вторая', slug='second', description='')
+        ])
+        self.assertEqual(Group.objects.cache().count(), 2)
+
+    def test_joined_tables_invalidate(self):
+        author = User.objects.create(username='author')
+        Post.objects.create(text='Пост', author=author, group=self.group)
+        filtered = Post.objects.cache().filter(group__title='Группа')
+        self.assertEqual(filtered.count(), 1)
+        Group.objects.filter(pk=self.group.pk).update(title='Другая')
+        self.assertEqual(
+            Post.objects.cache().filter(group__title='Группа').count(), 0
+        )
+
+    def test_models_with_plain_manager(self):
+        User.objects.create(username='leo')
+        cached(User).get(username='leo')
+        with self.assertNumQueries(0):
+            cached(User).get(username='leo')
+        user = User.objects.get(username='leo')
+        user.first_name = 'Лев'
+        user.save()
+        self.assertEqual(cached(User).get(username='leo').first_name, 'Лев')
+
+    def test_not_cached_inside_transaction(self):
+        with transaction.atomic():
+            Group.objects.cache().get(slug='group')
+            with self.assertNumQueries(1):
+                Group.objects.cache().get(slug='group')
@@ -0,0 +1,64 @@
+from django.contrib.auth import get_user_model
+from django.test import Client, RequestFactory, TestCase, override_settings
+from django.urls import resolve, reverse
+
+from posts.models import Post
+from ..db.routers import ReplicaRouter, reads_from_replica
+from ..middleware import ReplicaMiddleware
+
+User = get_user_model()
+
+
+@override_settings(REPLICA_DATABASES=['replica'])
+class ReplicaRoutingTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='reader')
+        cls.post = Post.objects.create(author=cls.user, text='Тестовый пост')
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.router = ReplicaRouter()
+        self.middleware = ReplicaMiddleware(lambda request: None)
+
+    def process(self, request):
+        request.resolver_match = resolve(request.path)
+        self.middleware.process_view(request, None, (), {})
+        return reads_from_replica()
+
+    def test_read_views_use_replica(self):
+        """Страницы только для чтения читают с реплики."""
+        self.assertTrue(self.process(self.factory.get(reverse('posts:index'))))
+        self.assertEqual(self.router.db_for_read(Post), 'replica')
+        self.assertEqual(self.router.db_for_write(Post), 'default')
+
+    def test_pinned_user_reads_primary(self):
+        """С cookie привязки чтение идёт из основной базы."""
+        request = self.factory.get(reverse('posts:index'))
+        request.COOKIES['pin_primary'] = '1'
+        self.assertFalse(self.process(request))
+        self.assertEqual(self.router.db_for_read(Post), 'default')
+
+    def test_replicas_are_not_migrated(self):
+        self.assertFalse(self.router.allow_migrate('replica', 'posts'))
+
+
+class ReplicaPinCookieTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='writer')
+        cls.post = Post.objects.create(author=cls.user, text='Тестовый пост')
+
+    def test_write_sets_pin_cookie(self):
+        """После записи пользователь привязан к основной базе."""
+        client = Client()
+        client.force_login(self.user)
+        response = client.post(
+            reverse('posts:add_comment', args=(self.post.id,)),
+            {'text': 'Комментарий'},
+        )
+        self.assertIn('pin_primary', response.cookies)
+        response = client.get(reverse('posts:index'))
+        self.assertNotIn('pin_primary', response.cookies)
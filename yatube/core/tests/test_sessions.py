@@ -0,0 +1,76 @@
+from django.contrib.auth import get_user_model
+from django.contrib.sessions.models import Session
+from django.test import TestCase
+from django.urls import reverse
+
+from ..auth import SESSION_USER_KEY
+from ..sessions import cached
+
+User = get_user_model()
+
+
+class CachedSessionTests(TestCase):
+    def test_changes_are_written_behind(self):
+        store = cached.SessionStore()
+        store['theme'] = 'light'
+        store.save()
+        store['theme'] = 'dark'
+        store.save()
+        row = Session.objects.get(session_key=store.session_key)
+        self.assertEqual(row.get_decoded()['theme'], 'light')
+        self.assertEqual(
+            cached.SessionStore(store.session_key)['theme'], 'dark'
+        )
+        cached.flush()
+        row = Session.objects.get(session_key=store.session_key)
+        self.assertEqual(row.get_decoded()['theme'], 'dark')
+
+    def test_delete_drops_pending_write(self):
+        store = cached.SessionStore()
+        store['theme'] = 'light'
+        store.save()
+        store['theme'] = 'dark'
+        store.save()
+        store.delete()
+        self.assertEqual(cached.flush(), 0)
+        self.assertFalse(Session.objects.exists())
+
+
+class CachedUserTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='leo', password='pw')
+        self.client.force_login(self.user)
+        self.url = reverse('about:author')
+
+    def test_authenticated_request_without_auth_queries(self):
+        self.client.get(self.url)
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url)
+        self.assertEqual(response.wsgi_request.user, self.user)
+        self.assertEqual(response.wsgi_request.user.username, 'leo')
+
+    def test_password_hash_is_not_stored(self):
+        response = self.client.get(self.url)
+        stored = repr(response.wsgi_request.session[SESSION_USER_KEY])
+        self.assertIn('leo', stored)
+        self.assertNotIn(self.user.password, stored)
+        with self.assertNumQueries(1):
+            self.assertEqual(
+                self.client.get(self.url).wsgi_request.user.password,
+                self.user.password,
+            )
+
+    def test_profile_change_reloads_user(self):
+        self.client.get(self.url)
+        self.user.first_name = 'Лев'
+        self.user.save()
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url)
+        self.assertEqual(response.wsgi_request.user.first_name, 'Лев')
+
+    def test_password_change_logs_out(self):
+        self.client.get(self.url)
+        self.user.set_password('new')
+        self.user.save()
+        response = self.client.get(self.url)
+        self.assertFalse(response.wsgi_request.user.is_authenticated)
@@ -0,0 +1,87 @@
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import SimpleTestCase
+
+from ..cache.backends import SharedMemoryCache
+
+TEMP_CACHE_DIR = tempfile.mkdtemp()
+
+
+def set_in_child(location):
+    cache = SharedMemoryCache(location, {})
+    cache.set('from_child', os.getpid())
+
+
+class SharedMemoryCacheTests(SimpleTestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_CACHE_DIR, ignore_errors=True)
+
+    def make_cache(self, name, **options):
+        return SharedMemoryCache(
+            os.path.join(TEMP_CACHE_DIR, name), {'OPTIONS': options}
+        )
+
+    def setUp(self):
+        self.cache = self.make_cache('main', SIZE=1024 * 1024, SLOTS=1024,
+                                     PAGE_SIZE=64 * 1024)
+        self.cache.clear()
+
+    def test_basic_operations(self):
+        self.cache.set('index_page', '<h1>Посты</h1>')
+        self.assertEqual(self.cache.get('index_page'), '<h1>Посты</h1>')
+        self.cache.set_many({'a': 1, 'b': [2]})
+        self.assertEqual(self.cache.get_many(['a', 'b', 'c']),
+                         {'a': 1, 'b': [2]})
+        self.assertEqual(self.cache.incr('a', 4), 5)
+        self.assertFalse(self.cache.add('a', 10))
+        self.cache.delete('a')
+        self.assertIsNone(self.cache.get('a'))
+        with self.assertRaises(ValueError):
+            self.cache.incr('a')
+
+    def test_timeout(self):
+        self.cache.set('short', 1, timeout=0.05)
+        self.cache.set('forever', 1, timeout=None)
+        time.sleep(0.1)
+        self.assertIsNone(self.cache.get('short'))
+        self.assertEqual(self.cache.get('forever'), 1)
+
+    def test_values_larger_than_page_are_skipped(self):
+        self.cache.set('huge', 'x' * 128 * 1024)
+        self.assertIsNone(self.cache.get('huge'))
+
+    def test_least_recently_read_is_evicted(self):
+        """При нехватке места вытесняются давно не читанные ключи."""
+        cache = self.make_cache('small', SIZE=128 * 1024, SLOTS=1024,
+                                PAGE_SIZE=4096)
+        cache.clear()
+        cache.set('hot', 'x' * 200)
+        for number in range(400):
+            cache.get('hot')
+            cache.set(f'cold{number}', 'x' * 200)
+        self.assertEqual(cache.get('hot'), 'x' * 200)
+        survived = [
+            cache.get(f'cold{number}') is not None for number in range(400)
+        ]
+        self.assertLess(sum(survived[:100]), sum(survived[-100:]))
+
+    def test_shared_between_processes(self):
+        process = multiprocessing.get_context('fork').Process(
+            target=set_in_child, args=(os.path.join(TEMP_CACHE_DIR, 'main'),)
+        )
+        process.start()
+        process.join()
+        self.assertEqual(self.cache.get('from_child'), process.pid)
+
+    def test_bench_command(self):
+        out = StringIO()
+        call_command('cache_bench', seconds=0.1, workers=1, stdout=out)
+        self.assertIn('shm', out.getvalue())
@@ -0,0 +1,36 @@
+import sqlite3
+from io import StringIO
+
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+
+from ..db.backends.sqlite3.base import apply_pragmas
+
+
+class SQLiteBackendTests(TestCase):
+    def pragma(self, name):
+        with connection.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    def test_pragmas_applied_to_new_connections(self):
+        """PRAGMA из OPTIONS выполняются на соединении."""
+        self.assertEqual(self.pragma('synchronous'), 1)
+        self.assertEqual(self.pragma('busy_timeout'), 20000)
+        self.assertEqual(self.pragma('cache_size'), -64 * 1024)
+
+    def test_unsafe_pragma_rejected(self):
+        """Значения PRAGMA не подставляются в SQL как есть."""
+        conn = sqlite3.connect(':memory:')
+        with self.assertRaises(ImproperlyConfigured):
+            apply_pragmas(conn, {'synchronous': '0; DROP TABLE posts_post'})
+        conn.close()
+
+    def test_benchmark_command(self):
+        """Бенчмарк печатает строки для обоих режимов."""
+        out = StringIO()
+        call_command('sqlite_bench', seconds=0.2, rows=100, stdout=out)
+        self.assertIn('default', out.getvalue())
+        self.assertIn('tuned', out.getvalue())
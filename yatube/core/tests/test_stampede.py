@@ -0,0 +1,91 @@
+import threading
+import time
+
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+from django.template import Context, Template
+from django.test import SimpleTestCase, override_settings
+
+from ..cache import stampede
+
+
+@override_settings(STAMPEDE_WAIT_SECONDS=2)
+class StampedeTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.calls = 0
+
+    def slow_compute(self):
+        self.calls += 1
+        time.sleep(0.2)
+        return 'лента'
+
+    def test_concurrent_misses_compute_once(self):
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(
+                stampede.get_or_set(cache, 'feed', self.slow_compute, 20)
+            ))
+            for _ in range(4)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(results, ['лента'] * 4)
+
+    def test_stale_value_is_served_while_refreshing(self):
+        cache.set('feed', ('старая', 0.0, time.time() - 1), 60)
+        value = stampede.get_or_set(cache, 'feed', self.slow_compute, 20)
+        self.assertEqual(value, 'старая')
+        deadline = time.monotonic() + 2
+        while cache.get('feed')[0] != 'лента' and time.monotonic() < deadline:
+            time.sleep(0.05)
+        self.assertEqual(cache.get('feed')[0], 'лента')
+        self.assertEqual(self.calls, 1)
+
+    def test_stale_value_is_refreshed_inline_without_background(self):
+        cache.set('feed', ('старая', 0.0, time.time() - 1), 60)
+        value = stampede.get_or_set(
+            cache, 'feed', self.slow_compute, 20, background=False
+        )
+        self.assertEqual(value, 'лента')
+
+    def test_zero_timeout_is_not_cached(self):
+        """``timeout=0`` не кладёт значение в кеш, как и у ``cache.set``."""
+        for _ in range(2):
+            value = stampede.get_or_set(cache, 'feed', self.slow_compute, 0)
+            self.assertEqual(value, 'лента')
+        self.assertEqual(self.calls, 2)
+        self.assertIsNone(cache.get('feed'))
+        stampede.compute_and_set(cache, 'feed', self.slow_compute, 0)
+        self.assertIsNone(cache.get('feed'))
+
+    def test_early_expiration_probability(self):
+        now = time.time()
+        self.assertFalse(stampede.should_refresh(0.0, now + 10, now=now))
+        self.assertTrue(stampede.should_refresh(0.0, now - 1, now=now))
+        early = sum(
+            stampede.should_refresh(1.0, now + 1, beta=1.0, now=now)
+            for _ in range(1000)
+        )
+        self.assertTrue(100 < early < 700)
+
+    def test_template_tag(self):
+        template = Template(
+            '{% load stampede_cache %}'
+            '{% cache 20 fragment name %}{{ name }}{% endcache %}'
+        )
+        self.assertEqual(template.render(Context({'name': 'Лев'})), 'Лев')
+        self.assertEqual(template.render(Context({'name': 'Лев'})), 'Лев')
+        self.assertEqual(template.render(Context({'name': 'Оля'})), 'Оля')
+
+    def test_template_tag_reads_plain_fragments(self):
+        """Фрагменты, положенные встроенным тегом, отдаются как есть."""
+        cache.set(make_template_fragment_key('fragment', ['Лев']), 'старое')
+        template = Template(
+            '{% load stampede_cache %}'
+            '{% cache 20 fragment name %}{{ name }}{% endcache %}'
+        )
+        self.assertEqual(template.render(Context({'name': 'Лев'})), 'старое')
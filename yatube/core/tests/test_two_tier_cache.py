@@ -0,0 +1,100 @@
+import os
+import shutil
+import tempfile
+import time
+from collections import OrderedDict
+from unittest import mock
+
+from django.core.cache import caches
+from django.test import SimpleTestCase, override_settings
+
+from ..cache.backends import TwoTierCache
+
+TEMP_CACHE_DIR = tempfile.mkdtemp()
+
+
+@override_settings(CACHES={
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(TEMP_CACHE_DIR, 'shared'),
+    },
+})
+class TwoTierCacheTests(SimpleTestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_CACHE_DIR, ignore_errors=True)
+
+    def make_cache(self):
+        """Экземпляр с собственным L1 — как в отдельном воркере."""
+        cache = TwoTierCache(
+            os.path.join(TEMP_CACHE_DIR, 'generations'),
+            {'OPTIONS': {'L2': 'shared', 'L1_TIMEOUT': 60}},
+        )
+        cache._l1 = OrderedDict()
+        return cache
+
+    def setUp(self):
+        caches['shared'].clear()
+        self.worker_one = self.make_cache()
+        self.worker_two = self.make_cache()
+
+    def test_value_served_from_l1(self):
+        """Повторное чтение не обращается к L2."""
+        self.worker_one.set('index_page', 'html')
+        caches['shared'].delete('index_page')
+        self.assertEqual(self.worker_one.get('index_page'), 'html')
+
+    def test_delete_invalidates_other_workers(self):
+        """Удаление в одном воркере сбрасывает L1 в другом."""
+        self.worker_one.set('index_page', 'old')
+        self.assertEqual(self.worker_two.get('index_page'), 'old')
+        self.worker_one.delete('index_page')
+        self.assertIsNone(self.worker_two.get('index_page'))
+        self.worker_one.set('index_page', 'new')
+        self.assertEqual(self.worker_two.get('index_page'), 'new')
+
+    def test_concurrent_set_is_not_shadowed_by_older_value(self):
+        """Запись другого воркера между сменой поколения и заполнением
+        L1 не оставляет в L1 старое значение под новым поколением."""
+        generations = self.worker_one._generations
+        bump = generations.bump
+        concurrent = [('index_page', 'new')]
+
+        def bump_then_other_worker_sets(key):
+            generation = bump(key)
+            if concurrent:
+                self.worker_two.set(*concurrent.pop())
+            return generation
+
+        with mock.patch.object(
+                generations, 'bump', bump_then_other_worker_sets):
+            self.worker_one.set('index_page', 'old')
+        self.assertEqual(self.worker_one.get('index_page'), 'new')
+
+    def test_clear_invalidates_everything(self):
+        self.worker_one.set_many({'a': 1, 'b': 2})
+        self.assertEqual(self.worker_two.get_many(['a', 'b']),
+                         {'a': 1, 'b': 2})
+        self.worker_one.clear()
+        self.assertEqual(self.worker_two.get_many(['a', 'b']), {})
+
+    def test_l1_copy_expires_with_l2(self):
+        """Копия в L1 живёт не дольше значения в L2."""
+        self.worker_one.set('index_page', 'html', 0.2)
+        self.assertEqual(self.worker_two.get('index_page'), 'html')
+        self.worker_two.touch('index_page', 0.2)
+        self.assertEqual(self.worker_one.get('index_page'), 'html')
+        time.sleep(0.3)
+        self.assertIsNone(self.worker_one.get('index_page'))
+        self.assertIsNone(self.worker_two.get('index_page'))
+
+    def test_incr_keeps_expiry(self):
+        self.worker_one.set('counter', 1, 60)
+        self.assertEqual(self.worker_two.incr('counter', 2), 3)
+        self.assertEqual(self.worker_one.get('counter'), 3)
+        with self.assertRaises(ValueError):
+            self.worker_one.incr('missing')
@@ -0,0 +1,135 @@
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import OperationalError
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts import sharding, tags
+from posts.models import Post, ShardBucket
+from ..db import writes
+
+User = get_user_model()
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+@override_settings(WRITE_RETRY_BACKOFF=0.001)
+class WritePathTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='writer')
+
+    def setUp(self):
+        cache.clear()
+        writes.clear_read_only()
+        self.addCleanup(writes.clear_read_only)
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def test_locked_write_is_retried(self):
+        """Запись повторяется, пока база заблокирована."""
+        calls = []
+
+        def flaky():
+            calls.append(1)
+            if len(calls) < 3:
+                raise OperationalError('database is locked')
+            return 'ok'
+
+        self.assertEqual(writes.run_write(flaky), 'ok')
+        self.assertEqual(len(calls), 3)
+
+    @override_settings(WRITE_RETRIES=1)
+    def test_exhausted_retries_switch_to_read_only(self):
+        """После неудачных повторов запись отключается, чтение работает."""
+        locked = mock.Mock(side_effect=OperationalError('database is locked'))
+        with self.assertRaises(writes.WritesUnavailable):
+            writes.run_write(locked)
+        self.assertTrue(writes.is_read_only())
+        response = self.authorized_client.post(
+            reverse('posts:post_create'), {'text': 'Новый пост'}
+        )
+        self.assertEqual(response.status_code, 503)
+        self.assertTemplateUsed(response, 'core/503.html')
+        self.assertFalse(Post.objects.exists())
+        response = self.authorized_client.get(reverse('posts:index'))
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(WRITE_QUEUE_SIZE=0)
+    def test_full_queue_sheds_writes(self):
+        """При переполненной очереди запись отклоняется сразу."""
+        with self.assertRaises(writes.WritesUnavailable):
+            writes.run_write(mock.Mock())
+
+    def test_retry_removes_files_of_failed_attempt(self):
+        """Повтор представления не оставляет файлы отменённой попытки."""
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media)
+        update_post_tags = tags.update_post_tags
+        failures = [OperationalError('database is locked')]
+
+        def flaky(post):
+            if failures:
+                raise failures.pop()
+            update_post_tags(post)
+
+        image = SimpleUploadedFile(
+            'small.gif', SMALL_GIF, content_type='image/gif'
+        )
+        with self.settings(MEDIA_ROOT=media), \
+                mock.patch('posts.views.tags.update_post_tags', flaky):
+            self.authorized_client.post(
+                reverse('posts:post_create'),
+                {'text': 'С картинкой', 'image': image},
+            )
+        post = Post.objects.get()
+        self.assertEqual(
+            os.listdir(os.path.join(media, 'posts')),
+            [os.path.basename(post.image.name)],
+        )
+
+
+@override_settings(POST_SHARDS=['default', 'shard2'])
+class ShardedWriteTests(TestCase):
+    databases = {'default', 'shard2'}
+
+    def setUp(self):
+        cache.clear()
+        writes.clear_read_only()
+        self.user = User.objects.create_user(username='writer')
+        ShardBucket.objects.create(
+            bucket=sharding.bucket_for_author(self.user.pk),
+            database='shard2',
+        )
+        sharding.reset_bucket_map()
+        self.addCleanup(sharding.reset_bucket_map)
+        self.client.force_login(self.user)
+
+    def test_transaction_is_opened_on_the_shard(self):
+        """BEGIN IMMEDIATE берётся и в шарде, куда пишется пост."""
+        opened = []
+        immediate_atomic = writes.immediate_atomic
+
+        def recording(using):
+            opened.append(using)
+            return immediate_atomic(using)
+
+        with mock.patch.object(writes, 'immediate_atomic', recording):
+            self.client.post(reverse('posts:post_create'), {'text': 'Пост'})
+        self.assertEqual(opened, ['default', 'shard2'])
+        self.assertTrue(
+            Post.objects.using('shard2').filter(text='Пост').exists()
+        )
@@ -0,0 +1,14 @@
+from sorl.thumbnail.base import ThumbnailBackend
+
+from .metrics import THUMBNAIL_SECONDS
+
+
+class MetricsThumbnailBackend(ThumbnailBackend):
+    """Бэкенд sorl-thumbnail, замеряющий генерацию миниатюр."""
+
+    def _create_thumbnail(self, source_image, geometry_string, options,
+                          thumbnail):
+        with THUMBNAIL_SECONDS.time():
+            super()._create_thumbnail(
+                source_image, geometry_string, options, thumbnail
+            )
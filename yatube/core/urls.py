@@ -0,0 +1,15 @@
+from django.urls import path
+from . import views
+
+app_name = 'core'
+
+urlpatterns = [
+    path('metrics/', views.metrics, name='metrics'),
+    path('memory/', views.memory_report, name='memory'),
+    path('profiles/token/', views.profile_token, name='profile_token'),
+    path(
+        'profiles/<int:profile_id>/<str:fmt>/',
+        views.profile_download,
+        name='profile_download',
+    ),
+]
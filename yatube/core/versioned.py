@@ -0,0 +1,91 @@
+"""Файлы, пересобираемые целиком и читаемые всеми воркерами.
+
+Каждая сборка пишется в новый каталог внутри ``root``, после чего файл
+``CURRENT`` атомарно переписывается на его имя. Читатели проверяют
+``CURRENT`` не чаще раза в заданный интервал и переоткрывают данные
+при смене версии. Старые каталоги, кроме ``KEEP_VERSIONS`` последних,
+удаляются: уже открытые через ``mmap`` файлы остаются доступны
+процессам, пока те их не закроют.
+"""
+import os
+import shutil
+import threading
+import time
+
+from django.conf import settings
+
+POINTER = 'CURRENT'
+KEEP_VERSIONS = 2
+
+
+def _pointer(root):
+    return os.path.join(root, POINTER)
+
+
+def current_version(root):
+    try:
+        with open(_pointer(root)) as pointer:
+            return pointer.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def publish(write, root):
+    """Вызывает ``write(каталог)`` для новой версии и делает её
+    текущей. Возвращает имя версии."""
+    os.makedirs(root, exist_ok=True)
+    version = f'{time.time_ns()}-{os.getpid()}'
+    directory = os.path.join(root, version)
+    os.makedirs(directory)
+    try:
+        write(directory)
+    except BaseException:
+        shutil.rmtree(directory, ignore_errors=True)
+        raise
+    temporary = _pointer(root) + f'.{os.getpid()}'
+    with open(temporary, 'w') as pointer:
+        pointer.write(version)
+    os.replace(temporary, _pointer(root))
+    versions = sorted(
+        name for name in os.listdir(root)
+        if os.path.isdir(os.path.join(root, name))
+    )
+    for name in versions[:-KEEP_VERSIONS]:
+        shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+    return version
+
+
+class Current:
+    """Открытая в процессе текущая версия.
+
+    ``root_setting`` и ``interval_setting`` — имена настроек, читаются
+    при каждой проверке, ``load(каталог)`` открывает версию.
+    """
+
+    def __init__(self, root_setting, interval_setting, load):
+        self.root_setting = root_setting
+        self.interval_setting = interval_setting
+        self.load = load
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.version = None
+        self.value = None
+        self.checked_at = float('-inf')
+
+    def get(self):
+        """Данные текущей версии или None, если сборок ещё не было."""
+        now = time.monotonic()
+        if now - self.checked_at < getattr(settings, self.interval_setting):
+            return self.value
+        with self._lock:
+            self.checked_at = now
+            root = getattr(settings, self.root_setting)
+            version = current_version(root)
+            if version is None:
+                self.version = self.value = None
+            elif version != self.version:
+                self.value = self.load(os.path.join(root, version))
+                self.version = version
+        return self.value
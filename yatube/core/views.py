@@ -1,4 +1,17 @@
-from django.shortcuts import render
+import os
+
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.core.exceptions import PermissionDenied
+from django.http import (
+    FileResponse, Http404, HttpResponse, HttpResponseBadRequest,
+)
+from django.shortcuts import get_object_or_404, render
+
+from .memory import monitor, rss_bytes
+from .metrics import generate_latest
+from .models import RequestProfile
+from .profiler import SUFFIXES, make_token
 
 
 def page_not_found(request, exception):
@@ -15,3 +28,70 @@ def server_error(request):
 
 def permission_denied(request, exception):
     return render(request, 'core/403.html', status=403)
+
+
+def metrics(request):
+    """Метрики для Prometheus: доступны с внутренних адресов и персоналу."""
+    if (request.META.get('REMOTE_ADDR') not in settings.INTERNAL_IPS
+            and not request.user.is_staff):
+        raise PermissionDenied
+    return HttpResponse(
+        generate_latest(),
+        content_type='text/plain; version=0.0.4; charset=utf-8',
+    )
+
+
+@staff_member_required
+def profile_download(request, profile_id, fmt):
+    """Отдаёт файл профиля для speedscope или flamegraph."""
+    if fmt not in SUFFIXES:
+        raise Http404
+    profile = get_object_or_404(RequestProfile, pk=profile_id)
+    filename = profile.filename.replace(
+        SUFFIXES['speedscope'], SUFFIXES[fmt]
+    )
+    path = os.path.join(settings.PROFILER_DIR, os.path.basename(filename))
+    if not os.path.exists(path):
+        raise Http404
+    return FileResponse(open(path, 'rb'), as_attachment=True)
+
+
+@staff_member_required
+def profile_token(request):
+    """Токен для заголовка ``X-Yatube-Profile`` к странице ``?path=``:
+    с ним профилируются запросы без сессии, например из нагрузочных
+    тестов."""
+    path = request.GET.get('path', '')
+    if not path.startswith('/'):
+        return HttpResponseBadRequest(
+            'Нужен путь страницы: ?path=/...\n',
+            content_type='text/plain; charset=utf-8',
+        )
+    return HttpResponse(
+        make_token(request.user, path) + '\n',
+        content_type='text/plain; charset=utf-8',
+    )
+
+
+@staff_member_required
+def memory_report(request):
+    """Рост памяти текущего воркера между двумя последними снимками.
+
+    ``?snapshot`` делает снимок сразу; без ``MEMORY_MONITOR_ENABLED``
+    он не делается: включённый ради него ``tracemalloc`` остался бы
+    замедлять воркер.
+    """
+    if 'snapshot' in request.GET:
+        if not settings.MEMORY_MONITOR_ENABLED:
+            return HttpResponse(
+                'Слежение за памятью выключено: MEMORY_MONITOR_ENABLED.\n',
+                content_type='text/plain; charset=utf-8', status=409,
+            )
+        monitor.start()
+        monitor.maybe_snapshot(force=True)
+    return HttpResponse(
+        'pid {} rss {:.1f} MB\n\n{}\n'.format(
+            os.getpid(), rss_bytes() / 1024 / 1024, monitor.report
+        ),
+        content_type='text/plain; charset=utf-8',
+    )
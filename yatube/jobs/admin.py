@@ -0,0 +1,29 @@
+from django.contrib import admin
+from django.utils import timezone
+
+from .models import Job
+
+
+class JobAdmin(admin.ModelAdmin):
+    list_display = (
+        'pk', 'name', 'status', 'priority', 'attempts', 'run_at',
+        'created', 'finished',
+    )
+    list_filter = ('status', 'name')
+    search_fields = ('name', 'payload')
+    readonly_fields = (
+        'attempts', 'locked_by', 'locked_at', 'last_error', 'created',
+        'finished',
+    )
+    actions = ('retry',)
+
+    def retry(self, request, queryset):
+        updated = queryset.exclude(status=Job.RUNNING).update(
+            status=Job.QUEUED, attempts=0, run_at=timezone.now(),
+            locked_by='', finished=None,
+        )
+        self.message_user(request, f'Возвращено в очередь: {updated}')
+    retry.short_description = 'Повторить выбранные задачи'
+
+
+admin.site.register(Job, JobAdmin)
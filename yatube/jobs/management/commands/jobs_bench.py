@@ -0,0 +1,41 @@
+import time
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+
+from jobs.models import Job
+
+
+class Command(BaseCommand):
+    help = (
+        'Ставит в очередь пустые задачи и замеряет, за сколько их '
+        'выполнит jobs_worker с заданным пулом.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--jobs', type=int, default=2000)
+        parser.add_argument('--processes', type=int, default=1)
+        parser.add_argument('--threads', type=int, default=4)
+        parser.add_argument('--batch', type=int, default=10)
+
+    def handle(self, *args, **options):
+        Job.objects.filter(name='jobs.noop').delete()
+        Job.objects.bulk_create(
+            Job(name='jobs.noop', priority=number % 3)
+            for number in range(options['jobs'])
+        )
+        start = time.perf_counter()
+        call_command(
+            'jobs_worker',
+            processes=options['processes'],
+            threads=options['threads'],
+            batch=options['batch'],
+            drain=True,
+        )
+        elapsed = time.perf_counter() - start
+        done = Job.objects.filter(name='jobs.noop', status=Job.DONE).count()
+        Job.objects.filter(name='jobs.noop').delete()
+        self.stdout.write(
+            f'{done} из {options["jobs"]} задач за {elapsed:.2f} с: '
+            f'{done / elapsed:.0f} задач/с'
+        )
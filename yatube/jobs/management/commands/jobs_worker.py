@@ -0,0 +1,60 @@
+import multiprocessing
+import signal
+import threading
+
+from django.core.management.base import BaseCommand
+
+from jobs.worker import run_pool
+
+
+class Command(BaseCommand):
+    help = (
+        'Выполняет фоновые задачи из таблицы jobs_job в нескольких '
+        'процессах по нескольку потоков.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=1)
+        parser.add_argument('--threads', type=int, default=4)
+        parser.add_argument(
+            '--batch', type=int, default=1,
+            help='Сколько задач поток забирает за раз.',
+        )
+        parser.add_argument(
+            '--drain', action='store_true',
+            help='Завершиться, когда готовых задач не останется.',
+        )
+
+    def handle(self, *args, **options):
+        pool_args = (options['threads'], options['batch'], options['drain'])
+        if options['processes'] == 1:
+            serve(*pool_args)
+            return
+        context = multiprocessing.get_context('fork')
+        processes = [
+            context.Process(target=serve, args=pool_args)
+            for _ in range(options['processes'])
+        ]
+        for process in processes:
+            process.start()
+
+        def terminate(signum, frame):
+            for process in processes:
+                process.terminate()
+
+        signal.signal(signal.SIGTERM, terminate)
+        signal.signal(signal.SIGINT, terminate)
+        for process in processes:
+            process.join()
+
+
+def serve(threads, batch, drain):
+    """По SIGTERM/SIGINT потоки дорабатывают текущую задачу и выходят."""
+    stop = threading.Event()
+
+    def shutdown(signum, frame):
+        stop.set()
+
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+    run_pool(threads, stop, batch, drain)
@@ -0,0 +1,42 @@
+# Generated by Django 2.2.16 on 2026-10-19 09:24
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Job',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(db_index=True, max_length=200, verbose_name='Задача')),
+                ('payload', models.TextField(default='{}', verbose_name='Аргументы, JSON')),
+                ('priority', models.SmallIntegerField(default=0, verbose_name='Приоритет')),
+                ('status', models.CharField(choices=[('queued', 'В очереди'), ('running', 'Выполняется'), ('done', 'Выполнена'), ('dead', 'Отклонена')], default='queued', max_length=10, verbose_name='Состояние')),
+                ('attempts', models.PositiveSmallIntegerField(default=0, verbose_name='Попыток')),
+                ('max_attempts', models.PositiveSmallIntegerField(default=5, verbose_name='Попыток всего')),
+                ('run_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Выполнить не раньше')),
+                ('locked_by', models.CharField(blank=True, max_length=64, verbose_name='Воркер')),
+                ('locked_at', models.DateTimeField(blank=True, null=True, verbose_name='Взята')),
+                ('last_error', models.TextField(blank=True, verbose_name='Последняя ошибка')),
+                ('created', models.DateTimeField(auto_now_add=True, verbose_name='Создана')),
+                ('finished', models.DateTimeField(blank=True, null=True, verbose_name='Завершена')),
+            ],
+            options={
+                'verbose_name': 'задача',
+                'verbose_name_plural': 'задачи',
+                'ordering': ['-created'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='job',
+            index=models.Index(fields=['status', '-priority', 'run_at'], name='jobs_job_ready_idx'),
+        ),
+    ]
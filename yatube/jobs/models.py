@@ -0,0 +1,50 @@
+import json
+
+from django.db import models
+from django.utils import timezone
+
+
+class Job(models.Model):
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    DEAD = 'dead'
+    STATUS_CHOICES = (
+        (QUEUED, 'В очереди'),
+        (RUNNING, 'Выполняется'),
+        (DONE, 'Выполнена'),
+        (DEAD, 'Отклонена'),
+    )
+
+    name = models.CharField('Задача', max_length=200, db_index=True)
+    payload = models.TextField('Аргументы, JSON', default='{}')
+    priority = models.SmallIntegerField('Приоритет', default=0)
+    status = models.CharField(
+        'Состояние', max_length=10, choices=STATUS_CHOICES, default=QUEUED
+    )
+    attempts = models.PositiveSmallIntegerField('Попыток', default=0)
+    max_attempts = models.PositiveSmallIntegerField('Попыток всего', default=5)
+    run_at = models.DateTimeField('Выполнить не раньше', default=timezone.now)
+    locked_by = models.CharField('Воркер', max_length=64, blank=True)
+    locked_at = models.DateTimeField('Взята', blank=True, null=True)
+    last_error = models.TextField('Последняя ошибка', blank=True)
+    created = models.DateTimeField('Создана', auto_now_add=True)
+    finished = models.DateTimeField('Завершена', blank=True, null=True)
+
+    def __str__(self):
+        return f'{self.name} #{self.pk} ({self.status})'
+
+    @property
+    def kwargs(self):
+        return json.loads(self.payload)
+
+    class Meta:
+        ordering = ['-created']
+        indexes = [
+            models.Index(
+                fields=['status', '-priority', 'run_at'],
+                name='jobs_job_ready_idx',
+            ),
+        ]
+        verbose_name = 'задача'
+        verbose_name_plural = 'задачи'
@@ -0,0 +1,69 @@
+"""Постановка задач в очередь.
+
+Задача — функция, отмеченная ``@task`` в модуле ``tasks.py`` любого
+приложения. ``delay()`` записывает её в таблицу ``jobs_job`` после
+коммита текущей транзакции: отменённый откатом запрос не оставит задач,
+а вставка не удлиняет пишущую транзакцию SQLite.
+"""
+import json
+from functools import partial
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+registry = {}
+
+
+class Task:
+    def __init__(self, func, name, priority, max_attempts):
+        self.func = func
+        self.name = name
+        self.priority = priority
+        self.max_attempts = max_attempts
+
+    def __call__(self, **kwargs):
+        return self.func(**kwargs)
+
+    def delay(self, priority=None, run_at=None, **kwargs):
+        """Ставит задачу в очередь; аргументы должны сериализоваться
+        в JSON."""
+        enqueue(
+            self.name, kwargs,
+            priority=self.priority if priority is None else priority,
+            max_attempts=self.max_attempts,
+            run_at=run_at,
+        )
+
+
+def task(name=None, priority=0, max_attempts=None):
+    def decorator(func):
+        registered = Task(
+            func,
+            name or f'{func.__module__}.{func.__name__}',
+            priority,
+            max_attempts or settings.JOBS_MAX_ATTEMPTS,
+        )
+        registry[registered.name] = registered
+        return registered
+    return decorator
+
+
+def _create(name, payload, priority, max_attempts, run_at):
+    from .models import Job
+
+    fields = {
+        'name': name,
+        'payload': payload,
+        'priority': priority,
+        'max_attempts': max_attempts,
+    }
+    if run_at is not None:
+        fields['run_at'] = run_at
+    Job.objects.using(DEFAULT_DB_ALIAS).create(**fields)
+
+
+def enqueue(name, kwargs, priority=0, max_attempts=None, run_at=None):
+    transaction.on_commit(partial(
+        _create, name, json.dumps(kwargs), priority,
+        max_attempts or settings.JOBS_MAX_ATTEMPTS, run_at,
+    ))
@@ -0,0 +1,6 @@
+from .queue import task
+
+
+@task(name='jobs.noop')
+def noop(**kwargs):
+    """Пустая задача для ``jobs_bench`` и проверки воркеров."""
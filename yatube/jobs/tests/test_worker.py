@@ -0,0 +1,162 @@
+import threading
+import time
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.db import OperationalError, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from ..models import Job
+from ..queue import enqueue, registry, task
+from ..worker import claim, execute, requeue_stale, run, run_pool
+
+calls = []
+
+
+@task(name='jobs.tests.record')
+def record(value):
+    calls.append(value)
+
+
+@task(name='jobs.tests.explode', max_attempts=2)
+def explode():
+    raise RuntimeError('Не получилось')
+
+
+@override_settings(JOBS_RETRY_BACKOFF=0)
+class WorkerTests(TestCase):
+    def setUp(self):
+        calls.clear()
+
+    def test_jobs_run_in_priority_order(self):
+        for value, priority in (('low', 0), ('high', 5), ('mid', 1)):
+            Job.objects.create(
+                name='jobs.tests.record',
+                payload=f'{{"value": "{value}"}}',
+                priority=priority,
+            )
+        run(threading.Event(), batch=2, drain=True)
+        self.assertEqual(calls, ['high', 'mid', 'low'])
+        self.assertEqual(Job.objects.filter(status=Job.DONE).count(), 3)
+
+    def test_claimed_jobs_are_not_claimed_again(self):
+        Job.objects.create(name='jobs.tests.record')
+        self.assertEqual(len(claim(10)), 1)
+        self.assertEqual(claim(10), [])
+
+    def test_delayed_jobs_wait(self):
+        Job.objects.create(
+            name='jobs.tests.record',
+            run_at=timezone.now() + timezone.timedelta(hours=1),
+        )
+        self.assertEqual(claim(10), [])
+
+    def test_failures_are_retried_then_dead_lettered(self):
+        job = Job.objects.create(name='jobs.tests.explode', max_attempts=2)
+        self.assertEqual(execute(claim(1)[0]), 'failed')
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.QUEUED, 1))
+        self.assertIn('Не получилось', job.last_error)
+        execute(claim(1)[0])
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.DEAD, 2))
+
+    def test_unknown_task_is_dead_lettered_at_once(self):
+        job = Job.objects.create(name='jobs.tests.missing')
+        execute(claim(1)[0])
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.DEAD)
+
+    @override_settings(JOBS_POLL_INTERVAL=0.01)
+    def test_database_errors_do_not_stop_worker(self):
+        Job.objects.create(
+            name='jobs.tests.record', payload='{"value": "x"}'
+        )
+        errors = [OperationalError('database table is locked: jobs_job')]
+
+        def flaky_claim(limit, owner=None):
+            if errors:
+                raise errors.pop()
+            return claim(limit, owner)
+
+        with mock.patch('jobs.worker.claim', flaky_claim), \
+                self.assertLogs('jobs.worker', 'ERROR'):
+            run(threading.Event(), drain=True)
+        self.assertEqual(calls, ['x'])
+
+    def test_result_of_taken_over_job_is_dropped(self):
+        job = Job.objects.create(
+            name='jobs.tests.record', payload='{"value": "x"}'
+        )
+        claimed = claim(1)[0]
+        Job.objects.filter(pk=job.pk).update(locked_by='other')
+        execute(claimed)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.locked_by), (Job.RUNNING, 'other'))
+
+    @override_settings(JOBS_LOCK_TIMEOUT=0)
+    def test_stale_jobs_out_of_attempts_are_dead_lettered(self):
+        locked_at = timezone.now() - timezone.timedelta(seconds=1)
+        dead = Job.objects.create(
+            name='jobs.tests.record', status=Job.RUNNING, attempts=2,
+            max_attempts=2, locked_by='gone', locked_at=locked_at,
+        )
+        retried = Job.objects.create(
+            name='jobs.tests.record', status=Job.RUNNING, attempts=1,
+            max_attempts=2, locked_by='gone', locked_at=locked_at,
+        )
+        self.assertEqual(requeue_stale(), 1)
+        dead.refresh_from_db()
+        retried.refresh_from_db()
+        self.assertEqual(dead.status, Job.DEAD)
+        self.assertEqual(retried.status, Job.QUEUED)
+
+    def test_tasks_are_discovered(self):
+        self.assertIn('jobs.noop', registry)
+        self.assertIn('posts.tasks.make_thumbnails', registry)
+
+
+class EnqueueTests(TransactionTestCase):
+    def test_enqueued_after_commit(self):
+        with transaction.atomic():
+            record.delay(value='x', priority=3)
+            self.assertFalse(Job.objects.exists())
+        job = Job.objects.get()
+        self.assertEqual((job.name, job.kwargs, job.priority),
+                         ('jobs.tests.record', {'value': 'x'}, 3))
+
+    def test_rolled_back_jobs_are_dropped(self):
+        try:
+            with transaction.atomic():
+                enqueue('jobs.tests.record', {'value': 'x'})
+                raise ValueError
+        except ValueError:
+            pass
+        self.assertFalse(Job.objects.exists())
+
+    @override_settings(JOBS_LOCK_TIMEOUT=0.2, JOBS_POLL_INTERVAL=0.05)
+    def test_stale_jobs_are_requeued_while_running(self):
+        job = Job.objects.create(
+            name='jobs.tests.record', payload='{"value": "stale"}',
+            status=Job.RUNNING,
+            locked_by='gone', locked_at=timezone.now(),
+        )
+        stop = threading.Event()
+        pool = threading.Thread(target=run_pool, args=(1, stop))
+        pool.start()
+        self.addCleanup(pool.join)
+        self.addCleanup(stop.set)
+        deadline = time.monotonic() + 5
+        while time.monotonic() < deadline:
+            job.refresh_from_db()
+            if job.status == Job.DONE:
+                break
+            time.sleep(0.05)
+        self.assertEqual(job.status, Job.DONE)
+
+    def test_bench_command(self):
+        out = StringIO()
+        call_command('jobs_bench', jobs=20, threads=2, stdout=out)
+        self.assertIn('20 из 20', out.getvalue())
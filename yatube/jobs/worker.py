@@ -0,0 +1,190 @@
+"""Выборка и выполнение задач.
+
+Воркер забирает пачку готовых задач одним ``UPDATE ... WHERE status =
+'queued'``: строку получает только тот, чьё обновление её изменило,
+поэтому блокировки строк (``SELECT FOR UPDATE``), которых нет в
+SQLite, не нужны. Упавшая задача возвращается в очередь с
+экспоненциальной задержкой, а исчерпавшая попытки — помечается
+``dead``. Задачи, взятые упавшим воркером, возвращаются в очередь
+через ``JOBS_LOCK_TIMEOUT``: каждый поток проверяет зависшие задачи
+при старте и затем раз в ``JOBS_LOCK_TIMEOUT``; задача, исчерпавшая
+попытки, при этом помечается ``dead``. Итог задачи записывается, только
+пока она ещё взята этим воркером. Ошибка базы (``database is locked``)
+не останавливает поток: он ждёт и продолжает цикл.
+"""
+import logging
+import os
+import random
+import socket
+import threading
+import time
+import traceback
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import OperationalError, connections
+from django.db.models import F
+from django.utils import timezone
+
+from core.metrics import JOB_SECONDS
+
+from .models import Job
+from .queue import registry
+
+logger = logging.getLogger(__name__)
+
+# Попыток записать итог задачи при ``database is locked``.
+FINISH_ATTEMPTS = 5
+FINISH_BACKOFF = 0.05
+
+
+def worker_id():
+    return '{}:{}:{}'.format(
+        socket.gethostname()[:30], os.getpid(), threading.get_ident() % 10000
+    )
+
+
+def retry_delay(attempts):
+    delay = min(
+        settings.JOBS_RETRY_BACKOFF * 2 ** (attempts - 1),
+        settings.JOBS_RETRY_MAX_BACKOFF,
+    )
+    return random.uniform(delay / 2, delay)
+
+
+def claim(limit, owner=None):
+    """Забирает до ``limit`` готовых задач в порядке приоритета."""
+    now = timezone.now()
+    ids = list(
+        Job.objects.filter(status=Job.QUEUED, run_at__lte=now)
+        .order_by('-priority', 'run_at', 'id')
+        .values_list('id', flat=True)[:limit]
+    )
+    if not ids:
+        return []
+    token = '{}:{}'.format(owner or worker_id(), uuid.uuid4().hex[:8])
+    Job.objects.filter(pk__in=ids, status=Job.QUEUED).update(
+        status=Job.RUNNING,
+        locked_by=token,
+        locked_at=now,
+        attempts=F('attempts') + 1,
+    )
+    return list(
+        Job.objects.filter(locked_by=token, status=Job.RUNNING)
+        .order_by('-priority', 'run_at', 'id')
+    )
+
+
+def requeue_stale():
+    """Возвращает в очередь задачи, зависшие у упавших воркеров, а
+    исчерпавшие попытки помечает ``dead``."""
+    now = timezone.now()
+    stale = Job.objects.filter(
+        status=Job.RUNNING,
+        locked_at__lt=now - timedelta(seconds=settings.JOBS_LOCK_TIMEOUT),
+    )
+    stale.filter(attempts__gte=F('max_attempts')).update(
+        status=Job.DEAD, locked_by='', finished=now,
+        last_error='Воркер не завершил задачу за JOBS_LOCK_TIMEOUT',
+    )
+    return stale.update(status=Job.QUEUED, locked_by='')
+
+
+def _finish(job, **fields):
+    """Записывает итог задачи, если её не забрал другой воркер после
+    ``JOBS_LOCK_TIMEOUT``."""
+    for attempt in range(FINISH_ATTEMPTS):
+        try:
+            return Job.objects.filter(
+                pk=job.pk, locked_by=job.locked_by
+            ).update(locked_by='', **fields)
+        except OperationalError:
+            if attempt == FINISH_ATTEMPTS - 1:
+                raise
+            time.sleep(FINISH_BACKOFF * 2 ** attempt)
+
+
+def _fail(job, error, permanent):
+    now = timezone.now()
+    if permanent or job.attempts >= job.max_attempts:
+        logger.error('Задача %s отклонена: %s', job, error)
+        fields = {'status': Job.DEAD, 'finished': now}
+    else:
+        fields = {
+            'status': Job.QUEUED,
+            'run_at': now + timedelta(seconds=retry_delay(job.attempts)),
+        }
+    _finish(job, last_error=error, **fields)
+
+
+def execute(job):
+    task = registry.get(job.name)
+    start = time.perf_counter()
+    try:
+        if task is None:
+            raise LookupError(f'Задача {job.name} не зарегистрирована')
+        task(**job.kwargs)
+    except Exception:
+        _fail(job, traceback.format_exc(), permanent=task is None)
+        result = 'failed'
+    else:
+        _finish(job, status=Job.DONE, finished=timezone.now())
+        result = 'done'
+    JOB_SECONDS.observe(
+        time.perf_counter() - start, name=job.name, result=result
+    )
+    return result
+
+
+def _backoff(failures):
+    return min(
+        settings.JOBS_POLL_INTERVAL * 2 ** (failures - 1),
+        settings.JOBS_RETRY_MAX_BACKOFF,
+    )
+
+
+def run(stop, batch=1, drain=False):
+    """Цикл потока воркера до ``stop`` или, при ``drain``, до
+    опустевшей очереди. Взятые, но ещё не выполненные после ошибки
+    базы задачи выполняются на следующем круге."""
+    owner = worker_id()
+    requeue_at = time.monotonic()
+    pending, failures = [], 0
+    try:
+        while not stop.is_set():
+            try:
+                if time.monotonic() >= requeue_at:
+                    requeue_stale()
+                    requeue_at = (
+                        time.monotonic() + settings.JOBS_LOCK_TIMEOUT
+                    )
+                pending = pending or claim(batch, owner)
+                idle = not pending
+                while pending:
+                    execute(pending.pop(0))
+            except OperationalError:
+                failures += 1
+                logger.exception('Ошибка базы в воркере %s', owner)
+                stop.wait(_backoff(failures))
+                continue
+            failures = 0
+            if idle:
+                if drain:
+                    return
+                stop.wait(settings.JOBS_POLL_INTERVAL)
+    finally:
+        connections.close_all()
+
+
+def run_pool(threads, stop, batch=1, drain=False):
+    """Пул потоков одного процесса."""
+    connections.close_all()
+    pool = [
+        threading.Thread(target=run, args=(stop, batch, drain))
+        for _ in range(threads)
+    ]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
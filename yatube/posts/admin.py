@@ -1,12 +1,36 @@
 from django.contrib import admin
-from .models import Post, Group, Comment
+from .models import HIDDEN, VISIBLE, Post, Group, Comment
+
+
+def moderate(queryset, moderation):
+    """Сохраняет по одной, чтобы решение попало в журнал изменений:
+    его читают лента, вебхуки и горячая лента."""
+    for obj in queryset.exclude(moderation=moderation):
+        obj.moderation = moderation
+        obj.save(update_fields=('moderation',))
+
+
+def approve(modeladmin, request, queryset):
+    moderate(queryset, VISIBLE)
+
+
+approve.short_description = 'Опубликовать'
+
+
+def hide(modeladmin, request, queryset):
+    moderate(queryset, HIDDEN)
+
+
+hide.short_description = 'Скрыть'
 
 
 class PostAdmin(admin.ModelAdmin):
-    list_display = ('pk', 'text', 'pub_date', 'author', 'group')
-    list_editable = ('group',)
+    list_display = ('pk', 'text', 'pub_date', 'author', 'group',
+                    'moderation')
+    list_editable = ('group', 'moderation')
     search_fields = ('text',)
-    list_filter = ('pub_date',)
+    list_filter = ('moderation', 'pub_date')
+    actions = (approve, hide)
     empty_value_display = '-пусто-'
 
 
@@ -15,7 +39,9 @@ class GroupAdmin(admin.ModelAdmin):
 
 
 class CommentAdmin(admin.ModelAdmin):
-    list_display = ('post', 'author', 'text', 'created')
+    list_display = ('post', 'author', 'text', 'created', 'moderation')
+    list_filter = ('moderation',)
+    actions = (approve, hide)
 
 
 admin.site.register(Post, PostAdmin)
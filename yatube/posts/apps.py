@@ -3,3 +3,18 @@ from django.apps import AppConfig
 
 class PostsConfig(AppConfig):
     name = 'posts'
+
+    def ready(self):
+        from django.db.models.signals import post_delete, post_save
+
+        from core.db import identity
+
+        from . import changelog, tags
+        from .models import Comment, Follow, Group, Post
+
+        identity.install(Post, 'author', 'group')
+        identity.install(Comment, 'author')
+        for model in (Post, Comment, Follow, Group):
+            post_save.connect(changelog.on_save, sender=model)
+            post_delete.connect(changelog.on_delete, sender=model)
+        post_delete.connect(tags.on_post_delete, sender=Post)
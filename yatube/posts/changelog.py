@@ -0,0 +1,135 @@
+"""Журнал изменений и чтение его по курсору.
+
+Запись в ``ChangeLog`` делается обработчиками ``post_save`` и
+``post_delete`` в той же транзакции и той же базе, что и само
+изменение: ``save()`` моделей обёрнут в ``atomic``, а удаление Django
+и так выполняет в транзакции. При шардировании у каждого шарда свой
+журнал и свои позиции читателей. ``rebalance_shards`` переносит строки
+без сигналов и пишет в журнал целевого шарда ``MOVE``: запись не
+создана и не удалена, а только сменила шард.
+
+Номера ``seq`` выдаёт ``AUTOINCREMENT`` SQLite; запись в базу идёт по
+одной, поэтому порядок номеров совпадает с порядком коммитов и читатель
+не пропустит запись, закоммиченную позже записи с большим номером.
+
+Читатель::
+
+    consumer = Consumer('search_index')
+    consumer.run(lambda entries: ...)  # пачками, с сохранением позиции
+"""
+import json
+import random
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+from .models import ChangeLog, ChangeLogCheckpoint
+
+LOGGED_FIELDS = {
+    'posts.post': ('author_id', 'group_id', 'moderation'),
+    'posts.comment': ('post_id', 'author_id'),
+    'posts.follow': ('user_id', 'author_id'),
+    'posts.group': ('slug',),
+}
+
+
+def head_key(using):
+    return f'posts:changelog:head:{using}'
+
+
+def heads(databases):
+    """Последние закоммиченные ``seq`` из кеша ``CHANGELOG_CACHE_ALIAS``
+    — дешёвый признак того, что журнал пополнился. К ``seq`` добавлено
+    случайное число: кеш переживает пересоздание базы, и тот же ``seq``
+    в новой базе не должен выглядеть как старая позиция."""
+    found = caches[settings.CHANGELOG_CACHE_ALIAS].get_many(
+        [head_key(db) for db in databases]
+    )
+    return tuple(found.get(head_key(db)) for db in databases)
+
+
+def notify(using, seq):
+    from . import longpoll
+
+    caches[settings.CHANGELOG_CACHE_ALIAS].set(
+        head_key(using), (seq, random.getrandbits(63)), None
+    )
+    longpoll.wake_up()
+
+
+def record(instance, action, using):
+    label = instance._meta.label_lower
+    entry = ChangeLog.objects.using(using).create(
+        model=label,
+        object_id=instance.pk,
+        action=action,
+        data=json.dumps({
+            field: getattr(instance, field) for field in LOGGED_FIELDS[label]
+        }),
+    )
+    transaction.on_commit(partial(notify, using, entry.seq), using=using)
+
+
+def on_save(sender, instance, created, using, raw=False, **kwargs):
+    if not raw:
+        record(instance, ChangeLog.CREATE if created else ChangeLog.UPDATE,
+               using)
+
+
+def on_delete(sender, instance, using, **kwargs):
+    record(instance, ChangeLog.DELETE, using)
+
+
+class Consumer:
+    """Читатель журнала с позицией, сохраняемой в базе журнала."""
+
+    def __init__(self, name, using=DEFAULT_DB_ALIAS, batch_size=None):
+        self.name = name
+        self.using = using
+        self.batch_size = batch_size or settings.CHANGELOG_BATCH_SIZE
+
+    def _checkpoint(self):
+        return ChangeLogCheckpoint.objects.using(self.using).get_or_create(
+            consumer=self.name, database=self.using
+        )[0]
+
+    def position(self):
+        return self._checkpoint().seq
+
+    def fetch(self, after):
+        return list(
+            ChangeLog.objects.using(self.using)
+            .filter(seq__gt=after).order_by('seq')[:self.batch_size]
+        )
+
+    def commit(self, seq):
+        ChangeLogCheckpoint.objects.using(self.using).filter(
+            consumer=self.name, database=self.using
+        ).update(seq=seq)
+
+    def rewind(self, seq=0):
+        """Для пересборки производных данных с начала журнала."""
+        self._checkpoint()
+        self.commit(seq)
+
+    def run(self, handler, max_batches=None):
+        """Передаёт ``handler`` пачки новых записей; позиция сдвигается
+        в одной транзакции с обработкой, так что пачка, на которой
+        обработчик упал, будет прочитана снова. Возвращает число
+        обработанных записей."""
+        processed = 0
+        position = self.position()
+        while max_batches is None or max_batches > 0:
+            entries = self.fetch(position)
+            if not entries:
+                break
+            with transaction.atomic(using=self.using):
+                handler(entries)
+                position = entries[-1].seq
+                self.commit(position)
+            processed += len(entries)
+            if max_batches is not None:
+                max_batches -= 1
+        return processed
@@ -0,0 +1,349 @@
+"""Почти одинаковые тексты постов и комментариев: MinHash и LSH.
+
+Текст приводится к словам в нижнем регистре через пробел и режется на
+символьные шинглы длины ``DUPLICATE_SHINGLE``. Подпись — минимумы
+``DUPLICATE_PERMUTATIONS`` хеш-функций ``(a * x + b) mod (2 ** 61 - 1)``
+по шинглам; доля совпавших позиций двух подписей оценивает
+коэффициент Жаккара их наборов шинглов. Подписи новых записей
+сохраняются в ``TextSignature``.
+
+Для поиска подпись делится на ``DUPLICATE_BANDS`` полос. Кандидаты —
+тексты, у которых совпала хотя бы одна полоса; они сверяются по полным
+подписям с порогом ``DUPLICATE_THRESHOLD``. Команда ``build_text_index``
+(и задача ``rebuild_text_index``) пишет для каждой полосы
+отсортированные ключи в ``.npy`` (см. ``core.versioned``), воркеры
+ищут по ним ``searchsorted`` через ``mmap``. Подписи, добавленные
+после сборки, каждый процесс дочитывает из таблицы и держит в словаре.
+
+При совпадении выполняется ``DUPLICATE_ACTION``: ``reject`` — форма
+возвращает ошибку, ``flag`` — запись сохраняется с пометкой для
+модераторов, ``hide`` — сохраняется скрытой ото всех, кроме автора.
+Пустое значение отключает проверку. После смены параметров подписи
+их нужно пересчитать: ``build_text_index --backfill --all``.
+"""
+import os
+import re
+import threading
+import time
+import zlib
+from collections import defaultdict
+from functools import lru_cache
+
+import numpy as np
+from django.conf import settings
+from django.core.exceptions import ValidationError
+
+from core import metrics, versioned
+
+from . import sharding
+from .models import (
+    FLAGGED, HIDDEN, VISIBLE, Comment, Post, TextSignature,
+)
+
+REJECT = 'reject'
+FLAG = 'flag'
+HIDE = 'hide'
+MODERATION = {FLAG: FLAGGED, HIDE: HIDDEN}
+MESSAGE = 'Почти такой же текст уже опубликован.'
+
+MERSENNE = (1 << 61) - 1
+SEED = 1729
+# Столбцов шинглов на одно умножение: ограничивает память длинных
+# текстов.
+SHINGLES_PER_STEP = 4096
+KEY_MULTIPLIER = np.uint64(1099511628211)
+WORD_RE = re.compile(r'\w+')
+ARRAYS = ('ids', 'signatures', 'keys', 'rows', 'last_id')
+
+
+@lru_cache(maxsize=None)
+def _hash_params(permutations):
+    rng = np.random.default_rng(SEED)
+    return (
+        rng.integers(1, 1 << 31, (permutations, 1), dtype=np.uint64),
+        rng.integers(0, 1 << 31, (permutations, 1), dtype=np.uint64),
+    )
+
+
+def shingles(text):
+    """Хеши шинглов текста или None, если текст слишком короткий."""
+    normalized = ' '.join(WORD_RE.findall(text.lower()))
+    if len(normalized) < settings.DUPLICATE_MIN_LENGTH:
+        return None
+    size = settings.DUPLICATE_SHINGLE
+    grams = {
+        normalized[start:start + size]
+        for start in range(len(normalized) - size + 1)
+    }
+    return np.fromiter(
+        (zlib.crc32(gram.encode()) for gram in grams),
+        dtype=np.uint64, count=len(grams),
+    )
+
+
+def minhash(text):
+    """MinHash текста, ``uint32`` на перестановку, или None."""
+    hashed = shingles(text)
+    if hashed is None:
+        return None
+    a, b = _hash_params(settings.DUPLICATE_PERMUTATIONS)
+    result = np.full(len(a), MERSENNE, dtype=np.uint64)
+    for start in range(0, len(hashed), SHINGLES_PER_STEP):
+        step = hashed[start:start + SHINGLES_PER_STEP]
+        np.minimum(result, ((a * step + b) % MERSENNE).min(axis=1),
+                   out=result)
+    return result.astype(np.uint32)
+
+
+def band_keys(signatures):
+    """Ключи полос для матрицы подписей: ``(подписи, полосы)``."""
+    bands = signatures.reshape(
+        len(signatures), settings.DUPLICATE_BANDS, -1
+    ).astype(np.uint64)
+    keys = np.zeros(bands.shape[:2], dtype=np.uint64)
+    for column in range(bands.shape[2]):
+        keys = keys * KEY_MULTIPLIER + bands[:, :, column]
+    return keys
+
+
+def _similar(signatures, signature):
+    return (signatures == signature).mean(axis=1) >= (
+        settings.DUPLICATE_THRESHOLD
+    )
+
+
+class BandIndex:
+    """Собранный индекс: подписи ``signatures`` с id ``ids`` из
+    ``TextSignature`` и по каждой полосе отсортированные ключи ``keys``
+    с номерами подписей ``rows``. ``last_id`` — последний id в
+    сборке."""
+
+    def __init__(self, ids, signatures, keys, rows, last_id):
+        self.ids = ids
+        self.signatures = signatures
+        self.keys = keys
+        self.rows = rows
+        self.last_id = last_id
+
+    @classmethod
+    def from_signatures(cls, ids, signatures):
+        ids = np.asarray(ids, dtype=np.int64)
+        keys = band_keys(signatures).T
+        rows = np.argsort(keys, axis=1, kind='stable')
+        return cls(
+            ids, signatures, np.take_along_axis(keys, rows, axis=1),
+            rows.astype(np.int32),
+            np.array([ids.max() if len(ids) else 0], dtype=np.int64),
+        )
+
+    @classmethod
+    def load(cls, directory):
+        return cls(*(
+            np.load(os.path.join(directory, f'{name}.npy'), mmap_mode='r')
+            for name in ARRAYS
+        ))
+
+    def save(self, directory):
+        for name in ARRAYS:
+            np.save(os.path.join(directory, f'{name}.npy'),
+                    getattr(self, name))
+
+    def matches(self, signature, keys):
+        """id подписей, похожих на ``signature``."""
+        limit = settings.DUPLICATE_MAX_CANDIDATES
+        found = []
+        for band, key in enumerate(keys):
+            column = self.keys[band]
+            low = int(np.searchsorted(column, key, 'left'))
+            high = int(np.searchsorted(column, key, 'right'))
+            found.append(self.rows[band, low:min(high, low + limit)])
+        rows = np.unique(np.concatenate(found))
+        rows = rows[_similar(self.signatures[rows], signature)]
+        return self.ids[rows].tolist()
+
+
+class Recent:
+    """Подписи, сохранённые после сборки индекса, в памяти процесса."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self, after=0):
+        self.after = self.base = after
+        self.ids = []
+        self.signatures = []
+        self.buckets = defaultdict(list)
+
+    def _refresh(self):
+        rows = TextSignature.objects.filter(
+            pk__gt=self.after
+        ).order_by('pk').values_list('pk', 'signature')
+        for pk, raw in rows:
+            signature = np.frombuffer(bytes(raw), dtype='<u4')
+            keys = band_keys(signature[None])[0]
+            for band, key in enumerate(keys.tolist()):
+                self.buckets[band, key].append(len(self.ids))
+            self.ids.append(pk)
+            self.signatures.append(signature)
+            self.after = pk
+
+    def matches(self, index, signature, keys):
+        """id похожих подписей новее ``index``; при смене версии индекса
+        накопленное сбрасывается."""
+        base = int(index.last_id[0]) if index is not None else 0
+        with self._lock:
+            if base != self.base:
+                self.reset(base)
+            self._refresh()
+            rows = sorted({
+                row for band, key in enumerate(keys.tolist())
+                for row in self.buckets.get((band, key), ())
+            })
+            if not rows:
+                return []
+            similar = _similar(
+                np.stack([self.signatures[row] for row in rows]), signature
+            )
+            return [
+                self.ids[row] for row, hit in zip(rows, similar) if hit
+            ]
+
+
+_current = versioned.Current(
+    'DUPLICATE_INDEX_DIR', 'DUPLICATE_INDEX_CHECK_INTERVAL',
+    BandIndex.load,
+)
+current = _current.get
+_recent = Recent()
+
+
+def reset():
+    _current.reset()
+    _recent.reset()
+
+
+def find(signature):
+    """id ``TextSignature`` текстов, похожих на подпись."""
+    keys = band_keys(signature[None])[0]
+    index = current()
+    found = _recent.matches(index, signature, keys)
+    if index is not None:
+        found = index.matches(signature, keys) + found
+    return found
+
+
+def _existing(found, instance):
+    """Отбрасывает подписи, удалённые после сборки индекса, и подпись
+    самой записи."""
+    rows = TextSignature.objects.filter(pk__in=found)
+    if instance is not None and instance.pk is not None:
+        rows = rows.exclude(
+            model=instance._meta.label_lower, object_id=instance.pk
+        )
+    return list(rows.values_list('pk', flat=True))
+
+
+def review(text, instance=None):
+    """Подпись текста записи и её статус модерации; ``instance`` —
+    изменяемая запись, с собственной подписью она не сравнивается.
+
+    Похожий текст при ``DUPLICATE_ACTION = 'reject'`` —
+    ``ValidationError``.
+    """
+    action = settings.DUPLICATE_ACTION
+    signature = minhash(text)
+    if not action or signature is None:
+        return signature, VISIBLE
+    start = time.perf_counter()
+    found = find(signature)
+    if found:
+        found = _existing(found, instance)
+    metrics.DUPLICATE_CHECK_SECONDS.observe(
+        time.perf_counter() - start,
+        result='duplicate' if found else 'clean',
+    )
+    if not found:
+        return signature, VISIBLE
+    if action == REJECT:
+        raise ValidationError(MESSAGE, code='duplicate')
+    return signature, MODERATION[action]
+
+
+def remember(instance, signature):
+    """Сохраняет подпись записи. Подпись изменённого текста пишется
+    новой строкой: процессы дочитывают только новые id."""
+    label = instance._meta.label_lower
+    TextSignature.objects.filter(model=label, object_id=instance.pk).delete()
+    if signature is not None:
+        TextSignature.objects.create(
+            model=label,
+            object_id=instance.pk,
+            signature=signature.astype('<u4').tobytes(),
+        )
+
+
+def _new_signatures(label, batch):
+    known = set(TextSignature.objects.filter(
+        model=label, object_id__in=[pk for pk, _ in batch]
+    ).values_list('object_id', flat=True))
+    signatures = []
+    for pk, text in batch:
+        signature = None if pk in known else minhash(text)
+        if signature is not None:
+            signatures.append(TextSignature(
+                model=label, object_id=pk,
+                signature=signature.astype('<u4').tobytes(),
+            ))
+    return signatures
+
+
+def backfill(replace=False, batch_size=1000):
+    """Подписи постов и комментариев, у которых их нет; с ``replace`` —
+    пересчёт всех. Возвращает число сохранённых подписей."""
+    if replace:
+        TextSignature.objects.all().delete()
+    saved = 0
+    for model in (Post, Comment):
+        label = model._meta.label_lower
+        for db in sharding.shards():
+            rows = model.objects.using(db).order_by('pk').values_list(
+                'pk', 'text'
+            )
+            last_pk = 0
+            while True:
+                batch = list(rows.filter(pk__gt=last_pk)[:batch_size])
+                if not batch:
+                    break
+                last_pk = batch[-1][0]
+                signatures = _new_signatures(label, batch)
+                TextSignature.objects.bulk_create(
+                    signatures, ignore_conflicts=True
+                )
+                saved += len(signatures)
+    return saved
+
+
+def rebuild(root=None, batch_size=10000):
+    """Собирает индекс по всем подписям таблицы и публикует его."""
+    ids, signatures = [], []
+    rows = TextSignature.objects.order_by('pk').values_list(
+        'pk', 'signature'
+    )
+    last_pk = 0
+    while True:
+        batch = list(rows.filter(pk__gt=last_pk)[:batch_size])
+        if not batch:
+            break
+        last_pk = batch[-1][0]
+        ids.extend(pk for pk, _ in batch)
+        signatures.append(np.frombuffer(
+            b''.join(bytes(raw) for _, raw in batch), dtype='<u4'
+        ).reshape(len(batch), -1))
+    index = BandIndex.from_signatures(
+        ids, np.concatenate(signatures) if signatures else np.empty(
+            (0, settings.DUPLICATE_PERMUTATIONS), dtype=np.uint32
+        ),
+    )
+    versioned.publish(index.save, root or settings.DUPLICATE_INDEX_DIR)
+    return index
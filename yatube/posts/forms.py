@@ -1,8 +1,34 @@
 from django import forms
-from .models import Post, Comment
+from .models import VISIBLE, Post, Comment
+from . import duplicates
 
 
-class PostForm(forms.ModelForm):
+class DuplicateCheckMixin:
+    """Проверяет новый или изменённый текст на почти дубли и выставляет
+    ``moderation``; правка может только ужесточить статус. Подпись
+    сохраняет ``remember_text`` после сохранения записи."""
+
+    checked = False
+    signature = None
+
+    def clean_text(self):
+        text = self.cleaned_data['text']
+        adding = self.instance._state.adding
+        if adding or text != self.instance.text:
+            self.signature, moderation = duplicates.review(
+                text, None if adding else self.instance
+            )
+            self.checked = True
+            if adding or moderation != VISIBLE:
+                self.instance.moderation = moderation
+        return text
+
+    def remember_text(self, instance):
+        if self.checked:
+            duplicates.remember(instance, self.signature)
+
+
+class PostForm(DuplicateCheckMixin, forms.ModelForm):
     class Meta:
         model = Post
         fields = ('text', 'group', 'image',)
@@ -13,7 +39,7 @@ class PostForm(forms.ModelForm):
         }
 
 
-class CommentForm(forms.ModelForm):
+class CommentForm(DuplicateCheckMixin, forms.ModelForm):
     class Meta:
         model = Comment
         fields = ('text',)
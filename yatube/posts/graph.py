@@ -0,0 +1,194 @@
+"""Граф подписок в массивах NumPy для рекомендаций «кого читать».
+
+Граф хранится в формате CSR: ``ids`` — отсортированные id
+пользователей (номер узла — позиция в массиве), авторы, на которых
+подписан узел ``i``, — ``indices[indptr[i]:indptr[i + 1]]``. Кроме того
+``followers`` — число подписчиков узла, ``popular`` — самые читаемые
+узлы для пользователей без подписок.
+
+Команда ``build_follow_graph`` (или задача ``rebuild_follow_graph``
+каждые ``FOLLOW_GRAPH_INTERVAL`` секунд) пишет массивы ``.npy`` в новый
+каталог внутри ``FOLLOW_GRAPH_DIR`` (см. ``core.versioned``). Воркеры открывают
+массивы через ``mmap`` — страницы одни на все процессы — и проверяют
+смену версии не чаще раза в ``FOLLOW_GRAPH_CHECK_INTERVAL`` секунд.
+
+Рекомендации — авторы, которых читают авторы пользователя, по числу
+таких путей длины два; считаются без цикла по Python.
+"""
+import os
+
+import numpy as np
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from core import versioned
+
+ARRAYS = ('ids', 'indptr', 'indices', 'followers', 'popular')
+POPULAR = 100
+# Потолок путей длины два на запрос: у подписанных на тысячи активных
+# авторов учитываются только первые из них.
+MAX_PATHS = 2000000
+FETCH_SIZE = 100000
+
+
+class FollowGraph:
+    def __init__(self, ids, indptr, indices, followers, popular):
+        self.ids = ids
+        self.indptr = indptr
+        self.indices = indices
+        self.followers = followers
+        self.popular = popular
+
+    @classmethod
+    def from_edges(cls, users, authors):
+        """Граф из параллельных массивов id подписчиков и авторов."""
+        users = np.asarray(users, dtype=np.int64)
+        authors = np.asarray(authors, dtype=np.int64)
+        ids = np.unique(np.concatenate((users, authors)))
+        src = np.searchsorted(ids, users)
+        dst = np.searchsorted(ids, authors)
+        order = np.lexsort((dst, src))
+        indptr = np.zeros(len(ids) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(src, minlength=len(ids)), out=indptr[1:])
+        followers = np.bincount(dst, minlength=len(ids)).astype(np.int32)
+        popular = np.argsort(-followers, kind='stable')[:POPULAR]
+        popular = popular[followers[popular] > 0]
+        return cls(
+            ids, indptr, dst[order].astype(np.int32), followers,
+            popular.astype(np.int32),
+        )
+
+    @classmethod
+    def load(cls, directory):
+        return cls(*(
+            np.load(os.path.join(directory, f'{name}.npy'), mmap_mode='r')
+            for name in ARRAYS
+        ))
+
+    def save(self, directory):
+        for name in ARRAYS:
+            np.save(os.path.join(directory, f'{name}.npy'),
+                    getattr(self, name))
+
+    @property
+    def edges(self):
+        return len(self.indices)
+
+    def node(self, user_id):
+        index = int(np.searchsorted(self.ids, user_id))
+        if index < len(self.ids) and self.ids[index] == user_id:
+            return index
+        return None
+
+    def following(self, node):
+        return self.indices[self.indptr[node]:self.indptr[node + 1]]
+
+    def two_hop(self, node):
+        """Узлы на расстоянии два от ``node`` и число путей до них.
+
+        Списки смежности всех соседей склеиваются одним ``take``: для
+        каждой позиции результата индекс в ``indices`` — начало списка
+        её соседа плюс смещение внутри списка.
+        """
+        neighbours = self.following(node)
+        starts = self.indptr[neighbours]
+        lengths = self.indptr[neighbours + 1] - starts
+        ends = np.cumsum(lengths)
+        if len(ends) and ends[-1] > MAX_PATHS:
+            fit = int(np.searchsorted(ends, MAX_PATHS, side='right'))
+            starts, lengths, ends = starts[:fit], lengths[:fit], ends[:fit]
+        total = int(ends[-1]) if len(ends) else 0
+        if not total:
+            return np.empty(0, np.int32), np.empty(0, np.int64)
+        offsets = np.repeat(starts - (ends - lengths), lengths)
+        reached = self.indices.take(offsets + np.arange(total))
+        return np.unique(reached, return_counts=True)
+
+    def suggest(self, user_id, limit):
+        """id пользователей для рекомендации: больше путей — выше, при
+        равенстве выше тот, у кого больше подписчиков."""
+        node = self.node(user_id)
+        if node is None:
+            candidates = np.asarray(self.popular)
+            scores = np.zeros(len(candidates))
+        else:
+            candidates, counts = self.two_hop(node)
+            keep = ~np.isin(candidates, self.following(node)) & (
+                candidates != node
+            )
+            candidates, scores = candidates[keep], counts[keep]
+            if not len(candidates):
+                candidates = np.setdiff1d(
+                    self.popular, np.append(self.following(node), node),
+                    assume_unique=True,
+                )
+                scores = np.zeros(len(candidates))
+        followers = self.followers[candidates]
+        if len(candidates) > limit:
+            top = np.argpartition(
+                -(scores * (int(self.followers.max()) + 1) + followers),
+                limit - 1,
+            )[:limit]
+            candidates, scores, followers = (
+                candidates[top], scores[top], followers[top]
+            )
+        order = np.lexsort((-followers, -scores))
+        return [int(user) for user in self.ids[candidates[order]][:limit]]
+
+
+def edges_from_db(using=DEFAULT_DB_ALIAS):
+    """Рёбра из ``posts_follow`` пачками, без моделей Django."""
+    from .models import Follow
+
+    chunks = []
+    with connections[using].cursor() as cursor:
+        cursor.execute('SELECT {}, {} FROM {}'.format(
+            Follow._meta.get_field('user').column,
+            Follow._meta.get_field('author').column,
+            Follow._meta.db_table,
+        ))
+        while True:
+            rows = cursor.fetchmany(FETCH_SIZE)
+            if not rows:
+                break
+            chunks.append(np.array(rows, dtype=np.int64))
+    edges = np.concatenate(chunks) if chunks else np.empty((0, 2), np.int64)
+    return edges[:, 0], edges[:, 1]
+
+
+def publish(graph, root=None):
+    return versioned.publish(graph.save, root or settings.FOLLOW_GRAPH_DIR)
+
+
+def rebuild(root=None):
+    graph = FollowGraph.from_edges(*edges_from_db())
+    publish(graph, root)
+    return graph
+
+
+_current = versioned.Current(
+    'FOLLOW_GRAPH_DIR', 'FOLLOW_GRAPH_CHECK_INTERVAL', FollowGraph.load
+)
+current = _current.get
+reset = _current.reset
+
+
+def suggestions(user, limit=None):
+    """Пользователи для блока «кого читать», без уже прочитанных после
+    последней сборки графа."""
+    from .models import Follow, User
+
+    graph = current()
+    if graph is None or not user.is_authenticated:
+        return []
+    limit = limit or settings.FOLLOW_SUGGESTIONS
+    ids = graph.suggest(user.pk, limit * 2)
+    followed = set(Follow.objects.filter(
+        user=user, author_id__in=ids
+    ).values_list('author_id', flat=True))
+    ids = [
+        user_id for user_id in ids
+        if user_id not in followed and user_id != user.pk
+    ][:limit]
+    users = User.objects.in_bulk(ids)
+    return [users[user_id] for user_id in ids if user_id in users]
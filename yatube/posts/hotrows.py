@@ -0,0 +1,7 @@
+from core.cache.hotrows import HotRowCache
+
+from .models import Group, Tag, User
+
+groups_by_slug = HotRowCache(Group, 'slug')
+users_by_username = HotRowCache(User, 'username')
+tags_by_name = HotRowCache(Tag, 'name')
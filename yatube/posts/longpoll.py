@@ -0,0 +1,113 @@
+"""Длинный опрос «есть ли новые посты» по журналу изменений.
+
+Курсор — позиции журналов всех баз вида ``default:15`` через запятую.
+Пока новых постов нет, запрос ждёт до ``NEW_POSTS_TIMEOUT`` секунд:
+коммит в этом же процессе будит его сразу через ``Condition``, а
+изменения из других воркеров замечаются по записи в кеше, которую
+проверяет каждые ``NEW_POSTS_CHECK_INTERVAL`` секунд. В базу ждущий
+запрос ходит только после такого сигнала. Одновременно ждут не больше
+``NEW_POSTS_MAX_WAITERS`` запросов процесса; остальным ``wait``
+отказывает через ``Busy``, и клиент повторяет запрос не раньше чем
+через ``NEW_POSTS_RETRY_AFTER`` секунд.
+"""
+import json
+import threading
+import time
+
+from django.conf import settings
+from django.db.models import Max
+
+from . import sharding
+from .changelog import heads
+from .models import ChangeLog
+
+# Больше не поместится в целое SQLite.
+MAX_SEQ = 2 ** 63 - 1
+
+_changed = threading.Condition()
+_waiters = None
+
+
+class Busy(Exception):
+    """Ждущих запросов уже ``NEW_POSTS_MAX_WAITERS``."""
+
+
+def wake_up():
+    with _changed:
+        _changed.notify_all()
+
+
+def _semaphore():
+    global _waiters
+    if _waiters is None:
+        _waiters = threading.BoundedSemaphore(settings.NEW_POSTS_MAX_WAITERS)
+    return _waiters
+
+
+def current_cursor():
+    return {
+        db: ChangeLog.objects.using(db).aggregate(Max('seq'))['seq__max'] or 0
+        for db in sharding.shards()
+    }
+
+
+def format_cursor(cursor):
+    return ','.join(f'{db}:{seq}' for db, seq in cursor.items())
+
+
+def parse_cursor(value):
+    """Курсор из строки; None, если строка не похожа на курсор."""
+    cursor = {}
+    for part in value.split(','):
+        db, _, seq = part.rpartition(':')
+        if db not in sharding.shards() or not seq.isdecimal():
+            return None
+        cursor[db] = int(seq)
+        if cursor[db] > MAX_SEQ:
+            return None
+    return cursor
+
+
+def newer_posts(cursor, accept):
+    """id новых постов, прошедших фильтр ``accept(data)``, и курсор
+    после них."""
+    ids = []
+    cursor = dict(cursor)
+    for db in sharding.shards():
+        entries = ChangeLog.objects.using(db).filter(
+            seq__gt=cursor.get(db, 0),
+            model='posts.post',
+            action=ChangeLog.CREATE,
+        ).order_by('seq')[:settings.NEW_POSTS_LIMIT]
+        for entry in entries:
+            cursor[db] = entry.seq
+            if accept(json.loads(entry.data)):
+                ids.append(entry.object_id)
+    return ids, cursor
+
+
+def wait(cursor, accept, timeout):
+    """Ждёт новых постов не дольше ``timeout``; ``Busy``, если новых
+    постов нет, а ждать уже некому."""
+    deadline = time.monotonic() + timeout
+    databases = sharding.shards()
+    seen = heads(databases)
+    ids, cursor = newer_posts(cursor, accept)
+    if ids:
+        return ids, cursor
+    if not _semaphore().acquire(blocking=False):
+        raise Busy
+    try:
+        while not ids and time.monotonic() < deadline:
+            with _changed:
+                _changed.wait(min(
+                    settings.NEW_POSTS_CHECK_INTERVAL,
+                    max(deadline - time.monotonic(), 0),
+                ))
+            current = heads(databases)
+            if current != seen:
+                seen = current
+                ids, cursor = newer_posts(cursor, accept)
+    finally:
+        _semaphore().release()
+    return ids, cursor
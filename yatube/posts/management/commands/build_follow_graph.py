@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts import graph
+from posts.tasks import rebuild_follow_graph
+
+
+class Command(BaseCommand):
+    help = (
+        'Собирает граф подписок для рекомендаций. С --schedule ставит '
+        'периодическую пересборку в очередь jobs.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--schedule', action='store_true')
+
+    def handle(self, *args, **options):
+        if options['schedule']:
+            rebuild_follow_graph.delay()
+            self.stdout.write('Задача поставлена в очередь')
+            return
+        start = time.perf_counter()
+        built = graph.rebuild()
+        self.stdout.write(
+            f'Узлов: {len(built.ids)}, рёбер: {built.edges}, '
+            f'{time.perf_counter() - start:.2f} с'
+        )
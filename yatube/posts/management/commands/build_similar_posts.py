@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts import similar
+from posts.tasks import update_similar_posts
+
+
+class Command(BaseCommand):
+    help = (
+        'Собирает матрицу TF-IDF постов и таблицу похожих постов. '
+        'С --schedule ставит в очередь jobs периодическое добавление '
+        'новых постов.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--schedule', action='store_true')
+
+    def handle(self, *args, **options):
+        if options['schedule']:
+            update_similar_posts.delay()
+            self.stdout.write('Задача поставлена в очередь')
+            return
+        start = time.perf_counter()
+        matrix = similar.rebuild()
+        self.stdout.write(
+            f'Постов: {matrix.documents}, '
+            f'ненулевых весов: {len(matrix.indices)}, '
+            f'{time.perf_counter() - start:.2f} с'
+        )
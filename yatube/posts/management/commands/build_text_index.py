@@ -0,0 +1,39 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts import duplicates
+from posts.tasks import rebuild_text_index
+
+
+class Command(BaseCommand):
+    help = (
+        'Собирает индекс MinHash LSH для поиска почти дублей. '
+        'С --schedule ставит периодическую пересборку в очередь jobs.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--backfill', action='store_true',
+            help='Сначала посчитать подписи постов и комментариев без них.',
+        )
+        parser.add_argument(
+            '--all', action='store_true',
+            help='С --backfill пересчитать все подписи.',
+        )
+        parser.add_argument('--schedule', action='store_true')
+
+    def handle(self, *args, **options):
+        if options['schedule']:
+            rebuild_text_index.delay()
+            self.stdout.write('Задача поставлена в очередь')
+            return
+        if options['backfill']:
+            saved = duplicates.backfill(replace=options['all'])
+            self.stdout.write(f'Подписей сохранено: {saved}')
+        start = time.perf_counter()
+        index = duplicates.rebuild()
+        self.stdout.write(
+            f'Подписей в индексе: {len(index.ids)}, '
+            f'{time.perf_counter() - start:.2f} с'
+        )
@@ -0,0 +1,141 @@
+import os
+import sqlite3
+import tempfile
+import time
+from collections import Counter
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from posts.graph import FollowGraph, publish
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет сборку графа подписок и рекомендации на случайном '
+        'графе: авторы выбираются по закону Ципфа, как в живой сети.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--edges', type=int, default=1000000)
+        parser.add_argument('--users', type=int, default=100000)
+        parser.add_argument('--queries', type=int, default=2000)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--correlated', action='store_true',
+            help='Самые читаемые авторы сами читают больше всех.',
+        )
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(options['seed'])
+        edges = self.random_edges(
+            rng, options['users'], options['edges'], options['correlated']
+        )
+
+        database = self.sql_table(edges)
+        start = time.perf_counter()
+        graph = FollowGraph.from_edges(edges[:, 0], edges[:, 1])
+        self.report('Сборка CSR', time.perf_counter() - start)
+        with tempfile.TemporaryDirectory() as root:
+            start = time.perf_counter()
+            version = publish(graph, root)
+            self.report('Запись на диск', time.perf_counter() - start)
+            directory = os.path.join(root, version)
+            size = sum(
+                os.path.getsize(os.path.join(directory, name))
+                for name in os.listdir(directory)
+            )
+            self.stdout.write(
+                f'Узлов: {len(graph.ids)}, рёбер: {graph.edges}, '
+                f'файлы: {size / 1024 / 1024:.1f} МБ'
+            )
+            mapped = FollowGraph.load(directory)
+            degrees = np.diff(graph.indptr)
+            samples = (
+                ('случайные', rng.choice(graph.ids, options['queries'])),
+                ('активные 1%', graph.ids[np.argsort(degrees)[
+                    -max(1, len(graph.ids) // 100):
+                ]][:options['queries']]),
+            )
+            for name, sample in samples:
+                self.measure(f'NumPy, mmap, {name}', sample,
+                             lambda user: mapped.suggest(user, 5))
+                self.measure(f'Python Counter, {name}', sample[:200],
+                             lambda user: self.naive(graph, user, 5))
+                self.measure(f'SQL, {name}', sample[:200],
+                             lambda user: self.sql(database, user, 5))
+
+    def random_edges(self, rng, users, count, correlated):
+        """Уникальные рёбра без петель. Число подписок и число
+        подписчиков распределены неравномерно (степенью от
+        равномерного); с ``correlated`` больше всех читают те же, кого
+        больше всех читают, иначе — разные пользователи."""
+        readers = np.arange(users) + 1 if correlated else (
+            rng.permutation(users) + 1
+        )
+        edges = np.empty((0, 2), np.int64)
+        while len(edges) < count:
+            need = int((count - len(edges)) * 1.2) + 1
+            batch = np.stack((
+                readers[(users * rng.random(need) ** 3).astype(np.int64)],
+                (users * rng.random(need) ** 4).astype(np.int64) + 1,
+            ), axis=1)
+            edges = np.unique(np.concatenate((
+                edges, batch[batch[:, 0] != batch[:, 1]],
+            )), axis=0)
+        return edges[rng.permutation(len(edges))[:count]]
+
+    def sql_table(self, edges):
+        """Та же таблица подписок в SQLite в памяти — запрос на каждый
+        показ, как было бы без графа."""
+        database = sqlite3.connect(':memory:')
+        database.execute(
+            'CREATE TABLE follow (user_id INTEGER, author_id INTEGER)'
+        )
+        database.executemany(
+            'INSERT INTO follow VALUES (?, ?)', edges.tolist()
+        )
+        database.execute(
+            'CREATE UNIQUE INDEX follow_user ON follow (user_id, author_id)'
+        )
+        database.execute('CREATE INDEX follow_author ON follow (author_id)')
+        return database
+
+    def sql(self, database, user_id, limit):
+        return database.execute(
+            'SELECT second.author_id, COUNT(*) AS paths '
+            'FROM follow AS first JOIN follow AS second '
+            'ON second.user_id = first.author_id '
+            'WHERE first.user_id = ? AND second.author_id != ? '
+            'AND second.author_id NOT IN '
+            '(SELECT author_id FROM follow WHERE user_id = ?) '
+            'GROUP BY second.author_id ORDER BY paths DESC LIMIT ?',
+            (user_id, user_id, user_id, limit),
+        ).fetchall()
+
+    def naive(self, graph, user_id, limit):
+        node = graph.node(user_id)
+        following = set(graph.following(node).tolist())
+        counts = Counter()
+        for neighbour in following:
+            counts.update(graph.following(neighbour).tolist())
+        return [
+            int(graph.ids[candidate])
+            for candidate, _ in counts.most_common()
+            if candidate not in following and candidate != node
+        ][:limit]
+
+    def measure(self, label, sample, suggest):
+        timings = []
+        for user in sample:
+            start = time.perf_counter()
+            suggest(int(user))
+            timings.append(time.perf_counter() - start)
+        p50, p99 = np.percentile(timings, [50, 99]) * 1000
+        self.stdout.write(
+            f'{label}: {len(sample)} запросов, p50 {p50:.2f} мс, '
+            f'p99 {p99:.2f} мс'
+        )
+
+    def report(self, label, seconds):
+        self.stdout.write(f'{label}: {seconds:.2f} с')
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from posts import sharding, tags
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = 'Раскладывает хештеги существующих постов по таблицам тегов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch', type=int, default=500)
+
+    def handle(self, *args, **options):
+        indexed = 0
+        for database in sharding.shards():
+            queryset = Post.objects.using(database).only(
+                'pk', 'text', 'pub_date'
+            ).order_by('pk')
+            last_pk = None
+            while True:
+                batch = queryset if last_pk is None else queryset.filter(
+                    pk__gt=last_pk
+                )
+                posts = list(batch[:options['batch']])
+                if not posts:
+                    break
+                for post in posts:
+                    tags.update_post_tags(post)
+                indexed += len(posts)
+                last_pk = posts[-1].pk
+        self.stdout.write(f'Обработано постов: {indexed}')
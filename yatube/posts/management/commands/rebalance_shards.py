@@ -0,0 +1,147 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import F, Max
+
+from posts import changelog, sharding
+from posts.models import ChangeLog, Comment, Post, ShardBucket, User
+
+BATCH_SIZE = 500
+
+
+class Command(BaseCommand):
+    help = (
+        'Переносит бакет авторов в другой шард без остановки записи: '
+        'копирует данные, переключает таблицу бакетов, дожидается, пока '
+        'все процессы её перечитают, докопирует изменения и удаляет '
+        'данные из старого шарда. Строки, изменённые в новом шарде '
+        'после переключения, докопирование не трогает.'
+    )
+
+    def add_arguments(self, parser):
+        target = parser.add_mutually_exclusive_group(required=True)
+        target.add_argument('--bucket', type=int)
+        target.add_argument('--author', help='username автора')
+        parser.add_argument('--to', required=True, dest='database')
+
+    def handle(self, *args, **options):
+        if not sharding.enabled():
+            raise CommandError('Шардирование выключено: POST_SHARDS пуст')
+        database = options['database']
+        if database not in sharding.shards():
+            raise CommandError(f'{database} нет в POST_SHARDS')
+        bucket = options['bucket']
+        if options['author'] is not None:
+            author = User.objects.using(DEFAULT_DB_ALIAS).get(
+                username=options['author']
+            )
+            bucket = sharding.bucket_for_author(author.pk)
+        source = sharding.shard_for_bucket(bucket)
+        if source == database:
+            self.stdout.write(f'Бакет {bucket} уже в {database}')
+            return
+
+        copied = self.copy(bucket, source, database)
+        self.stdout.write(f'Скопировано записей: {copied}')
+        cutover = self.last_seq(database)
+        ShardBucket.objects.using(DEFAULT_DB_ALIAS).update_or_create(
+            bucket=bucket, defaults={'database': database}
+        )
+        sharding.reset_bucket_map()
+        time.sleep(settings.SHARD_MAP_TTL + 1)
+        with transaction.atomic(using=database):
+            copied = self.copy(bucket, source, database, cutover=cutover)
+        self.stdout.write(f'Докопировано записей: {copied}')
+        with transaction.atomic(using=source):
+            for model in (Comment, Post):
+                self.delete(self.in_bucket(model, source, bucket))
+        self.stdout.write(f'Бакет {bucket}: {source} -> {database}')
+
+    @staticmethod
+    def in_bucket(model, database, bucket):
+        return (
+            model.objects.using(database)
+            .annotate(bucket=F('id') % sharding.SHARD_BUCKETS)
+            .filter(bucket=bucket)
+        )
+
+    @staticmethod
+    def delete(queryset):
+        """Удаляет строки без сигналов ``post_delete``: записи не
+        удаляются, а переезжают, и ни их теги, ни журнал трогать
+        нельзя."""
+        return queryset._raw_delete(queryset.db)
+
+    @staticmethod
+    def last_seq(database):
+        return ChangeLog.objects.using(database).aggregate(
+            Max('seq')
+        )['seq__max'] or 0
+
+    @staticmethod
+    def changed_since(model, database, cutover, ids):
+        """id из ``ids``, которые после ``cutover`` создавали, меняли или
+        удаляли в ``database``: там они новее, чем в старом шарде."""
+        return set(ChangeLog.objects.using(database).filter(
+            seq__gt=cutover,
+            model=model._meta.label_lower,
+            object_id__in=ids,
+        ).exclude(action=ChangeLog.MOVE).values_list('object_id', flat=True))
+
+    @staticmethod
+    def batches(rows):
+        last_id = 0
+        while True:
+            batch = list(rows.filter(id__gt=last_id)[:BATCH_SIZE])
+            if not batch:
+                return
+            last_id = batch[-1].id
+            yield batch
+
+    def copy(self, bucket, source, database, cutover=None):
+        """Копирует записи бакета пачками. С ``cutover`` — ``seq``
+        журнала целевого шарда в момент переключения — строки в нём
+        заменяются, чтобы подхватить правки, сделанные в старом шарде
+        во время первого прохода, а удалённые там — удаляются. Строки,
+        изменённые в целевом шарде после переключения, остаются как
+        есть. Для строк, которых в целевом шарде ещё не было, в его
+        журнал пишется ``MOVE``."""
+        copied = 0
+        for model in (Post, Comment):
+            rows = self.in_bucket(model, source, bucket).order_by('id')
+            for batch in self.batches(rows):
+                ids = [obj.id for obj in batch]
+                target = model.objects.using(database).filter(id__in=ids)
+                present = set(target.values_list('id', flat=True))
+                if cutover is not None:
+                    changed = self.changed_since(
+                        model, database, cutover, ids
+                    )
+                    batch = [obj for obj in batch if obj.id not in changed]
+                    self.delete(target.exclude(id__in=changed))
+                model.objects.using(database).bulk_create(
+                    batch, ignore_conflicts=True
+                )
+                for obj in batch:
+                    if obj.id not in present:
+                        changelog.record(obj, ChangeLog.MOVE, database)
+                copied += len(batch)
+            if cutover is not None:
+                self.drop_deleted(model, bucket, source, database, cutover)
+        return copied
+
+    def drop_deleted(self, model, bucket, source, database, cutover):
+        """Удаляет из целевого шарда строки, удалённые в старом шарде
+        между проходами."""
+        rows = self.in_bucket(model, database, bucket).order_by('id')
+        for batch in self.batches(rows.only('id')):
+            ids = [obj.id for obj in batch]
+            kept = set(model.objects.using(source).filter(
+                id__in=ids
+            ).values_list('id', flat=True))
+            kept |= self.changed_since(model, database, cutover, ids)
+            self.delete(model.objects.using(database).filter(
+                id__in=set(ids) - kept
+            ))
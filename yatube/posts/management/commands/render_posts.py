@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from posts import rendering, sharding
+from posts.models import Comment, Post
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет готовый HTML постов и комментариев во всех шардах. '
+        'Нужна после смены разметки или POST_EXCERPT_LENGTH.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch', type=int, default=500)
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Перерисовать все записи, а не только незаполненные.',
+        )
+
+    def handle(self, *args, **options):
+        for model in (Post, Comment):
+            for database in sharding.shards():
+                updated = rendering.backfill(
+                    model, database, options['batch'],
+                    only_missing=not options['all'],
+                )
+                self.stdout.write(
+                    f'{model.__name__} в {database}: '
+                    f'{updated}'
+                )
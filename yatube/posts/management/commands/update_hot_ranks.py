@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from posts import ranking
+from posts.tasks import update_hot_ranks
+
+
+class Command(BaseCommand):
+    help = (
+        'Обновляет горячую ленту по журналу изменений. С --schedule '
+        'ставит периодическую задачу в очередь jobs.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rebuild', action='store_true',
+            help='Пересчитать таблицу с нуля по постам окна.',
+        )
+        parser.add_argument('--schedule', action='store_true')
+
+    def handle(self, *args, **options):
+        if options['rebuild']:
+            ranked = ranking.rebuild()
+            self.stdout.write(f'Постов в ленте: {ranked}')
+        if options['schedule']:
+            update_hot_ranks.delay()
+            self.stdout.write('Задача поставлена в очередь')
+        elif not options['rebuild']:
+            processed = ranking.update()
+            self.stdout.write(f'Записей журнала: {processed}')
@@ -0,0 +1,42 @@
+# Generated by Django 2.2.16 on 2026-10-19 09:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0009_auto_20261019_0909'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeLog',
+            fields=[
+                ('seq', models.BigAutoField(primary_key=True, serialize=False)),
+                ('model', models.CharField(max_length=50, verbose_name='Модель')),
+                ('object_id', models.BigIntegerField(verbose_name='id объекта')),
+                ('action', models.CharField(choices=[('create', 'Создание'), ('update', 'Изменение'), ('delete', 'Удаление')], max_length=6, verbose_name='Действие')),
+                ('data', models.TextField(default='{}', verbose_name='Поля, JSON')),
+                ('created', models.DateTimeField(auto_now_add=True, verbose_name='Дата')),
+            ],
+            options={
+                'verbose_name': 'запись журнала изменений',
+                'verbose_name_plural': 'журнал изменений',
+                'ordering': ['seq'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ChangeLogCheckpoint',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('consumer', models.CharField(max_length=100, verbose_name='Читатель')),
+                ('database', models.CharField(max_length=100, verbose_name='База')),
+                ('seq', models.BigIntegerField(default=0, verbose_name='Последняя обработанная запись')),
+                ('updated', models.DateTimeField(auto_now=True, verbose_name='Обновлено')),
+            ],
+            options={
+                'unique_together': {('consumer', 'database')},
+            },
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 2.2.16 on 2026-10-19 09:33
+
+from django.db import migrations, models, router
+
+from posts.rendering import backfill
+
+
+def render_existing(apps, schema_editor):
+    using = schema_editor.connection.alias
+    for name in ('Post', 'Comment'):
+        model = apps.get_model('posts', name)
+        if router.allow_migrate_model(using, model):
+            backfill(model, using)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0010_changelog_changelogcheckpoint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='excerpt_html',
+            field=models.TextField(default='', editable=False),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='text_html',
+            field=models.TextField(default='', editable=False),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='excerpt_html',
+            field=models.TextField(default='', editable=False),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='text_html',
+            field=models.TextField(default='', editable=False),
+        ),
+        migrations.RunPython(render_existing, migrations.RunPython.noop),
+    ]
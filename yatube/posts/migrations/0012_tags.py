@@ -0,0 +1,59 @@
+# Generated by Django 2.2.16 on 2026-10-19 09:35
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0011_rendered_html'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tag',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True, verbose_name='Тег')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='TagBucket',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField(verbose_name='Час')),
+                ('count', models.IntegerField(default=0, verbose_name='Постов')),
+                ('tag', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='buckets', to='posts.Tag')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='PostTag',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('post_id', models.BigIntegerField(verbose_name='id поста')),
+                ('pub_date', models.DateTimeField(verbose_name='Дата публикации')),
+                ('tag', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='post_links', to='posts.Tag')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='tagbucket',
+            index=models.Index(fields=['hour'], name='posts_tagbucket_hour_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='tagbucket',
+            unique_together={('tag', 'hour')},
+        ),
+        migrations.AddIndex(
+            model_name='posttag',
+            index=models.Index(fields=['tag', 'pub_date', 'post_id'], name='posts_posttag_tag_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='posttag',
+            index=models.Index(fields=['post_id'], name='posts_posttag_post_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='posttag',
+            unique_together={('tag', 'post_id')},
+        ),
+    ]
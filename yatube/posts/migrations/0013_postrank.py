@@ -0,0 +1,41 @@
+# Generated by Django 2.2.16 on 2026-10-19 09:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0012_tags'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PostRank',
+            fields=[
+                ('post_id', models.BigIntegerField(primary_key=True, serialize=False, verbose_name='id поста')),
+                ('author_id', models.IntegerField(verbose_name='id автора')),
+                ('group_id', models.IntegerField(blank=True, null=True, verbose_name='id группы')),
+                ('pub_date', models.DateTimeField(verbose_name='Дата публикации')),
+                ('base', models.FloatField(verbose_name='Вклад поста и охвата')),
+                ('activity', models.FloatField(blank=True, null=True, verbose_name='Вклад комментариев')),
+                ('score', models.FloatField(verbose_name='Счёт')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='postrank',
+            index=models.Index(fields=['score', 'post_id'], name='posts_postrank_score_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='postrank',
+            index=models.Index(fields=['group_id', 'score', 'post_id'], name='posts_postrank_group_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='postrank',
+            index=models.Index(fields=['author_id'], name='posts_postrank_author_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='postrank',
+            index=models.Index(fields=['pub_date'], name='posts_postrank_date_idx'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 2.2.16 on 2026-10-19 09:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0013_postrank'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SimilarPost',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('post_id', models.BigIntegerField(verbose_name='id поста')),
+                ('similar_id', models.BigIntegerField(verbose_name='id похожего поста')),
+                ('score', models.FloatField(verbose_name='Косинусная близость')),
+                ('rank', models.PositiveSmallIntegerField(verbose_name='Место')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='similarpost',
+            index=models.Index(fields=['post_id', 'rank'], name='posts_similar_post_rank_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='similarpost',
+            index=models.Index(fields=['similar_id'], name='posts_similar_similar_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='similarpost',
+            unique_together={('post_id', 'similar_id')},
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 2.2.16 on 2026-10-19 09:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0014_similarpost'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='moderation',
+            field=models.CharField(choices=[('visible', 'Опубликовано'), ('flagged', 'На проверке'), ('hidden', 'Скрыто')], default='visible', max_length=7, verbose_name='Модерация'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='moderation',
+            field=models.CharField(choices=[('visible', 'Опубликовано'), ('flagged', 'На проверке'), ('hidden', 'Скрыто')], default='visible', max_length=7, verbose_name='Модерация'),
+        ),
+        migrations.CreateModel(
+            name='TextSignature',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('model', models.CharField(max_length=50, verbose_name='Модель')),
+                ('object_id', models.BigIntegerField(verbose_name='id объекта')),
+                ('signature', models.BinaryField(verbose_name='Подпись')),
+                ('created', models.DateTimeField(auto_now_add=True, verbose_name='Дата')),
+            ],
+            options={
+                'unique_together': {('model', 'object_id')},
+            },
+        ),
+    ]
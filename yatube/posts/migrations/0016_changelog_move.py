@@ -0,0 +1,18 @@
+# Generated by Django 2.2.16 on 2026-10-19 10:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0015_moderation'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='changelog',
+            name='action',
+            field=models.CharField(choices=[('create', 'Создание'), ('update', 'Изменение'), ('delete', 'Удаление'), ('move', 'Перенос в этот шард')], max_length=6, verbose_name='Действие'),
+        ),
+    ]
@@ -1,18 +1,53 @@
-from django.db import models
+from django.db import models, router, transaction
 from django.contrib.auth import get_user_model
 from django.conf import settings
 
+from core.db.querycache import CachedQuerySet
+
+from . import rendering, sharding
+
 User = get_user_model()
 
+VISIBLE = 'visible'
+FLAGGED = 'flagged'
+HIDDEN = 'hidden'
+MODERATION_CHOICES = (
+    (VISIBLE, 'Опубликовано'),
+    (FLAGGED, 'На проверке'),
+    (HIDDEN, 'Скрыто'),
+)
+
+
+def logged_save(instance, save_kwargs):
+    """Транзакция сохранения, в которую ``post_save`` допишет запись
+    в ``ChangeLog``."""
+    using = save_kwargs.get('using') or router.db_for_write(
+        type(instance), instance=instance
+    )
+    return transaction.atomic(using=using)
+
+
+class PostQuerySet(CachedQuerySet):
+    def for_list(self):
+        """Для лент: полный текст не читается, шаблон берёт
+        ``excerpt_html``; скрытые модерацией посты не показываются."""
+        return self.defer('text', 'text_html').exclude(moderation=HIDDEN)
+
 
 class Group(models.Model):
     title = models.CharField(max_length=200)
     slug = models.SlugField(max_length=100, unique=True)
     description = models.TextField()
 
+    objects = CachedQuerySet.as_manager()
+
     def __str__(self):
         return self.title
 
+    def save(self, *args, **kwargs):
+        with logged_save(self, kwargs):
+            super().save(*args, **kwargs)
+
 
 class Post(models.Model):
     text = models.TextField(
@@ -28,12 +63,14 @@ class Post(models.Model):
         on_delete=models.CASCADE,
         related_name='posts',
         verbose_name='Автор',
+        db_constraint=False,
     )
     group = models.ForeignKey(
         Group,
         blank=True,
         null=True,
         on_delete=models.SET_NULL,
+        db_constraint=False,
         related_name='posts',
         verbose_name='Группа',
         help_text='Группа, к которой будет относиться пост',
@@ -43,10 +80,24 @@ class Post(models.Model):
         upload_to='posts/',
         blank=True
     )
+    text_html = models.TextField(editable=False, default='')
+    excerpt_html = models.TextField(editable=False, default='')
+    moderation = models.CharField(
+        'Модерация', max_length=7, choices=MODERATION_CHOICES,
+        default=VISIBLE,
+    )
+
+    objects = PostQuerySet.as_manager()
 
     def __str__(self):
         return self.text[:settings.TEST_NUMBER]
 
+    def save(self, *args, **kwargs):
+        sharding.prepare_insert(self, kwargs)
+        rendering.prepare_save(self, kwargs)
+        with logged_save(self, kwargs):
+            super().save(*args, **kwargs)
+
     class Meta:
         ordering = ['-pub_date']
 
@@ -62,7 +113,8 @@ class Comment(models.Model):
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
-        related_name='comments'
+        related_name='comments',
+        db_constraint=False,
     )
     text = models.TextField(
         'Текст комментария',
@@ -72,10 +124,22 @@ class Comment(models.Model):
         'Дата публикации',
         auto_now_add=True
     )
+    text_html = models.TextField(editable=False, default='')
+    excerpt_html = models.TextField(editable=False, default='')
+    moderation = models.CharField(
+        'Модерация', max_length=7, choices=MODERATION_CHOICES,
+        default=VISIBLE,
+    )
 
     def __str__(self):
         return self.text
 
+    def save(self, *args, **kwargs):
+        sharding.prepare_insert(self, kwargs)
+        rendering.prepare_save(self, kwargs)
+        with logged_save(self, kwargs):
+            super().save(*args, **kwargs)
+
     class Meta:
         ordering = ['-created']
 
@@ -92,5 +156,183 @@ class Follow(models.Model):
         related_name='following'
     )
 
+    def save(self, *args, **kwargs):
+        with logged_save(self, kwargs):
+            super().save(*args, **kwargs)
+
     class Meta:
         unique_together = ['user', 'author']
+
+
+class ShardBucket(models.Model):
+    """Бакет авторов, перенесённый в другой шард командой
+    ``rebalance_shards``."""
+
+    bucket = models.PositiveIntegerField(primary_key=True)
+    database = models.CharField(max_length=100)
+
+    def __str__(self):
+        return f'{self.bucket} -> {self.database}'
+
+
+class ChangeLog(models.Model):
+    """Журнал изменений постов, комментариев, подписок и групп.
+
+    Только дописывается; ``seq`` растёт монотонно в пределах базы.
+    """
+
+    CREATE = 'create'
+    UPDATE = 'update'
+    DELETE = 'delete'
+    MOVE = 'move'
+    ACTION_CHOICES = (
+        (CREATE, 'Создание'),
+        (UPDATE, 'Изменение'),
+        (DELETE, 'Удаление'),
+        (MOVE, 'Перенос в этот шард'),
+    )
+
+    seq = models.BigAutoField(primary_key=True)
+    model = models.CharField('Модель', max_length=50)
+    object_id = models.BigIntegerField('id объекта')
+    action = models.CharField('Действие', max_length=6,
+                              choices=ACTION_CHOICES)
+    data = models.TextField('Поля, JSON', default='{}')
+    created = models.DateTimeField('Дата', auto_now_add=True)
+
+    def __str__(self):
+        return f'#{self.seq} {self.action} {self.model}:{self.object_id}'
+
+    class Meta:
+        ordering = ['seq']
+        verbose_name = 'запись журнала изменений'
+        verbose_name_plural = 'журнал изменений'
+
+
+class ChangeLogCheckpoint(models.Model):
+    """Позиция читателя журнала в базе ``database``."""
+
+    consumer = models.CharField('Читатель', max_length=100)
+    database = models.CharField('База', max_length=100)
+    seq = models.BigIntegerField('Последняя обработанная запись', default=0)
+    updated = models.DateTimeField('Обновлено', auto_now=True)
+
+    def __str__(self):
+        return f'{self.consumer}@{self.database}: {self.seq}'
+
+    class Meta:
+        unique_together = ['consumer', 'database']
+
+
+class Tag(models.Model):
+    """Хештег из текста поста, в нижнем регистре и без ``#``."""
+
+    name = models.CharField('Тег', max_length=50, unique=True)
+
+    def __str__(self):
+        return f'#{self.name}'
+
+
+class PostTag(models.Model):
+    """Связь тега с постом. Хранится в основной базе рядом с тегами,
+    поэтому ``post`` — просто id поста из его шарда; ``pub_date``
+    скопирован из поста для выборки страницы тега по индексу."""
+
+    tag = models.ForeignKey(
+        Tag, on_delete=models.CASCADE, related_name='post_links'
+    )
+    post_id = models.BigIntegerField('id поста')
+    pub_date = models.DateTimeField('Дата публикации')
+
+    class Meta:
+        unique_together = ['tag', 'post_id']
+        indexes = [
+            models.Index(
+                fields=['tag', 'pub_date', 'post_id'],
+                name='posts_posttag_tag_date_idx',
+            ),
+            models.Index(fields=['post_id'], name='posts_posttag_post_idx'),
+        ]
+
+
+class TagBucket(models.Model):
+    """Число постов с тегом за час; из них складываются окна
+    популярности."""
+
+    tag = models.ForeignKey(
+        Tag, on_delete=models.CASCADE, related_name='buckets'
+    )
+    hour = models.DateTimeField('Час')
+    count = models.IntegerField('Постов', default=0)
+
+    class Meta:
+        unique_together = ['tag', 'hour']
+        indexes = [
+            models.Index(fields=['hour'], name='posts_tagbucket_hour_idx'),
+        ]
+
+
+class PostRank(models.Model):
+    """Место поста в «горячей» ленте.
+
+    Счёт хранится в логарифмической шкале, где затухание со временем
+    уже учтено (см. ``posts.ranking``), поэтому порядок не меняется сам
+    по себе и строка пересчитывается только при новых комментариях и
+    подписках. Лежит в основной базе, как и теги.
+    """
+
+    post_id = models.BigIntegerField('id поста', primary_key=True)
+    author_id = models.IntegerField('id автора')
+    group_id = models.IntegerField('id группы', blank=True, null=True)
+    pub_date = models.DateTimeField('Дата публикации')
+    base = models.FloatField('Вклад поста и охвата')
+    activity = models.FloatField('Вклад комментариев', blank=True,
+                                 null=True)
+    score = models.FloatField('Счёт')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['score', 'post_id'],
+                         name='posts_postrank_score_idx'),
+            models.Index(fields=['group_id', 'score', 'post_id'],
+                         name='posts_postrank_group_idx'),
+            models.Index(fields=['author_id'],
+                         name='posts_postrank_author_idx'),
+            models.Index(fields=['pub_date'],
+                         name='posts_postrank_date_idx'),
+        ]
+
+
+class SimilarPost(models.Model):
+    """Заранее найденные похожие посты (``posts.similar``)."""
+
+    post_id = models.BigIntegerField('id поста')
+    similar_id = models.BigIntegerField('id похожего поста')
+    score = models.FloatField('Косинусная близость')
+    rank = models.PositiveSmallIntegerField('Место')
+
+    class Meta:
+        unique_together = ['post_id', 'similar_id']
+        indexes = [
+            models.Index(fields=['post_id', 'rank'],
+                         name='posts_similar_post_rank_idx'),
+            models.Index(fields=['similar_id'],
+                         name='posts_similar_similar_idx'),
+        ]
+
+
+class TextSignature(models.Model):
+    """MinHash текста поста или комментария (``posts.duplicates``).
+    Хранится в основной базе и не удаляется вместе с записью."""
+
+    id = models.BigAutoField(primary_key=True)
+    model = models.CharField('Модель', max_length=50)
+    object_id = models.BigIntegerField('id объекта')
+    signature = models.BinaryField('Подпись')
+    created = models.DateTimeField('Дата', auto_now_add=True)
+
+    def __str__(self):
+        return f'{self.model}:{self.object_id}'
+
+    class Meta:
+        unique_together = ['model', 'object_id']
@@ -0,0 +1,269 @@
+"""«Горячая» лента: порядок по комментариям и охвату с затуханием.
+
+Вес поста в момент ``now`` —
+``((1 + подписчики) ** HOT_REACH_WEIGHT * e ** (t_поста / τ)
++ Σ HOT_COMMENT_WEIGHT * e ** (t_комментария / τ)) / e ** (now / τ)``,
+где ``τ = HOT_DECAY_SECONDS``: каждый комментарий добавляет веса, и
+весь вклад убывает в ``e`` раз за ``τ`` секунд. Делитель одинаков для
+всех постов и на порядок не влияет, поэтому в ``PostRank.score``
+хранится логарифм числителя. Он не стареет, и новый комментарий
+меняет его одним ``logaddexp`` без пересчёта остальных строк.
+
+Изменения берутся из журнала (``posts.changelog``) читателем
+``hot_rank`` задачей ``update_hot_ranks``, которая сама ставит себя в
+очередь раз в ``HOT_RANK_INTERVAL`` секунд. Скрытый модератором пост
+убирается из ``PostRank`` так же, как удалённый, и возвращается, когда
+его снова показывают. Страница ленты — один запрос по индексу
+``PostRank`` и выборка постов по id.
+"""
+import json
+import math
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Count
+from django.utils import timezone
+
+from . import sharding
+from .changelog import Consumer
+from .models import HIDDEN, ChangeLog, Comment, Follow, Post, PostRank
+
+CONSUMER = 'hot_rank'
+
+
+def logaddexp(a, b):
+    """``log(e ** a + e ** b)``; None — пустая сумма."""
+    if a is None:
+        return b
+    if b is None:
+        return a
+    high, low = max(a, b), min(a, b)
+    return high + math.log1p(math.exp(low - high))
+
+
+def _time_term(moment):
+    return moment.timestamp() / settings.HOT_DECAY_SECONDS
+
+
+def base_score(pub_date, followers):
+    return _time_term(pub_date) + settings.HOT_REACH_WEIGHT * math.log1p(
+        followers
+    )
+
+
+def comment_term(created):
+    return _time_term(created) + math.log(settings.HOT_COMMENT_WEIGHT)
+
+
+def _set_score(rank):
+    rank.score = logaddexp(rank.base, rank.activity)
+
+
+def _followers(author_ids):
+    counts = dict(
+        Follow.objects.filter(author_id__in=author_ids)
+        .values('author_id').annotate(total=Count('id'))
+        .values_list('author_id', 'total')
+    )
+    return {author_id: counts.get(author_id, 0) for author_id in author_ids}
+
+
+def _activity(post_ids):
+    by_db = defaultdict(list)
+    for post_id in post_ids:
+        by_db[sharding.db_for_id(post_id)].append(post_id)
+    activity = dict.fromkeys(post_ids)
+    for db, ids in by_db.items():
+        comments = Comment.objects.using(db).filter(
+            post_id__in=ids
+        ).values_list('post_id', 'created')
+        for post_id, created in comments:
+            activity[post_id] = logaddexp(
+                activity[post_id], comment_term(created)
+            )
+    return activity
+
+
+def _window_start():
+    return timezone.now() - timedelta(days=settings.HOT_WINDOW_DAYS)
+
+
+def rank_posts(posts):
+    """Строки ``PostRank`` для постов, посчитанные с нуля."""
+    posts = [post for post in posts if post.pub_date >= _window_start()]
+    followers = _followers({post.author_id for post in posts})
+    activity = _activity([post.pk for post in posts])
+    ranks = []
+    for post in posts:
+        rank = PostRank(
+            post_id=post.pk,
+            author_id=post.author_id,
+            group_id=post.group_id,
+            pub_date=post.pub_date,
+            base=base_score(post.pub_date, followers[post.author_id]),
+            activity=activity[post.pk],
+        )
+        _set_score(rank)
+        ranks.append(rank)
+    return ranks
+
+
+class _Batch:
+    """Изменения из пачки журнала, сгруппированные по постам."""
+
+    def __init__(self, entries):
+        self.created, self.deleted, self.recount = set(), set(), set()
+        self.shown = set()
+        self.authors = set()
+        self.groups = {}
+        self.comments = defaultdict(list)
+        for entry in entries:
+            self.read(entry, json.loads(entry.data))
+
+    def read(self, entry, data):
+        if entry.action == ChangeLog.MOVE:
+            return
+        if entry.model == 'posts.post':
+            if (entry.action == ChangeLog.DELETE
+                    or data.get('moderation') == HIDDEN):
+                self.deleted.add(entry.object_id)
+            elif entry.action == ChangeLog.CREATE:
+                self.created.add(entry.object_id)
+            else:
+                self.deleted.discard(entry.object_id)
+                self.shown.add(entry.object_id)
+            self.groups[entry.object_id] = data['group_id']
+        elif entry.model == 'posts.comment' and data['post_id']:
+            if entry.action == ChangeLog.CREATE:
+                self.comments[data['post_id']].append(
+                    comment_term(entry.created)
+                )
+            else:
+                self.recount.add(data['post_id'])
+        elif entry.model == 'posts.follow':
+            self.authors.add(data['author_id'])
+
+    def add_comments(self, ranks, changed):
+        """Новые комментарии добавляются к ``activity`` по одному;
+        после удаления комментария вклад пересчитывается целиком."""
+        for post_id, terms in self.comments.items():
+            rank = ranks.get(post_id)
+            if rank is None or post_id in self.recount:
+                continue
+            for term in terms:
+                rank.activity = logaddexp(rank.activity, term)
+            changed[post_id] = rank
+        recount = list(self.recount & ranks.keys())
+        for post_id, activity in _activity(recount).items():
+            ranks[post_id].activity = activity
+            changed[post_id] = ranks[post_id]
+
+    def move_groups(self, ranks, changed):
+        for post_id, group_id in self.groups.items():
+            if post_id in ranks and ranks[post_id].group_id != group_id:
+                ranks[post_id].group_id = group_id
+                changed[post_id] = ranks[post_id]
+
+    def update_reach(self, fresh, changed):
+        if not self.authors:
+            return
+        followers = _followers(self.authors)
+        for rank in PostRank.objects.filter(
+                author_id__in=self.authors).exclude(post_id__in=fresh):
+            rank = changed.get(rank.post_id, rank)
+            rank.base = base_score(rank.pub_date, followers[rank.author_id])
+            changed[rank.post_id] = rank
+
+
+def apply(entries):
+    """Обработчик пачки записей журнала. Посты, которых ещё нет в
+    таблице, считаются с нуля, остальные — по изменениям."""
+    batch = _Batch(entries)
+    ranks = PostRank.objects.in_bulk(
+        set(batch.comments) | batch.recount | set(batch.groups)
+    )
+    missing = (
+        batch.created | batch.shown | set(batch.comments)
+    ) - ranks.keys()
+    new = rank_posts(
+        sharding.posts_by_ids(list(missing - batch.deleted)).values()
+    )
+    PostRank.objects.bulk_create(new, ignore_conflicts=True)
+
+    changed = {}
+    batch.add_comments(ranks, changed)
+    batch.move_groups(ranks, changed)
+    batch.update_reach({rank.post_id for rank in new}, changed)
+    for rank in changed.values():
+        _set_score(rank)
+    PostRank.objects.bulk_update(
+        [rank for post_id, rank in changed.items()
+         if post_id not in batch.deleted],
+        ('group_id', 'base', 'activity', 'score'),
+    )
+    PostRank.objects.filter(post_id__in=batch.deleted).delete()
+
+
+def update():
+    """Применяет новые записи журналов всех шардов и убирает посты
+    старше ``HOT_WINDOW_DAYS``. Возвращает число записей журнала."""
+    processed = sum(
+        Consumer(CONSUMER, using=db).run(apply)
+        for db in sharding.shards()
+    )
+    PostRank.objects.filter(pub_date__lt=_window_start()).delete()
+    return processed
+
+
+def rebuild(batch_size=500):
+    """Пересчитывает таблицу с нуля и переносит читателя журнала в
+    конец: дальше достаточно ``update()``."""
+    PostRank.objects.all().delete()
+    for db in sharding.shards():
+        last = ChangeLog.objects.using(db).order_by('-seq').first()
+        Consumer(CONSUMER, using=db).rewind(last.seq if last else 0)
+        posts = Post.objects.using(db).for_list().filter(
+            pub_date__gte=_window_start()
+        ).order_by('pk')
+        last_pk = None
+        while True:
+            batch = posts if last_pk is None else posts.filter(
+                pk__gt=last_pk
+            )
+            batch = list(batch[:batch_size])
+            if not batch:
+                break
+            PostRank.objects.bulk_create(rank_posts(batch))
+            last_pk = batch[-1].pk
+    return PostRank.objects.count()
+
+
+class HotFeed:
+    """Горячая лента для ``Paginator``: срез читает id из ``PostRank``,
+    посты достаются из шардов по id."""
+
+    ordered = True
+
+    def __init__(self, ranks):
+        self.ranks = ranks.order_by('-score', '-post_id')
+
+    def count(self):
+        return self.ranks.count()
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, key):
+        if isinstance(key, int):
+            return self[key:key + 1][0]
+        ids = list(self.ranks.values_list('post_id', flat=True)[key])
+        posts = sharding.posts_by_ids(ids)
+        return [posts[post_id] for post_id in ids if post_id in posts]
+
+
+def hot_feed(group=None):
+    ranks = PostRank.objects.all()
+    if group is not None:
+        ranks = ranks.filter(group_id=group.pk)
+    return HotFeed(ranks)
@@ -0,0 +1,78 @@
+"""HTML текста постов и комментариев, готовый при записи.
+
+``text_html`` — экранированный текст с ``<br>`` вместо переводов
+строк, как давал фильтр ``linebreaksbr``; ``excerpt_html`` — то же для
+начала текста длиной до ``POST_EXCERPT_LENGTH`` символов. Шаблоны
+выводят их как есть, а ленты не читают полный ``text``. Хештеги
+становятся ссылками на страницы тегов.
+"""
+import re
+
+from django.conf import settings
+from django.template.defaultfilters import linebreaksbr
+from django.urls import reverse
+from django.utils.text import Truncator
+
+RENDERED_FIELDS = ('text_html', 'excerpt_html')
+
+# Перед ``#`` не буква и не ``&``, чтобы не задеть сущности ``&#39;``.
+TAG_RE = re.compile(r'(?<![\w&])#(\w{1,50})')
+
+
+def _tag_link(match):
+    return '<a href="{}">#{}</a>'.format(
+        reverse('posts:tag_posts', args=(match.group(1).lower(),)),
+        match.group(1),
+    )
+
+
+def render(text):
+    return TAG_RE.sub(_tag_link, linebreaksbr(text, autoescape=True))
+
+
+def render_fields(text):
+    return {
+        'text_html': render(text),
+        'excerpt_html': render(
+            Truncator(text).chars(settings.POST_EXCERPT_LENGTH)
+        ),
+    }
+
+
+def prepare_save(instance, save_kwargs):
+    """Перерисовывает HTML перед сохранением, если меняется ``text``."""
+    update_fields = save_kwargs.get('update_fields')
+    if update_fields is not None and 'text' not in update_fields:
+        return
+    for field, value in render_fields(instance.text).items():
+        setattr(instance, field, value)
+    if update_fields is not None:
+        save_kwargs['update_fields'] = set(update_fields).union(
+            RENDERED_FIELDS
+        )
+
+
+def backfill(model, using, batch_size=500, only_missing=True):
+    """Заполняет HTML у записей ``model`` в базе ``using`` пачками через
+    ``bulk_update``, без сигналов и журнала изменений. Годится и для
+    исторических моделей миграций. Возвращает число обновлённых."""
+    queryset = model._default_manager.using(using).order_by('pk')
+    if only_missing:
+        queryset = queryset.filter(text_html='')
+    updated = 0
+    last_pk = None
+    while True:
+        batch = queryset if last_pk is None else queryset.filter(
+            pk__gt=last_pk
+        )
+        rows = list(batch.only('pk', 'text')[:batch_size])
+        if not rows:
+            return updated
+        for row in rows:
+            for field, value in render_fields(row.text).items():
+                setattr(row, field, value)
+        model._default_manager.using(using).bulk_update(
+            rows, RENDERED_FIELDS
+        )
+        updated += len(rows)
+        last_pk = rows[-1].pk
@@ -0,0 +1,67 @@
+from django.db import DEFAULT_DB_ALIAS
+
+from . import sharding
+
+SHARDED_MODELS = ('posts.post', 'posts.comment')
+
+# Журнал пишется в базу изменённой строки, поэтому есть в каждой.
+EVERYWHERE_MODELS = ('posts.changelog', 'posts.changelogcheckpoint')
+
+
+def _is_sharded(model_or_instance):
+    return model_or_instance._meta.label_lower in SHARDED_MODELS
+
+
+class ShardRouter:
+    """Направляет посты и комментарии в шард автора.
+
+    Шард выбирается по подсказке ``instance``: для поста или комментария
+    — по его id или автору, для пользователя (``user.posts``) — по
+    самому пользователю. Запросы без подсказки должны явно указывать
+    базу через ``posts.sharding``.
+    """
+
+    def _db_for_instance(self, model, hints):
+        instance = hints.get('instance')
+        if _is_sharded(model):
+            if instance is None:
+                return None
+            if _is_sharded(instance):
+                if instance.pk is not None:
+                    return sharding.shard_for_id(instance.pk)
+                return sharding.shard_for_bucket(
+                    sharding.bucket_for_instance(instance)
+                )
+            if instance._meta.label_lower == 'auth.user':
+                return sharding.shard_for_author(instance.pk)
+            return None
+        if instance is not None and _is_sharded(instance):
+            return DEFAULT_DB_ALIAS
+        return None
+
+    def db_for_read(self, model, **hints):
+        if not sharding.enabled():
+            return None
+        return self._db_for_instance(model, hints)
+
+    def db_for_write(self, model, **hints):
+        if not sharding.enabled():
+            return None
+        return self._db_for_instance(model, hints)
+
+    def allow_relation(self, obj1, obj2, **hints):
+        if sharding.enabled() and (
+                _is_sharded(obj1) or _is_sharded(obj2)):
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if not sharding.enabled() or model_name is None:
+            return None
+        if f'{app_label}.{model_name}' in SHARDED_MODELS:
+            return db in sharding.shards()
+        if f'{app_label}.{model_name}' in EVERYWHERE_MODELS:
+            return db == DEFAULT_DB_ALIAS or db in sharding.shards()
+        if db != DEFAULT_DB_ALIAS and db in sharding.shards():
+            return False
+        return None
@@ -0,0 +1,209 @@
+"""Шардирование постов и комментариев по автору.
+
+Включается списком алиасов ``POST_SHARDS``. Автор попадает в один из
+``SHARD_BUCKETS`` бакетов (``author_id % SHARD_BUCKETS``), а бакет — в
+шард по таблице ``ShardBucket`` или, если записи нет, по остатку от
+деления. Номер бакета хранится в младших битах id поста и комментария,
+поэтому шард находится по одному id, без поиска по всем базам.
+
+Комментарии лежат в шарде автора поста, так что ``post_detail`` и
+``profile`` читают из одного шарда. Ленты (главная, группа, подписки)
+собираются из всех нужных шардов слиянием отсортированных выборок.
+"""
+import heapq
+import itertools
+import random
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from django.shortcuts import get_object_or_404
+
+BUCKET_BITS = 12
+SEQUENCE_BITS = 10
+SHARD_BUCKETS = 1 << BUCKET_BITS
+EPOCH_MS = 1640995200000
+
+_sequence = itertools.count(random.randrange(1 << SEQUENCE_BITS))
+_map_lock = threading.Lock()
+_map = {'loaded_at': 0.0, 'buckets': {}}
+
+
+def enabled():
+    return bool(settings.POST_SHARDS)
+
+
+def shards():
+    return list(settings.POST_SHARDS) or [DEFAULT_DB_ALIAS]
+
+
+def bucket_for_author(author_id):
+    return author_id % SHARD_BUCKETS
+
+
+def bucket_for_id(object_id):
+    return object_id & (SHARD_BUCKETS - 1)
+
+
+def _bucket_map():
+    """Таблица бакетов процесса, перечитывается раз в SHARD_MAP_TTL."""
+    from .models import ShardBucket
+
+    if time.monotonic() - _map['loaded_at'] > settings.SHARD_MAP_TTL:
+        with _map_lock:
+            _map['buckets'] = dict(
+                ShardBucket.objects.using(DEFAULT_DB_ALIAS)
+                .values_list('bucket', 'database')
+            )
+            _map['loaded_at'] = time.monotonic()
+    return _map['buckets']
+
+
+def reset_bucket_map():
+    _map['loaded_at'] = 0.0
+
+
+def shard_for_bucket(bucket):
+    databases = shards()
+    return _bucket_map().get(bucket, databases[bucket % len(databases)])
+
+
+def shard_for_author(author_id):
+    return shard_for_bucket(bucket_for_author(author_id))
+
+
+def shard_for_id(object_id):
+    return shard_for_bucket(bucket_for_id(object_id))
+
+
+def db_for_id(object_id):
+    """База объекта: шард, если шардинг включён, иначе основная."""
+    if not enabled():
+        return DEFAULT_DB_ALIAS
+    return shard_for_id(object_id)
+
+
+def bucket_for_instance(instance):
+    """Бакет поста — бакет автора, комментария — бакет поста."""
+    if getattr(instance, 'post_id', None) is not None:
+        return bucket_for_id(instance.post_id)
+    return bucket_for_author(instance.author_id)
+
+
+def new_id(bucket):
+    """id вида ``<мс с EPOCH_MS><счётчик><бакет>``."""
+    millis = int(time.time() * 1000) - EPOCH_MS
+    sequence = next(_sequence) & ((1 << SEQUENCE_BITS) - 1)
+    return (
+        (millis << (SEQUENCE_BITS + BUCKET_BITS))
+        | (sequence << BUCKET_BITS)
+        | bucket
+    )
+
+
+def prepare_insert(instance, save_kwargs):
+    """Назначает id новой записи и её шард до вставки.
+
+    База выбирается здесь, а не роутером, потому что ``Manager.create()``
+    не передаёт роутеру сам объект.
+    """
+    if enabled() and instance.pk is None:
+        bucket = bucket_for_instance(instance)
+        instance.pk = new_id(bucket)
+        save_kwargs['force_insert'] = True
+        save_kwargs['using'] = shard_for_bucket(bucket)
+
+
+class ShardedFeed:
+    """Лента из нескольких шардов для ``Paginator``.
+
+    Каждый шард отдаёт первые ``stop`` записей в порядке
+    ``-pub_date, -id``, выборки сливаются через ``heapq.merge``.
+    """
+
+    ordering = ('-pub_date', '-id')
+    ordered = True
+
+    def __init__(self, querysets):
+        self.querysets = [qs.order_by(*self.ordering) for qs in querysets]
+        self._count = None
+
+    def cache(self, timeout=None):
+        return ShardedFeed(qs.cache(timeout) for qs in self.querysets)
+
+    def count(self):
+        if self._count is None:
+            self._count = sum(qs.count() for qs in self.querysets)
+        return self._count
+
+    def __len__(self):
+        return self.count()
+
+    def __iter__(self):
+        return iter(self[:self.count()])
+
+    def __getitem__(self, key):
+        if isinstance(key, int):
+            return self[key:key + 1][0]
+        start = key.start or 0
+        stop = key.stop if key.stop is not None else self.count()
+        merged = heapq.merge(
+            *(list(qs[:stop]) for qs in self.querysets),
+            key=lambda post: (post.pub_date, post.pk),
+            reverse=True,
+        )
+        return list(itertools.islice(merged, start, stop))
+
+
+def feed(**filters):
+    """Посты по фильтру со всех шардов, без полного текста."""
+    from .models import Post
+
+    if not enabled():
+        return Post.objects.for_list().filter(**filters)
+    return ShardedFeed(
+        Post.objects.using(db).for_list().filter(**filters)
+        for db in shards()
+    )
+
+
+def authors_feed(author_ids):
+    """Посты авторов; опрашиваются только шарды этих авторов."""
+    from .models import Post
+
+    if not enabled():
+        return Post.objects.for_list().filter(author_id__in=author_ids)
+    by_shard = defaultdict(list)
+    for author_id in author_ids:
+        by_shard[shard_for_author(author_id)].append(author_id)
+    return ShardedFeed(
+        Post.objects.using(db).for_list().filter(author_id__in=ids)
+        for db, ids in by_shard.items()
+    )
+
+
+def posts_by_ids(post_ids):
+    """Словарь id → пост для лент; каждый шард опрашивается один раз."""
+    from .models import Post
+
+    if not enabled():
+        return Post.objects.for_list().in_bulk(post_ids)
+    by_shard = defaultdict(list)
+    for post_id in post_ids:
+        by_shard[shard_for_id(post_id)].append(post_id)
+    posts = {}
+    for db, ids in by_shard.items():
+        posts.update(Post.objects.using(db).for_list().in_bulk(ids))
+    return posts
+
+
+def get_post_or_404(post_id):
+    from .models import Post
+
+    if not enabled():
+        return get_object_or_404(Post, id=post_id)
+    return get_object_or_404(
+        Post.objects.using(shard_for_id(post_id)), id=post_id
+    )
@@ -0,0 +1,422 @@
+"""Похожие посты по TF-IDF.
+
+Слова текста (``\\w{3,}`` в нижнем регистре) хешируются в
+``SIMILAR_POSTS_FEATURES`` признаков: словарь не хранится, и новые
+посты векторизуются без пересборки. Вес признака —
+``(1 + log tf) * idf``, строки нормированы, так что близость — скалярное
+произведение.
+
+Команда ``build_similar_posts`` (или задача ``update_similar_posts``)
+читает тексты из шардов пачками по ``SIMILAR_POSTS_CHUNK_SIZE``, пишет
+матрицу в CSR и её транспонированную копию в массивы ``.npy`` нового
+каталога ``SIMILAR_POSTS_DIR`` (см. ``core.versioned``) и заполняет
+``SimilarPost`` первыми ``SIMILAR_POSTS_COUNT`` соседями каждого поста.
+Соседи ищутся блоками строк: произведения со списками постов по
+признакам собираются одним ``take`` и суммируются по парам; в блоке не
+больше ``SIMILAR_POSTS_BLOCK_PAIRS`` произведений. Признаки, которые
+есть больше чем в доле ``SIMILAR_POSTS_MAX_DF`` постов, не учитываются.
+
+Между сборками новые посты добавляет читатель журнала ``similar_posts``:
+они сравниваются с открытой через ``mmap`` матрицей и друг с другом и
+попадают в списки старых постов, если ближе их последнего соседа.
+"""
+import os
+import re
+import zlib
+from collections import defaultdict
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+
+from core import versioned
+
+from . import sharding
+from .changelog import Consumer
+from .models import ChangeLog, Post, SimilarPost
+
+TOKEN_RE = re.compile(r'\w{3,}')
+ARRAYS = (
+    'post_ids', 'indptr', 'indices', 'data',
+    'cindptr', 'cdocs', 'cdata', 'idf',
+)
+CONSUMER = 'similar_posts'
+
+
+def features(text):
+    """Номера признаков текста и частоты слов в них."""
+    size = settings.SIMILAR_POSTS_FEATURES
+    tokens = TOKEN_RE.findall(text.lower())
+    hashed = np.fromiter(
+        (zlib.crc32(token.encode()) % size for token in tokens),
+        dtype=np.int32, count=len(tokens),
+    )
+    return np.unique(hashed, return_counts=True)
+
+
+def vectorize(texts):
+    """Частоты признаков текстов в CSR без пустых строк.
+
+    Возвращает номера непустых текстов, ``indptr``, ``indices`` и
+    частоты.
+    """
+    kept, lengths, indices, counts = [], [], [], []
+    for number, text in enumerate(texts):
+        text_features, text_counts = features(text)
+        if len(text_features):
+            kept.append(number)
+            lengths.append(len(text_features))
+            indices.append(text_features)
+            counts.append(text_counts)
+    indptr = np.zeros(len(kept) + 1, dtype=np.int64)
+    np.cumsum(np.asarray(lengths, dtype=np.int64), out=indptr[1:])
+    if not kept:
+        return (np.empty(0, np.int64), indptr, np.empty(0, np.int32),
+                np.empty(0, np.float32))
+    return (
+        np.asarray(kept, dtype=np.int64), indptr,
+        np.concatenate(indices), np.concatenate(counts).astype(np.float32),
+    )
+
+
+def idf_from(df, documents):
+    return (np.log((1 + documents) / (1 + df)) + 1).astype(np.float32)
+
+
+def top(rows, docs, scores, limit, min_score):
+    """Первые ``limit`` документов каждой строки по убыванию близости.
+
+    Возвращает строки, документы, близости и места с нуля.
+    """
+    keep = scores >= min_score
+    rows, docs, scores = rows[keep], docs[keep], scores[keep]
+    order = np.lexsort((docs, -scores, rows))
+    rows, docs, scores = rows[order], docs[order], scores[order]
+    places = np.arange(len(rows)) - np.searchsorted(rows, rows)
+    keep = places < limit
+    return rows[keep], docs[keep], scores[keep], places[keep]
+
+
+class TfidfMatrix:
+    """Нормированные строки TF-IDF в CSR (``indptr``, ``indices``,
+    ``data``) и по столбцам: посты с признаком ``j`` —
+    ``cdocs[cindptr[j]:cindptr[j + 1]]``, веса — в ``cdata``."""
+
+    def __init__(self, post_ids, indptr, indices, data,
+                 cindptr, cdocs, cdata, idf):
+        self.post_ids = post_ids
+        self.indptr = indptr
+        self.indices = indices
+        self.data = data
+        self.cindptr = cindptr
+        self.cdocs = cdocs
+        self.cdata = cdata
+        self.idf = idf
+
+    @classmethod
+    def from_counts(cls, post_ids, indptr, indices, counts, idf):
+        weights = (1 + np.log(counts)) * idf[indices]
+        if len(weights):
+            norms = np.sqrt(np.add.reduceat(weights * weights, indptr[:-1]))
+            weights /= np.repeat(norms, np.diff(indptr))
+        data = weights.astype(np.float32)
+        rows = np.repeat(
+            np.arange(len(post_ids), dtype=np.int32), np.diff(indptr)
+        )
+        order = np.argsort(indices, kind='stable')
+        cindptr = np.zeros(len(idf) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(indices, minlength=len(idf)), out=cindptr[1:])
+        return cls(
+            np.asarray(post_ids, dtype=np.int64), indptr, indices, data,
+            cindptr, rows[order], data[order], idf,
+        )
+
+    @classmethod
+    def load(cls, directory):
+        return cls(*(
+            np.load(os.path.join(directory, f'{name}.npy'), mmap_mode='r')
+            for name in ARRAYS
+        ))
+
+    def save(self, directory):
+        for name in ARRAYS:
+            np.save(os.path.join(directory, f'{name}.npy'),
+                    getattr(self, name))
+
+    @property
+    def documents(self):
+        return len(self.post_ids)
+
+    def rows(self, low=0, high=None):
+        """Номера строк, признаки и веса ненулевых элементов строк
+        ``low:high``."""
+        high = self.documents if high is None else high
+        start, end = self.indptr[low], self.indptr[high]
+        rows = np.repeat(
+            np.arange(low, high), np.diff(self.indptr[low:high + 1])
+        )
+        return rows, self.indices[start:end], self.data[start:end]
+
+    def allowed(self, min_df=0):
+        """Признаки, по которым ищутся соседи."""
+        df = np.diff(self.cindptr)
+        return (df >= min_df) & (
+            df <= max(1, settings.SIMILAR_POSTS_MAX_DF * self.documents)
+        )
+
+    def dot(self, rows, features, values, allowed):
+        """Близости строк запроса, заданных ненулевыми элементами, к
+        постам матрицы: пары (строка, номер поста) и суммы.
+
+        Списки постов всех признаков склеиваются одним ``take``:
+        индекс — начало списка признака плюс смещение внутри него.
+        """
+        keep = allowed[features]
+        rows, features, values = rows[keep], features[keep], values[keep]
+        starts = self.cindptr[features]
+        lengths = self.cindptr[features + 1] - starts
+        ends = np.cumsum(lengths)
+        total = int(ends[-1]) if len(ends) else 0
+        if not total:
+            empty = np.empty(0, np.int64)
+            return empty, empty, np.empty(0)
+        offsets = np.repeat(starts - (ends - lengths), lengths)
+        offsets += np.arange(total)
+        keys = np.repeat(rows.astype(np.int64), lengths) * self.documents
+        keys += self.cdocs.take(offsets)
+        keys, pairs = np.unique(keys, return_inverse=True)
+        scores = np.bincount(
+            pairs.ravel(),
+            weights=np.repeat(values, lengths) * self.cdata.take(offsets),
+        )
+        return keys // self.documents, keys % self.documents, scores
+
+    def blocks(self, allowed):
+        """Границы блоков строк по ``SIMILAR_POSTS_BLOCK_PAIRS``
+        произведений в каждом."""
+        if not self.documents:
+            return
+        df = np.diff(self.cindptr)
+        cost = np.where(allowed[self.indices], df[self.indices], 0)
+        bound = np.cumsum(np.add.reduceat(cost, self.indptr[:-1]))
+        low = 0
+        while low < self.documents:
+            limit = (bound[low - 1] if low else 0) + (
+                settings.SIMILAR_POSTS_BLOCK_PAIRS
+            )
+            high = max(low + 1, int(np.searchsorted(bound, limit, 'right')))
+            yield low, high
+            low = high
+
+    def neighbours(self, limit, min_score):
+        """Соседи всех постов по блокам: id постов, id соседей,
+        близости и места."""
+        allowed = self.allowed(min_df=2)
+        for low, high in self.blocks(allowed):
+            rows, docs, scores = self.dot(*self.rows(low, high), allowed)
+            other = rows != docs
+            rows, docs, scores, places = top(
+                rows[other], docs[other], scores[other], limit, min_score
+            )
+            yield (self.post_ids[rows], self.post_ids[docs], scores, places)
+
+
+def _chunks(db):
+    posts = Post.objects.using(db).order_by('pk').values_list('pk', 'text')
+    last_pk = 0
+    while True:
+        chunk = list(posts.filter(pk__gt=last_pk)[
+            :settings.SIMILAR_POSTS_CHUNK_SIZE
+        ])
+        if not chunk:
+            return
+        yield chunk
+        last_pk = chunk[-1][0]
+
+
+def build():
+    """Матрица по всем постам всех шардов."""
+    ids, lengths, indices, counts = [], [], [], []
+    for db in sharding.shards():
+        for chunk in _chunks(db):
+            kept, indptr, chunk_indices, chunk_counts = vectorize(
+                [text for _, text in chunk]
+            )
+            ids.append(np.array([chunk[number][0] for number in kept],
+                                dtype=np.int64))
+            lengths.append(np.diff(indptr))
+            indices.append(chunk_indices)
+            counts.append(chunk_counts)
+    post_ids = np.concatenate(ids) if ids else np.empty(0, np.int64)
+    indptr = np.zeros(len(post_ids) + 1, dtype=np.int64)
+    indices = np.concatenate(indices) if ids else np.empty(0, np.int32)
+    if ids:
+        np.cumsum(np.concatenate(lengths), out=indptr[1:])
+    df = np.bincount(indices, minlength=settings.SIMILAR_POSTS_FEATURES)
+    return TfidfMatrix.from_counts(
+        post_ids, indptr, indices,
+        np.concatenate(counts) if ids else np.empty(0, np.float32),
+        idf_from(df, len(post_ids)),
+    )
+
+
+def _rows(post_ids, similar_ids, scores, places):
+    return [
+        SimilarPost(post_id=post_id, similar_id=similar_id,
+                    score=score, rank=place)
+        for post_id, similar_id, score, place in zip(
+            post_ids.tolist(), similar_ids.tolist(), scores.tolist(),
+            places.tolist(),
+        )
+    ]
+
+
+def rebuild(root=None):
+    """Собирает матрицу, публикует её и перезаполняет ``SimilarPost``.
+    Читатель журнала переносится в конец: посты, созданные во время
+    сборки, он добавит ещё раз, это безвредно."""
+    for db in sharding.shards():
+        last = ChangeLog.objects.using(db).order_by('-seq').first()
+        Consumer(CONSUMER, using=db).rewind(last.seq if last else 0)
+    matrix = build()
+    versioned.publish(matrix.save, root or settings.SIMILAR_POSTS_DIR)
+    with transaction.atomic():
+        SimilarPost.objects.all().delete()
+        for block in matrix.neighbours(
+                settings.SIMILAR_POSTS_COUNT,
+                settings.SIMILAR_POSTS_MIN_SCORE):
+            SimilarPost.objects.bulk_create(_rows(*block), batch_size=1000)
+    return matrix
+
+
+_current = versioned.Current(
+    'SIMILAR_POSTS_DIR', 'SIMILAR_POSTS_CHECK_INTERVAL', TfidfMatrix.load
+)
+current = _current.get
+reset = _current.reset
+
+
+def _texts(post_ids):
+    by_db = defaultdict(list)
+    for post_id in post_ids:
+        by_db[sharding.db_for_id(post_id)].append(post_id)
+    texts = {}
+    for db, ids in by_db.items():
+        texts.update(Post.objects.using(db).filter(
+            pk__in=ids
+        ).values_list('pk', 'text'))
+    return texts
+
+
+def _replace(lists):
+    """Перезаписывает списки соседей: id поста → [(близость, id)]."""
+    SimilarPost.objects.filter(post_id__in=lists).delete()
+    SimilarPost.objects.bulk_create([
+        SimilarPost(post_id=post_id, similar_id=similar_id,
+                    score=score, rank=place)
+        for post_id, neighbours in lists.items()
+        for place, (score, similar_id) in enumerate(neighbours)
+    ])
+
+
+def _merge(candidates, limit):
+    """Добавляет новых соседей в списки старых постов, если они ближе
+    последнего соседа или список не полон."""
+    lists = defaultdict(dict)
+    for row in SimilarPost.objects.filter(post_id__in=candidates):
+        lists[row.post_id][row.similar_id] = row.score
+    changed = {}
+    for post_id, neighbours in candidates.items():
+        current_list = lists[post_id]
+        worst = min(current_list.values()) if current_list else 0
+        fresh = {
+            similar_id: score for similar_id, score in neighbours
+            if len(current_list) < limit or score > worst
+        }
+        if fresh:
+            current_list.update(fresh)
+            changed[post_id] = sorted(
+                ((score, similar_id)
+                 for similar_id, score in current_list.items()),
+                key=lambda pair: (-pair[0], pair[1]),
+            )[:limit]
+    _replace(changed)
+
+
+def add_posts(matrix, texts):
+    """Считает соседей новых постов и дописывает их в списки старых."""
+    limit = settings.SIMILAR_POSTS_COUNT
+    ids = list(texts)
+    kept, indptr, indices, counts = vectorize([texts[pk] for pk in ids])
+    new = TfidfMatrix.from_counts(
+        np.asarray(ids, dtype=np.int64)[kept], indptr, indices, counts,
+        matrix.idf,
+    )
+    query = new.rows()
+    rows, docs, scores = matrix.dot(*query, matrix.allowed())
+    similar = matrix.post_ids[docs]
+    own_rows, own_docs, own_scores = new.dot(*query, new.allowed())
+    rows = np.concatenate((rows, own_rows))
+    similar = np.concatenate((similar, new.post_ids[own_docs]))
+    scores = np.concatenate((scores, own_scores))
+    other = similar != new.post_ids[rows]
+    rows, similar, scores, places = top(
+        rows[other], similar[other], scores[other], limit,
+        settings.SIMILAR_POSTS_MIN_SCORE,
+    )
+    post_ids = new.post_ids[rows]
+    SimilarPost.objects.filter(post_id__in=new.post_ids.tolist()).delete()
+    SimilarPost.objects.bulk_create(
+        _rows(post_ids, similar, scores, places)
+    )
+    fresh = set(new.post_ids.tolist())
+    candidates = defaultdict(list)
+    for post_id, similar_id, score in zip(
+            post_ids.tolist(), similar.tolist(), scores.tolist()):
+        if similar_id not in fresh:
+            candidates[similar_id].append((post_id, score))
+    _merge(candidates, limit)
+
+
+def apply(entries):
+    """Обработчик пачки журнала: новые и изменённые посты получают
+    соседей, удалённые пропадают из всех списков."""
+    changed, deleted = set(), set()
+    for entry in entries:
+        if entry.model != 'posts.post' or entry.action == ChangeLog.MOVE:
+            continue
+        if entry.action == ChangeLog.DELETE:
+            deleted.add(entry.object_id)
+        else:
+            changed.add(entry.object_id)
+    if deleted:
+        SimilarPost.objects.filter(
+            Q(post_id__in=deleted) | Q(similar_id__in=deleted)
+        ).delete()
+    texts = _texts(changed - deleted)
+    if texts:
+        add_posts(current(), texts)
+
+
+def update():
+    """Применяет новые записи журналов, если матрица уже собрана.
+    Возвращает число записей журнала."""
+    if current() is None:
+        return 0
+    return sum(
+        Consumer(CONSUMER, using=db).run(apply)
+        for db in sharding.shards()
+    )
+
+
+def similar_posts(post, limit=None):
+    """Похожие посты для страницы поста: один запрос по индексу
+    ``SimilarPost`` и выборка постов по id."""
+    ids = list(SimilarPost.objects.filter(post_id=post.pk).order_by(
+        'rank'
+    ).values_list('similar_id', flat=True)[
+        :limit or settings.SIMILAR_POSTS_COUNT
+    ])
+    posts = sharding.posts_by_ids(ids)
+    return [posts[post_id] for post_id in ids if post_id in posts]
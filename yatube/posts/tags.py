@@ -0,0 +1,169 @@
+"""Хештеги постов: разбор текста, страница тега и популярные теги.
+
+Теги из текста раскладываются в ``Tag``/``PostTag`` при создании и
+правке поста. Страница тега читает ``PostTag`` по индексу
+``(tag, pub_date, post_id)`` с курсором вместо номера страницы, так
+что глубина листания не влияет на стоимость запроса; сами посты
+достаются по id из их шардов.
+
+Популярность считается по часовым корзинам ``TagBucket``: добавление и
+удаление связи меняет счётчик одной корзины, а окно за последние
+``TRENDING_WINDOW_HOURS`` часов — сумма не более чем стольких корзин
+на тег. Корзины старше окна удаляются при пересчёте.
+"""
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, IntegrityError, transaction
+from django.db.models import F, Q, Sum
+from django.utils import timezone
+
+from . import sharding
+from .models import PostTag, Tag, TagBucket
+from .rendering import TAG_RE
+
+CURSOR_SEP = '_'
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+MAX_ID = 2 ** 63 - 1
+
+
+def parse(text):
+    """Имена тегов в порядке появления, без повторов."""
+    names = dict.fromkeys(match.lower() for match in TAG_RE.findall(text))
+    return list(names)[:settings.TAG_MAX_PER_POST]
+
+
+def _hour(moment):
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+def _bump_bucket(tag_id, hour, delta):
+    updated = TagBucket.objects.filter(tag_id=tag_id, hour=hour).update(
+        count=F('count') + delta
+    )
+    if updated:
+        return
+    try:
+        with transaction.atomic(using=DEFAULT_DB_ALIAS):
+            TagBucket.objects.create(tag_id=tag_id, hour=hour, count=delta)
+    except IntegrityError:
+        TagBucket.objects.filter(tag_id=tag_id, hour=hour).update(
+            count=F('count') + delta
+        )
+
+
+def _get_tags(names):
+    Tag.objects.bulk_create(
+        [Tag(name=name) for name in names], ignore_conflicts=True
+    )
+    return dict(
+        Tag.objects.filter(name__in=names).values_list('name', 'pk')
+    )
+
+
+def update_post_tags(post):
+    """Приводит связи поста с тегами к тегам его текста."""
+    names = set(parse(post.text))
+    with transaction.atomic(using=DEFAULT_DB_ALIAS):
+        current = dict(
+            PostTag.objects.filter(post_id=post.pk)
+            .values_list('tag__name', 'tag_id')
+        )
+        stale = [current[name] for name in current.keys() - names]
+        if stale:
+            _unlink(post.pk, stale)
+        added = names - current.keys()
+        if not added:
+            return
+        tag_ids = _get_tags(added)
+        PostTag.objects.bulk_create(
+            PostTag(tag_id=tag_id, post_id=post.pk, pub_date=post.pub_date)
+            for tag_id in tag_ids.values()
+        )
+        for tag_id in tag_ids.values():
+            _bump_bucket(tag_id, _hour(post.pub_date), 1)
+
+
+def _unlink(post_id, tag_ids):
+    links = PostTag.objects.filter(post_id=post_id, tag_id__in=tag_ids)
+    for tag_id, pub_date in links.values_list('tag_id', 'pub_date'):
+        _bump_bucket(tag_id, _hour(pub_date), -1)
+    links.delete()
+
+
+def on_post_delete(sender, instance, **kwargs):
+    with transaction.atomic(using=DEFAULT_DB_ALIAS):
+        _unlink(instance.pk, PostTag.objects.filter(
+            post_id=instance.pk
+        ).values_list('tag_id', flat=True))
+
+
+def format_cursor(link):
+    micros = (link.pub_date - EPOCH) // timedelta(microseconds=1)
+    return f'{micros}{CURSOR_SEP}{link.post_id}'
+
+
+def parse_cursor(value):
+    """Дата и id из курсора; None, если курсор испорчен или выходит за
+    пределы дат и целых SQLite."""
+    try:
+        micros, post_id = (int(part) for part in value.split(CURSOR_SEP))
+        pub_date = EPOCH + timedelta(microseconds=micros)
+    except (ValueError, OverflowError):
+        return None
+    if not 0 <= post_id <= MAX_ID:
+        return None
+    return pub_date, post_id
+
+
+def tag_page(tag, cursor=None, limit=None):
+    """Посты тега после курсора и курсор следующей страницы (или None).
+    """
+    limit = limit or settings.POST_LIMIT
+    links = PostTag.objects.filter(tag=tag).order_by('-pub_date', '-post_id')
+    if cursor is not None:
+        pub_date, post_id = cursor
+        links = links.filter(
+            Q(pub_date__lt=pub_date) | Q(pub_date=pub_date,
+                                         post_id__lt=post_id)
+        )
+    links = list(links.only('post_id', 'pub_date')[:limit + 1])
+    next_cursor = format_cursor(links[limit - 1]) if (
+        len(links) > limit) else None
+    links = links[:limit]
+    posts = sharding.posts_by_ids([link.post_id for link in links])
+    return [
+        posts[link.post_id] for link in links if link.post_id in posts
+    ], next_cursor
+
+
+def trending(hours=None, limit=None):
+    """Пары (тег, число постов) за последние ``hours`` часов; результат
+    кешируется на ``TRENDING_CACHE_SECONDS``. Корзины хранятся только
+    за ``TRENDING_WINDOW_HOURS``, окно длиннее не бывает."""
+    hours = min(
+        hours or settings.TRENDING_WINDOW_HOURS,
+        settings.TRENDING_WINDOW_HOURS,
+    )
+    limit = limit or settings.TRENDING_LIMIT
+    key = f'posts:tags:trending:{hours}:{limit}'
+    result = cache.get(key)
+    if result is None:
+        since = _hour(timezone.now()) - timedelta(hours=hours - 1)
+        result = [
+            (row['tag__name'], row['total'])
+            for row in TagBucket.objects.filter(hour__gte=since)
+            .values('tag__name').annotate(total=Sum('count'))
+            .filter(total__gt=0).order_by('-total', 'tag__name')[:limit]
+        ]
+        cache.set(key, result, settings.TRENDING_CACHE_SECONDS)
+        prune(settings.TRENDING_WINDOW_HOURS)
+    return result
+
+
+def prune(hours):
+    TagBucket.objects.filter(
+        Q(hour__lte=_hour(timezone.now()) - timedelta(hours=hours))
+        | Q(count__lte=0)
+    ).delete()
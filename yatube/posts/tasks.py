@@ -0,0 +1,69 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+from sorl.thumbnail import get_thumbnail
+
+from jobs.models import Job
+from jobs.queue import task
+
+from . import duplicates, graph, ranking, sharding, similar
+from .models import Post
+
+THUMBNAILS = (('1150x680', {'crop': 'center'}),)
+
+
+@task(priority=10)
+def make_thumbnails(post_id):
+    """Миниатюры картинки поста, чтобы их не создавал первый запрос
+    страницы."""
+    posts = Post.objects.all()
+    if sharding.enabled():
+        posts = posts.using(sharding.shard_for_id(post_id))
+    post = posts.filter(pk=post_id).first()
+    if post is None or not post.image:
+        return
+    for geometry, options in THUMBNAILS:
+        get_thumbnail(post.image, geometry, **options)
+
+
+def reschedule(periodic, seconds):
+    """Ставит следующий запуск периодической задачи, если его ещё нет
+    в очереди."""
+    if not Job.objects.filter(
+            name=periodic.name, status=Job.QUEUED).exists():
+        periodic.delay(run_at=timezone.now() + timedelta(seconds=seconds))
+
+
+@task(priority=-10)
+def update_hot_ranks(reschedule_next=True):
+    """Обновляет горячую ленту раз в ``HOT_RANK_INTERVAL``."""
+    ranking.update()
+    if reschedule_next:
+        reschedule(update_hot_ranks, settings.HOT_RANK_INTERVAL)
+
+
+@task(priority=-10)
+def rebuild_follow_graph(reschedule_next=True):
+    """Пересобирает граф подписок раз в ``FOLLOW_GRAPH_INTERVAL``."""
+    graph.rebuild()
+    if reschedule_next:
+        reschedule(rebuild_follow_graph, settings.FOLLOW_GRAPH_INTERVAL)
+
+
+@task(priority=-10)
+def update_similar_posts(reschedule_next=True):
+    """Добавляет похожие посты для новых постов раз в
+    ``SIMILAR_POSTS_INTERVAL``."""
+    similar.update()
+    if reschedule_next:
+        reschedule(update_similar_posts, settings.SIMILAR_POSTS_INTERVAL)
+
+
+@task(priority=-10)
+def rebuild_text_index(reschedule_next=True):
+    """Пересобирает индекс почти дублей раз в
+    ``DUPLICATE_INDEX_INTERVAL``."""
+    duplicates.rebuild()
+    if reschedule_next:
+        reschedule(rebuild_text_index, settings.DUPLICATE_INDEX_INTERVAL)
@@ -0,0 +1,104 @@
+import json
+
+from django.db import transaction
+from django.test import TestCase, TransactionTestCase
+
+from ..changelog import Consumer
+from ..models import (
+    ChangeLog, Comment, Follow, Group, Post, PostRank, User,
+)
+
+
+class ChangeLogTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='SkaDi')
+        self.other = User.objects.create_user(username='other')
+
+    def test_mutations_are_logged_in_order(self):
+        group = Group.objects.create(title='Г', slug='g', description='')
+        post = Post.objects.create(text='Пост', author=self.user, group=group)
+        Comment.objects.create(post=post, author=self.other, text='К')
+        Follow.objects.create(user=self.other, author=self.user)
+        post.text = 'Новый'
+        post.save()
+        post.delete()
+        entries = list(ChangeLog.objects.all())
+        self.assertEqual(
+            [(entry.model, entry.action) for entry in entries],
+            [
+                ('posts.group', 'create'),
+                ('posts.post', 'create'),
+                ('posts.comment', 'create'),
+                ('posts.follow', 'create'),
+                ('posts.post', 'update'),
+                ('posts.post', 'delete'),
+            ],
+        )
+        seqs = [entry.seq for entry in entries]
+        self.assertEqual(seqs, sorted(set(seqs)))
+        self.assertEqual(
+            json.loads(entries[1].data),
+            {'author_id': self.user.pk, 'group_id': group.pk,
+             'moderation': 'visible'},
+        )
+
+    def test_rebalance_is_not_logged_as_delete(self):
+        """Перенос бакета не пишет ``DELETE``, а ``MOVE`` читатели не
+        принимают за удаление."""
+        from .. import ranking, sharding
+        from ..changelog import record
+        from ..management.commands.rebalance_shards import Command
+
+        post = Post.objects.create(text='Пост', author=self.user)
+        Comment.objects.create(post=post, author=self.other, text='К')
+        ranking.update()
+        last = ChangeLog.objects.latest('seq').seq
+        command = Command()
+        command.copy(
+            sharding.bucket_for_id(post.pk), 'default', 'default',
+            cutover=command.last_seq('default'),
+        )
+        record(post, ChangeLog.MOVE, 'default')
+        self.assertEqual(
+            list(ChangeLog.objects.filter(seq__gt=last).values_list(
+                'action', flat=True)),
+            [ChangeLog.MOVE],
+        )
+        ranking.update()
+        self.assertTrue(PostRank.objects.filter(post_id=post.pk).exists())
+
+    def test_consumer_tails_in_batches_with_checkpoint(self):
+        for number in range(5):
+            Post.objects.create(text=f'Пост {number}', author=self.user)
+        seen = []
+        consumer = Consumer('test', batch_size=2)
+        self.assertEqual(consumer.run(seen.append, max_batches=2), 4)
+        self.assertEqual([len(batch) for batch in seen], [2, 2])
+        Post.objects.create(text='Ещё', author=self.user)
+        self.assertEqual(Consumer('test', batch_size=2).run(seen.append), 2)
+        self.assertEqual(consumer.position(), ChangeLog.objects.last().seq)
+
+    def test_failed_batch_is_read_again(self):
+        Post.objects.create(text='Пост', author=self.user)
+        consumer = Consumer('test')
+
+        def fail(entries):
+            raise RuntimeError
+
+        with self.assertRaises(RuntimeError):
+            consumer.run(fail)
+        self.assertEqual(consumer.position(), 0)
+        consumer.rewind()
+        self.assertEqual(consumer.run(lambda entries: None), 1)
+
+
+class ChangeLogTransactionTests(TransactionTestCase):
+    def test_log_is_rolled_back_with_the_change(self):
+        user = User.objects.create_user(username='SkaDi')
+        try:
+            with transaction.atomic():
+                Post.objects.create(text='Пост', author=user)
+                raise ValueError
+        except ValueError:
+            pass
+        self.assertFalse(ChangeLog.objects.exists())
@@ -0,0 +1,149 @@
+import shutil
+import tempfile
+
+import numpy as np
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from .. import duplicates
+from ..models import (
+    FLAGGED, HIDDEN, VISIBLE, Comment, Post, TextSignature, User,
+)
+
+SPAM = (
+    'Только сегодня: дешёвые часы с доставкой по всей стране, '
+    'пишите в личные сообщения и получите скидку'
+)
+SPAM_VARIANT = (
+    'Только сегодня!!! Дешёвые часы с доставкой по всей стране, '
+    'пишите в личные сообщения и получите скидку 50%'
+)
+HONEST = (
+    'Сегодня гуляли в парке у реки, видели цаплю и двух уток, '
+    'потом пили чай на веранде'
+)
+
+
+class DuplicatesTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        settings = override_settings(
+            DUPLICATE_INDEX_DIR=root, DUPLICATE_INDEX_CHECK_INTERVAL=0
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+        duplicates.reset()
+        self.addCleanup(duplicates.reset)
+        self.user = User.objects.create_user(username='bot')
+        self.reader = User.objects.create_user(username='reader')
+        self.client.force_login(self.user)
+
+    def create_post(self, text):
+        return self.client.post(reverse('posts:post_create'), {'text': text})
+
+    def test_minhash_estimates_jaccard(self):
+        first, second = (
+            set(duplicates.shingles(text).tolist())
+            for text in (SPAM, SPAM_VARIANT)
+        )
+        jaccard = len(first & second) / len(first | second)
+        with self.settings(DUPLICATE_PERMUTATIONS=1024, DUPLICATE_BANDS=256):
+            estimate = np.mean(
+                duplicates.minhash(SPAM) == duplicates.minhash(SPAM_VARIANT)
+            )
+        self.assertAlmostEqual(estimate, jaccard, delta=0.05)
+        self.assertIsNone(duplicates.minhash('Спасибо!'))
+
+    def test_flag_near_duplicates(self):
+        self.create_post(SPAM)
+        self.create_post(SPAM_VARIANT)
+        self.create_post(HONEST)
+        self.assertEqual(
+            dict(Post.objects.values_list('text', 'moderation')),
+            {SPAM: VISIBLE, SPAM_VARIANT: FLAGGED, HONEST: VISIBLE},
+        )
+        post = Post.objects.get(text=HONEST)
+        self.client.post(
+            reverse('posts:add_comment', args=(post.pk,)), {'text': SPAM}
+        )
+        self.assertEqual(Comment.objects.get().moderation, FLAGGED)
+
+    def test_index_finds_duplicates(self):
+        self.create_post(SPAM)
+        self.create_post(HONEST)
+        index = duplicates.rebuild()
+        self.assertEqual(len(index.ids), 2)
+        duplicates.reset()
+        signature = duplicates.minhash(SPAM_VARIANT)
+        self.assertEqual(
+            duplicates.current().matches(
+                signature, duplicates.band_keys(signature[None])[0]
+            ),
+            [index.ids[0]],
+        )
+        self.create_post(SPAM_VARIANT)
+        self.assertEqual(
+            Post.objects.get(text=SPAM_VARIANT).moderation, FLAGGED
+        )
+
+    def test_edit_into_spam(self):
+        self.create_post(SPAM)
+        self.create_post(HONEST)
+        post = Post.objects.get(text=HONEST)
+        url = reverse('posts:post_edit', args=(post.pk,))
+        self.client.post(url, {'text': HONEST + ' и ещё немного'})
+        post.refresh_from_db()
+        self.assertEqual(post.moderation, VISIBLE)
+        self.client.post(url, {'text': SPAM_VARIANT})
+        post.refresh_from_db()
+        self.assertEqual(post.moderation, FLAGGED)
+        self.assertEqual(
+            bytes(TextSignature.objects.get(object_id=post.pk).signature),
+            duplicates.minhash(SPAM_VARIANT).astype('<u4').tobytes(),
+        )
+        with self.settings(DUPLICATE_ACTION=duplicates.REJECT):
+            response = self.client.post(url, {'text': SPAM + '!'})
+        self.assertFormError(response, 'form', 'text', duplicates.MESSAGE)
+
+    @override_settings(DUPLICATE_ACTION=duplicates.REJECT)
+    def test_reject(self):
+        self.create_post(SPAM)
+        response = self.create_post(SPAM_VARIANT)
+        self.assertFormError(response, 'form', 'text', duplicates.MESSAGE)
+        self.assertEqual(Post.objects.count(), 1)
+
+    @override_settings(DUPLICATE_ACTION=duplicates.HIDE)
+    def test_hide(self):
+        self.create_post(SPAM)
+        self.create_post(SPAM_VARIANT)
+        hidden = Post.objects.get(text=SPAM_VARIANT)
+        self.assertEqual(hidden.moderation, HIDDEN)
+        url = reverse('posts:post_detail', args=(hidden.pk,))
+        self.assertEqual(self.client.get(url).status_code, 200)
+        self.client.force_login(self.reader)
+        self.assertEqual(self.client.get(url).status_code, 404)
+        response = self.client.get(reverse('posts:profile', args=('bot',)))
+        self.assertEqual(
+            [post.text for post in response.context['page_obj']], [SPAM]
+        )
+
+    @override_settings(DUPLICATE_ACTION='')
+    def test_disabled(self):
+        self.create_post(SPAM)
+        self.create_post(SPAM)
+        self.assertEqual(
+            Post.objects.filter(moderation=VISIBLE).count(), 2
+        )
+
+    def test_backfill(self):
+        Post.objects.create(author=self.user, text=SPAM)
+        Post.objects.create(author=self.user, text='Коротко')
+        self.assertEqual(duplicates.backfill(), 1)
+        self.assertEqual(duplicates.backfill(), 0)
+        self.create_post(SPAM_VARIANT)
+        self.assertEqual(
+            Post.objects.get(text=SPAM_VARIANT).moderation, FLAGGED
+        )
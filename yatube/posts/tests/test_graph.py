@@ -0,0 +1,106 @@
+import os
+import shutil
+import tempfile
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from core import versioned
+
+from .. import graph
+from ..models import Follow, User
+
+
+class FollowGraphTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        settings = override_settings(
+            FOLLOW_GRAPH_DIR=root, FOLLOW_GRAPH_CHECK_INTERVAL=0
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+        graph.reset()
+        self.addCleanup(graph.reset)
+        self.root = root
+        self.users = {
+            name: User.objects.create_user(username=name)
+            for name in ('me', 'a', 'b', 'c', 'd', 'e')
+        }
+
+    def follow(self, user, *authors):
+        for author in authors:
+            Follow.objects.create(
+                user=self.users[user], author=self.users[author]
+            )
+
+    def ids(self, *names):
+        return [self.users[name].pk for name in names]
+
+    def test_two_hop_counts(self):
+        self.follow('me', 'a', 'b')
+        self.follow('a', 'c', 'd', 'me')
+        self.follow('b', 'c', 'a')
+        built = graph.rebuild()
+        node = built.node(self.users['me'].pk)
+        reached, counts = built.two_hop(node)
+        self.assertEqual(
+            dict(zip(built.ids[reached].tolist(), counts.tolist())),
+            dict(zip(self.ids('c', 'd', 'me', 'a'), (2, 1, 1, 1))),
+        )
+        self.assertEqual(built.suggest(self.users['me'].pk, 5),
+                         self.ids('c', 'd'))
+
+    def test_popular_for_new_users(self):
+        self.follow('a', 'c', 'd')
+        self.follow('b', 'c')
+        built = graph.rebuild()
+        self.assertEqual(built.suggest(self.users['e'].pk, 1),
+                         self.ids('c'))
+        self.assertEqual(built.suggest(10 ** 9, 2), self.ids('c', 'd'))
+
+    def test_versions_are_swapped(self):
+        self.follow('me', 'a')
+        self.follow('a', 'b')
+        graph.rebuild()
+        self.assertEqual(
+            graph.suggestions(self.users['me']), [self.users['b']]
+        )
+        self.follow('a', 'c')
+        graph.rebuild()
+        graph.rebuild()
+        self.assertEqual(
+            graph.suggestions(self.users['me']),
+            [self.users['b'], self.users['c']],
+        )
+        self.assertEqual(
+            len([name for name in os.listdir(self.root)
+                 if os.path.isdir(os.path.join(self.root, name))]),
+            versioned.KEEP_VERSIONS,
+        )
+        self.follow('me', 'b')
+        self.assertEqual(
+            graph.suggestions(self.users['me']), [self.users['c']]
+        )
+
+    def test_pages_show_suggestions(self):
+        self.follow('me', 'a')
+        self.follow('a', 'b')
+        graph.rebuild()
+        self.client.force_login(self.users['me'])
+        for url in (
+            reverse('posts:follow_index'),
+            reverse('posts:profile', args=('a',)),
+        ):
+            response = self.client.get(url)
+            self.assertEqual(response.context['suggestions'],
+                             [self.users['b']])
+            self.assertContains(
+                response, reverse('posts:profile_follow', args=('b',))
+            )
+
+    def test_no_graph(self):
+        self.assertIsNone(graph.current())
+        self.assertEqual(graph.suggestions(self.users['me']), [])
@@ -0,0 +1,108 @@
+import threading
+import time
+
+from django.db import connection
+from django.test import (
+    Client, TestCase, TransactionTestCase, override_settings,
+)
+from django.urls import reverse
+
+from .. import longpoll
+from ..models import Follow, Group, Post, User
+
+URL = reverse('posts:new_posts')
+
+
+class NewPostsTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='SkaDi')
+        self.author = User.objects.create_user(username='author')
+        self.group = Group.objects.create(
+            title='Группа', slug='group', description=''
+        )
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def poll(self, **params):
+        params.setdefault('timeout', 0)
+        return self.client.get(URL, params).json()
+
+    def test_without_cursor_returns_current_position(self):
+        Post.objects.create(text='Старый', author=self.author)
+        data = self.poll()
+        self.assertEqual(data['count'], 0)
+        self.assertEqual(self.poll(cursor=data['cursor'])['count'], 0)
+
+    def test_newer_posts_are_counted_per_feed(self):
+        cursor = self.poll()['cursor']
+        Follow.objects.create(user=self.user, author=self.author)
+        in_group = Post.objects.create(
+            text='В группе', author=self.user, group=self.group
+        )
+        followed = Post.objects.create(text='Подписка', author=self.author)
+        index = self.poll(cursor=cursor)
+        self.assertEqual(index['ids'], [in_group.pk, followed.pk])
+        self.assertEqual(
+            self.poll(cursor=cursor, feed='group', slug='group')['ids'],
+            [in_group.pk],
+        )
+        self.assertEqual(
+            self.poll(cursor=cursor, feed='follow')['ids'], [followed.pk]
+        )
+        self.assertEqual(self.poll(cursor=index['cursor'])['count'], 0)
+
+    def test_bad_requests(self):
+        self.assertEqual(
+            self.client.get(URL, {'feed': 'group', 'slug': 'no'}).status_code,
+            404,
+        )
+        self.assertEqual(
+            Client().get(URL, {'feed': 'follow'}).status_code, 403
+        )
+        current = self.poll()['cursor']
+        for cursor in ('default:99999999999999999999999', 'default:²'):
+            response = self.client.get(URL, {'cursor': cursor, 'timeout': 0})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json()['cursor'], current)
+
+    @override_settings(NEW_POSTS_RETRY_AFTER=7)
+    def test_busy_server_asks_to_retry(self):
+        cursor = self.poll()['cursor']
+        waiters = threading.BoundedSemaphore(1)
+        waiters.acquire()
+        self.addCleanup(setattr, longpoll, '_waiters', longpoll._waiters)
+        longpoll._waiters = waiters
+        response = self.client.get(URL, {'cursor': cursor, 'timeout': 0})
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '7')
+        self.assertEqual(
+            response.json(), {'cursor': cursor, 'retry_after': 7}
+        )
+        Post.objects.create(text='Новый', author=self.author)
+        self.assertEqual(self.poll(cursor=cursor)['count'], 1)
+
+
+class LongPollTests(TransactionTestCase):
+    def test_request_is_woken_by_new_post(self):
+        author = User.objects.create_user(username='author')
+        client = Client()
+        cursor = client.get(URL).json()['cursor']
+
+        def publish():
+            time.sleep(0.3)
+            Post.objects.create(text='Новый', author=author)
+            connection.close()
+
+        threading.Thread(target=publish).start()
+        start = time.monotonic()
+        data = client.get(URL, {'cursor': cursor, 'timeout': 10}).json()
+        self.assertEqual(data['count'], 1)
+        self.assertLess(time.monotonic() - start, 5)
+
+    def test_request_times_out(self):
+        client = Client()
+        cursor = client.get(URL).json()['cursor']
+        start = time.monotonic()
+        data = client.get(URL, {'cursor': cursor, 'timeout': 0.3}).json()
+        self.assertEqual(data['count'], 0)
+        self.assertGreaterEqual(time.monotonic() - start, 0.3)
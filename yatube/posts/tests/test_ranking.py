@@ -0,0 +1,109 @@
+import math
+
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from .. import ranking
+from ..admin import moderate
+from ..models import (
+    HIDDEN, VISIBLE, Comment, Follow, Group, Post, PostRank, User,
+)
+
+
+class HotRankingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='author')
+        self.other = User.objects.create_user(username='other')
+        self.group = Group.objects.create(
+            title='Группа', slug='group', description=''
+        )
+        self.old = Post.objects.create(author=self.other, text='Старый')
+        self.new = Post.objects.create(
+            author=self.author, text='Новый', group=self.group
+        )
+
+    def hot_ids(self, group=None):
+        return [post.pk for post in ranking.hot_feed(group)[:10]]
+
+    def test_logaddexp(self):
+        self.assertAlmostEqual(
+            ranking.logaddexp(math.log(2), math.log(3)), math.log(5)
+        )
+        self.assertEqual(ranking.logaddexp(None, 1.5), 1.5)
+
+    def test_comments_and_followers_raise_posts(self):
+        ranking.update()
+        self.assertEqual(self.hot_ids(), [self.new.pk, self.old.pk])
+
+        Comment.objects.create(post=self.old, author=self.author, text='К')
+        ranking.update()
+        self.assertEqual(self.hot_ids(), [self.old.pk, self.new.pk])
+
+        for username in ('a', 'b', 'c'):
+            Follow.objects.create(
+                user=User.objects.create_user(username=username),
+                author=self.author,
+            )
+        ranking.update()
+        self.assertEqual(self.hot_ids(), [self.new.pk, self.old.pk])
+        self.assertEqual(self.hot_ids(self.group), [self.new.pk])
+
+    def test_incremental_matches_rebuild(self):
+        ranking.update()
+        for number in range(3):
+            Comment.objects.create(
+                post=self.old, author=self.author, text=str(number)
+            )
+        Follow.objects.create(user=self.author, author=self.other)
+        ranking.update()
+        incremental = dict(PostRank.objects.values_list('post_id', 'score'))
+        ranking.rebuild()
+        rebuilt = dict(PostRank.objects.values_list('post_id', 'score'))
+        self.assertEqual(incremental.keys(), rebuilt.keys())
+        for post_id, score in rebuilt.items():
+            self.assertAlmostEqual(incremental[post_id], score, places=4)
+
+    def test_deleted_post_leaves_ranking(self):
+        ranking.update()
+        self.new.delete()
+        ranking.update()
+        self.assertEqual(self.hot_ids(), [self.old.pk])
+
+    def test_hidden_post_leaves_ranking(self):
+        ranking.update()
+        moderate(Post.objects.filter(pk=self.new.pk), HIDDEN)
+        ranking.update()
+        feed = ranking.hot_feed()
+        self.assertEqual(feed.count(), 1)
+        self.assertEqual([post.pk for post in feed[:10]], [self.old.pk])
+        moderate(Post.objects.filter(pk=self.new.pk), VISIBLE)
+        ranking.update()
+        self.assertEqual(self.hot_ids(), [self.new.pk, self.old.pk])
+
+    def test_index_order(self):
+        ranking.update()
+        Comment.objects.create(post=self.old, author=self.author, text='К')
+        ranking.update()
+        response = self.client.get(reverse('posts:index'))
+        self.assertEqual(
+            [post.pk for post in response.context['page_obj']],
+            [self.new.pk, self.old.pk],
+        )
+        response = self.client.get(reverse('posts:index'), {'order': 'hot'})
+        self.assertEqual(response.context['order'], 'hot')
+        self.assertEqual(
+            [post.pk for post in response.context['page_obj']],
+            [self.old.pk, self.new.pk],
+        )
+        content = response.content.decode()
+        self.assertLess(content.index('Старый'), content.index('Новый'))
+        response = self.client.get(
+            reverse('posts:group_list', args=(self.group.slug,)),
+            {'order': 'hot'},
+        )
+        self.assertEqual(
+            [post.pk for post in response.context['page_obj']],
+            [self.new.pk],
+        )
@@ -0,0 +1,61 @@
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from ..models import Comment, Post, User
+
+
+@override_settings(POST_EXCERPT_LENGTH=10)
+class RenderedHtmlTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='SkaDi')
+
+    def test_html_is_rendered_on_save(self):
+        post = Post.objects.create(
+            author=self.user, text='<b>Первая</b>\nвторая строка'
+        )
+        self.assertEqual(
+            post.text_html, '&lt;b&gt;Первая&lt;/b&gt;<br>вторая строка'
+        )
+        self.assertEqual(post.excerpt_html, '&lt;b&gt;Первая…')
+        comment = Comment.objects.create(
+            post=post, author=self.user, text='а\nб'
+        )
+        self.assertEqual(comment.text_html, 'а<br>б')
+
+    def test_update_fields(self):
+        post = Post.objects.create(author=self.user, text='Старый')
+        post.text = 'Новый'
+        post.save(update_fields=['text'])
+        post.refresh_from_db()
+        self.assertEqual(post.text_html, 'Новый')
+        Post.objects.filter(pk=post.pk).update(text_html='')
+        post.save(update_fields=['group'])
+        post.refresh_from_db()
+        self.assertEqual(post.text_html, '')
+
+    def test_backfill_command(self):
+        post = Post.objects.create(author=self.user, text='a\nb')
+        Post.objects.filter(pk=post.pk).update(text_html='', excerpt_html='')
+        call_command('render_posts', stdout=StringIO())
+        post.refresh_from_db()
+        self.assertEqual(post.text_html, 'a<br>b')
+        self.assertEqual(post.excerpt_html, 'a<br>b')
+
+    def test_lists_show_excerpt(self):
+        post = Post.objects.create(
+            author=self.user, text='Начало поста и его продолжение'
+        )
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, post.excerpt_html)
+        self.assertNotContains(response, 'продолжение')
+        self.assertIn('text', response.context['page_obj'][0]
+                      .get_deferred_fields())
+        response = self.client.get(
+            reverse('posts:post_detail', args=(post.pk,))
+        )
+        self.assertContains(response, 'продолжение')
@@ -0,0 +1,140 @@
+from django.core.paginator import Paginator
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from .. import sharding
+from ..management.commands.rebalance_shards import Command
+from ..models import Comment, Post, ShardBucket, User
+from ..routers import ShardRouter
+
+
+class ShardingTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='SkaDi')
+        cls.other = User.objects.create_user(username='other')
+        for number in range(7):
+            Post.objects.create(
+                author=cls.user if number % 2 else cls.other,
+                text=f'Пост {number}',
+            )
+
+    def setUp(self):
+        sharding.reset_bucket_map()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def test_bucket_is_encoded_in_id(self):
+        """По id находится бакет, в котором id был выдан."""
+        self.assertEqual(sharding.bucket_for_id(sharding.new_id(17)), 17)
+        self.assertNotEqual(sharding.new_id(17), sharding.new_id(17))
+
+    def test_sharded_feed_merges_in_order(self):
+        """Слияние выборок шардов совпадает с общей сортировкой."""
+        feed = sharding.ShardedFeed([
+            Post.objects.filter(author=self.user),
+            Post.objects.filter(author=self.other),
+        ])
+        expected = list(Post.objects.order_by('-pub_date', '-id'))
+        page = Paginator(feed, 3).get_page(2)
+        self.assertEqual(feed.count(), 7)
+        self.assertEqual(list(page), expected[3:6])
+
+    @override_settings(POST_SHARDS=['default', 'shard2'])
+    def test_router_uses_shard_map(self):
+        """Бакет из таблицы ShardBucket переопределяет шард по умолчанию."""
+        router = ShardRouter()
+        bucket = sharding.bucket_for_author(self.user.pk)
+        expected = ['default', 'shard2'][bucket % 2]
+        self.assertEqual(
+            router.db_for_read(Post, instance=self.user), expected
+        )
+        ShardBucket.objects.create(bucket=bucket, database='shard2')
+        sharding.reset_bucket_map()
+        self.assertEqual(
+            router.db_for_write(Post, instance=self.user), 'shard2'
+        )
+        self.assertEqual(router.db_for_read(User, instance=Post()), 'default')
+
+    @override_settings(POST_SHARDS=['default'])
+    def test_views_with_sharding_enabled(self):
+        """Созданный пост получает id шарда и виден на страницах."""
+        self.authorized_client.post(
+            reverse('posts:post_create'), {'text': 'Шардированный пост'}
+        )
+        post = Post.objects.get(text='Шардированный пост')
+        self.assertEqual(
+            sharding.bucket_for_id(post.id),
+            sharding.bucket_for_author(self.user.id),
+        )
+        self.authorized_client.post(
+            reverse('posts:add_comment', args=(post.id,)),
+            {'text': 'Комментарий'},
+        )
+        comment = post.comments.get()
+        self.assertEqual(sharding.bucket_for_id(comment.id),
+                         sharding.bucket_for_id(post.id))
+        response = self.authorized_client.get(reverse('posts:index'))
+        self.assertEqual(response.context['page_obj'][0], post)
+        response = self.authorized_client.get(
+            reverse('posts:post_detail', args=(post.id,))
+        )
+        self.assertEqual(response.context['post'], post)
+
+
+@override_settings(POST_SHARDS=['default', 'shard2'])
+class RebalanceTests(TestCase):
+    databases = {'default', 'shard2'}
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='mover')
+        self.bucket = sharding.bucket_for_author(self.user.pk)
+        ShardBucket.objects.create(bucket=self.bucket, database='default')
+        sharding.reset_bucket_map()
+        self.addCleanup(sharding.reset_bucket_map)
+        self.command = Command()
+
+    def switch(self):
+        """Первый проход и переключение бакета на ``shard2``."""
+        self.command.copy(self.bucket, 'default', 'shard2')
+        cutover = self.command.last_seq('shard2')
+        ShardBucket.objects.filter(bucket=self.bucket).update(
+            database='shard2'
+        )
+        sharding.reset_bucket_map()
+        return cutover
+
+    def test_second_pass_keeps_changes_made_after_cutover(self):
+        """Докопирование переносит правки и удаления старого шарда, но не
+        затирает то, что после переключения изменили в новом."""
+        posts = {
+            name: Post.objects.create(author=self.user, text=name)
+            for name in ('kept', 'edited', 'deleted', 'rewritten', 'gone')
+        }
+        comment = Comment.objects.create(
+            post=posts['kept'], author=self.user, text='Комментарий'
+        )
+        cutover = self.switch()
+        source = Post.objects.using('default')
+        source.filter(pk=posts['edited'].pk).update(text='edited 2')
+        source.filter(pk=posts['rewritten'].pk).update(text='устарело')
+        source.filter(pk=posts['deleted'].pk).delete()
+        Comment.objects.using('default').filter(pk=comment.pk).delete()
+        rewritten = Post.objects.using('shard2').get(
+            pk=posts['rewritten'].pk
+        )
+        rewritten.text = 'rewritten 2'
+        rewritten.save()
+        Post.objects.using('shard2').get(pk=posts['gone'].pk).delete()
+
+        self.command.copy(self.bucket, 'default', 'shard2', cutover=cutover)
+        self.assertEqual(
+            dict(Post.objects.using('shard2').values_list('pk', 'text')),
+            {
+                posts['kept'].pk: 'kept',
+                posts['edited'].pk: 'edited 2',
+                posts['rewritten'].pk: 'rewritten 2',
+            },
+        )
+        self.assertFalse(Comment.objects.using('shard2').exists())
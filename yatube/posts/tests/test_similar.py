@@ -0,0 +1,92 @@
+import shutil
+import tempfile
+
+import numpy as np
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from .. import similar
+from ..models import Post, SimilarPost, User
+
+TEXTS = {
+    'cats': 'Кошки любят молоко и спят на солнце',
+    'kittens': 'Котята тоже любят молоко, кошки спят',
+    'rockets': 'Ракеты летят к орбите на керосине',
+    'engines': 'Двигатели ракеты работают на керосине',
+}
+
+
+class SimilarPostsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        settings = override_settings(
+            SIMILAR_POSTS_DIR=root, SIMILAR_POSTS_CHECK_INTERVAL=0,
+            SIMILAR_POSTS_COUNT=2, SIMILAR_POSTS_BLOCK_PAIRS=3,
+            SIMILAR_POSTS_MAX_DF=0.5,
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+        similar.reset()
+        self.addCleanup(similar.reset)
+        self.author = User.objects.create_user(username='author')
+        self.posts = {
+            name: Post.objects.create(author=self.author, text=text)
+            for name, text in TEXTS.items()
+        }
+
+    def neighbours(self, name):
+        return list(SimilarPost.objects.filter(
+            post_id=self.posts[name].pk
+        ).order_by('rank').values_list('similar_id', flat=True))
+
+    def test_blocked_matches_dense(self):
+        matrix = similar.rebuild()
+        dense = np.zeros((matrix.documents, len(matrix.idf)))
+        rows, features, values = matrix.rows()
+        dense[rows, features] = values
+        rows, docs, scores = matrix.dot(*matrix.rows(), matrix.allowed())
+        expected = dense @ dense.T
+        np.testing.assert_allclose(scores, expected[rows, docs], rtol=1e-5)
+        self.assertGreater(len(list(matrix.blocks(matrix.allowed()))), 1)
+
+    def test_rebuild_finds_neighbours(self):
+        similar.rebuild()
+        self.assertEqual(self.neighbours('cats'), [self.posts['kittens'].pk])
+        self.assertEqual(self.neighbours('engines'),
+                         [self.posts['rockets'].pk])
+
+    def test_new_posts_are_added(self):
+        similar.rebuild()
+        self.assertEqual(similar.update(), 0)
+        post = Post.objects.create(
+            author=self.author, text='Ракеты на керосине летят к орбите'
+        )
+        similar.update()
+        self.assertEqual(self.neighbours('rockets')[0], post.pk)
+        self.assertEqual(
+            list(SimilarPost.objects.filter(post_id=post.pk).order_by(
+                'rank').values_list('similar_id', flat=True)),
+            [self.posts['rockets'].pk, self.posts['engines'].pk],
+        )
+        post.delete()
+        similar.update()
+        self.assertFalse(SimilarPost.objects.filter(similar_id=post.pk))
+
+    def test_post_detail_shows_similar(self):
+        similar.rebuild()
+        response = self.client.get(
+            reverse('posts:post_detail', args=(self.posts['cats'].pk,))
+        )
+        self.assertEqual(response.context['similar_posts'],
+                         [self.posts['kittens']])
+        self.assertContains(response, reverse(
+            'posts:post_detail', args=(self.posts['kittens'].pk,)
+        ))
+
+    def test_no_matrix(self):
+        Post.objects.create(author=self.author, text='Кошки')
+        self.assertEqual(similar.update(), 0)
+        self.assertFalse(SimilarPost.objects.exists())
@@ -0,0 +1,131 @@
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from .. import sharding, tags
+from ..models import Post, PostTag, Tag, TagBucket, User
+
+
+class TagTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='SkaDi')
+        self.client.force_login(self.user)
+
+    def create(self, text):
+        self.client.post(reverse('posts:post_create'), {'text': text})
+        return Post.objects.latest('pk')
+
+    def bucket_counts(self):
+        return dict(TagBucket.objects.values_list('tag__name', 'count'))
+
+    def test_parse(self):
+        self.assertEqual(
+            tags.parse('#Django и #django, #питон; a#b &#39; #x_1'),
+            ['django', 'питон', 'x_1'],
+        )
+
+    def test_tags_follow_create_edit_and_delete(self):
+        post = self.create('Пишу на #Python и #Django')
+        self.assertEqual(
+            set(PostTag.objects.values_list('tag__name', flat=True)),
+            {'python', 'django'},
+        )
+        self.assertIn(
+            f'<a href="{reverse("posts:tag_posts", args=("python",))}">'
+            '#Python</a>',
+            post.text_html,
+        )
+        self.client.post(
+            reverse('posts:post_edit', args=(post.pk,)),
+            {'text': 'Теперь только #django и #orm'},
+        )
+        self.assertEqual(
+            set(PostTag.objects.values_list('tag__name', flat=True)),
+            {'django', 'orm'},
+        )
+        self.assertEqual(
+            self.bucket_counts(), {'python': 0, 'django': 1, 'orm': 1}
+        )
+        post.delete()
+        self.assertFalse(PostTag.objects.exists())
+        self.assertEqual(set(self.bucket_counts().values()), {0})
+
+    def test_keyset_pagination(self):
+        posts = [self.create(f'Пост {number} #tag') for number in range(5)]
+        PostTag.objects.update(pub_date=timezone.now())
+        tag = Tag.objects.get(name='tag')
+        seen = []
+        cursor = None
+        while True:
+            page, next_cursor = tags.tag_page(tag, cursor, limit=2)
+            seen.extend(post.pk for post in page)
+            if next_cursor is None:
+                break
+            cursor = tags.parse_cursor(next_cursor)
+        self.assertEqual(seen, [post.pk for post in reversed(posts)])
+
+    def test_tag_page(self):
+        with self.settings(POST_LIMIT=1):
+            self.create('Первый #новости')
+            self.create('Второй #новости')
+            url = reverse('posts:tag_posts', args=('Новости',))
+            response = self.client.get(url)
+            self.assertContains(response, 'Второй')
+            self.assertNotContains(response, 'Первый')
+            response = self.client.get(
+                url, {'after': response.context['next_cursor']}
+            )
+            self.assertContains(response, 'Первый')
+            self.assertIsNone(response.context['next_cursor'])
+            for cursor in ('99999999999999999999999_1',
+                           '-99999999999999999999999_1',
+                           '0_99999999999999999999999'):
+                response = self.client.get(url, {'after': cursor})
+                self.assertContains(response, 'Второй')
+        self.assertEqual(
+            self.client.get(
+                reverse('posts:tag_posts', args=('нет',))
+            ).status_code,
+            404,
+        )
+
+    @override_settings(TRENDING_WINDOW_HOURS=2)
+    def test_trending_window(self):
+        for _ in range(2):
+            self.create('#старое')
+        self.create('#новое')
+        TagBucket.objects.filter(tag__name='старое').update(
+            hour=tags._hour(timezone.now()) - timedelta(hours=3)
+        )
+        self.assertEqual(tags.trending(), [('новое', 1)])
+        self.assertFalse(
+            TagBucket.objects.filter(tag__name='старое').exists()
+        )
+
+    @override_settings(POST_SHARDS=['default'])
+    def test_rebalance_keeps_tags(self):
+        """Перенос бакета удаляет строки из шардов без ``post_delete``:
+        теги переехавшего поста остаются."""
+        from ..management.commands.rebalance_shards import Command
+
+        post = self.create('Переезжаю вместе с #тегом')
+        bucket = sharding.bucket_for_id(post.pk)
+        command = Command()
+        self.assertEqual(
+            command.copy(
+                bucket, 'default', 'default',
+                cutover=command.last_seq('default'),
+            ),
+            1,
+        )
+        command.delete(command.in_bucket(Post, 'default', bucket))
+        self.assertFalse(Post.objects.filter(pk=post.pk).exists())
+        self.assertEqual(
+            list(PostTag.objects.values_list('post_id', 'tag__name')),
+            [(post.pk, 'тегом')],
+        )
+        self.assertEqual(self.bucket_counts(), {'тегом': 1})
@@ -14,6 +14,8 @@ urlpatterns = [
         name='add_comment'
     ),
     path('follow/', views.follow_index, name='follow_index'),
+    path('new/', views.new_posts, name='new_posts'),
+    path('tags/<str:tag>/', views.tag_posts, name='tag_posts'),
     path(
         'profile/<str:username>/follow/',
         views.profile_follow,
@@ -1,81 +1,146 @@
 from django.core.paginator import Paginator
 from django.conf import settings
-from django.shortcuts import render, get_object_or_404, redirect
-from .models import Follow, Post, Group, User, Comment
+from django.shortcuts import render, redirect
+from .models import HIDDEN, Follow, Post
 from .forms import CommentForm, PostForm
 from django.contrib.auth.decorators import login_required
+from django.core.exceptions import PermissionDenied
+from django.db.models import Q
+from django.http import Http404, JsonResponse
+from core.db import identity
+from core.db.writes import write_databases, write_view
+from . import (
+    graph, hotrows, longpoll, ranking, sharding, similar, tags, tasks,
+)
 
 
 
 
+def first_page_cached(posts, page_number):
+    """Первая страница ленты запрашивается чаще всего — её кешируем."""
+    if page_number in (None, '', '1'):
+        return posts.cache()
+    return posts
+
+
+def feed_order(request):
+    """``hot`` или ``new`` из ``?order=``."""
+    return 'hot' if request.GET.get('order') == 'hot' else 'new'
+
+
 def index(request):
-    posts = Post.objects.all()
-    paginator = Paginator(posts, settings.POST_LIMIT)
     page_number = request.GET.get('page')
+    order = feed_order(request)
+    if order == 'hot':
+        posts = ranking.hot_feed()
+    else:
+        posts = first_page_cached(sharding.feed(), page_number)
+    paginator = Paginator(posts, settings.POST_LIMIT)
     page_obj = paginator.get_page(page_number)
     context = {
         'page_obj': page_obj,
+        'order': order,
     }
     return render(request, 'posts/index.html', context)
 
 
 def group_posts(request, slug):
-    group = get_object_or_404(Group, slug=slug)
-    posts = group.posts.all()
-    paginator = Paginator(posts, settings.POST_LIMIT)
+    group = hotrows.groups_by_slug.get_or_404(slug)
     page_number = request.GET.get('page')
+    order = feed_order(request)
+    if order == 'hot':
+        posts = ranking.hot_feed(group=group)
+    else:
+        posts = first_page_cached(sharding.feed(group=group), page_number)
+    paginator = Paginator(posts, settings.POST_LIMIT)
     page_obj = paginator.get_page(page_number)
     context = {
         'group': group,
         'page_obj': page_obj,
+        'order': order,
     }
     return render(request, 'posts/group_list.html', context)
 
 
 def profile(request, username):
-    user = get_object_or_404(User, username=username)
-    posts = user.posts.all()
-    paginator = Paginator(posts, settings.POST_LIMIT)
+    user = hotrows.users_by_username.get_or_404(username)
+    identity.add(user)
     page_number = request.GET.get('page')
+    posts = first_page_cached(user.posts.for_list(), page_number)
+    paginator = Paginator(posts, settings.POST_LIMIT)
     page_obj = paginator.get_page(page_number)
     following = user.following.exists()
     context = {
         'author': user,
         'page_obj': page_obj,
-        'following': following
+        'following': following,
+        'suggestions': graph.suggestions(request.user),
     }
     return render(request, 'posts/profile.html', context)
 
 
 def post_detail(request, post_id):
     form = CommentForm(request.POST or None)
-    post = Post.objects.get(id=post_id)
-    comments = Comment.objects.filter(post=post)
+    post = sharding.get_post_or_404(post_id)
+    if post.moderation == HIDDEN and post.author_id != request.user.pk:
+        raise Http404
+    comments = post.comments.filter(
+        ~Q(moderation=HIDDEN) | Q(author_id=request.user.pk)
+    ).defer('text', 'excerpt_html')
     post_count = post.author.posts.count()
     context = {
         'post_count': post_count,
         'post': post,
         'form': form,
-        'comments': comments
+        'comments': comments,
+        'similar_posts': similar.similar_posts(post),
     }
 
     return render(request, 'posts/post_detail.html', context)
 
 
+def tag_posts(request, tag):
+    tag = hotrows.tags_by_name.get_or_404(tag.lower())
+    posts, next_cursor = tags.tag_page(
+        tag, tags.parse_cursor(request.GET.get('after', ''))
+    )
+    context = {
+        'tag': tag,
+        'posts': posts,
+        'next_cursor': next_cursor,
+        'trending': tags.trending(),
+    }
+    return render(request, 'posts/tag.html', context)
+
+
+def author_databases(request):
+    return write_databases(Post, instance=request.user)
+
+
+def post_databases(request, post_id):
+    return write_databases(Post, instance=Post(pk=post_id))
+
+
 @login_required
+@write_view(databases=author_databases)
 def post_create(request):
     form = PostForm(request.POST or None, files=request.FILES or None)
     if form.is_valid():
         new_post = form.save(commit=False)
         new_post.author = request.user
         new_post.save()
+        form.remember_text(new_post)
+        tags.update_post_tags(new_post)
+        if new_post.image:
+            tasks.make_thumbnails.delay(post_id=new_post.pk)
         return redirect('posts:profile', request.user.username)
     return render(request, 'posts/create_post.html', {'form': form})
 
 
 @login_required
+@write_view(databases=post_databases)
 def post_edit(request, post_id):
-    post = get_object_or_404(Post, id=post_id)
+    post = sharding.get_post_or_404(post_id)
     form = PostForm(
         request.POST or None,
         files=request.FILES or None,
@@ -85,7 +150,11 @@ def post_edit(request, post_id):
         return redirect('posts:post_detail', post_id)
     if request.method == 'POST':
         if form.is_valid():
-            form.save()
+            post = form.save()
+            form.remember_text(post)
+            tags.update_post_tags(post)
+            if post.image:
+                tasks.make_thumbnails.delay(post_id=post.pk)
             return redirect('posts:post_detail', post_id)
     return render(
         request, 'posts/create_post.html', {'form': form, 'is_edit': True}
@@ -93,14 +162,16 @@ def post_edit(request, post_id):
 
 
 @login_required
+@write_view(databases=post_databases)
 def add_comment(request, post_id):
-    post = get_object_or_404(Post, id=post_id)
+    post = sharding.get_post_or_404(post_id)
     form = CommentForm(request.POST or None)
     if form.is_valid():
         comment = form.save(commit=False)
         comment.author = request.user
         comment.post = post
         comment.save()
+        form.remember_text(comment)
     return redirect('posts:post_detail', post_id=post_id)
 
 
@@ -110,27 +181,79 @@ def follow_index(request):
         'author_id',
         flat=True,
     )
-    posts = Post.objects.filter(author_id__in=follower)
+    posts = sharding.authors_feed(follower)
     paginator = Paginator(posts, settings.POST_LIMIT)
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
     context = {
         'page_obj': page_obj,
         'title': 'Избранное',
+        'suggestions': graph.suggestions(request.user),
     }
     return render(request, 'posts/follow.html', context)
 
 
 @login_required
+@write_view(safe_methods=())
 def profile_follow(request, username):
-    author = get_object_or_404(User, username=username)
+    author = hotrows.users_by_username.get_or_404(username)
     if author != request.user:
         Follow.objects.get_or_create(user=request.user, author=author)
     return redirect('posts:follow_index')
 
 
 @login_required
+@write_view(safe_methods=())
 def profile_unfollow(request, username):
-    author = get_object_or_404(User, username=username)
+    author = hotrows.users_by_username.get_or_404(username)
     Follow.objects.filter(user=request.user, author=author).delete()
     return redirect('posts:follow_index')
+
+
+def feed_filter(request):
+    """Проверка данных записи журнала на принадлежность ленте."""
+    feed = request.GET.get('feed', 'index')
+    if feed == 'group':
+        group = hotrows.groups_by_slug.get_or_404(request.GET.get('slug'))
+        return lambda data: data['group_id'] == group.pk
+    if feed == 'follow':
+        if not request.user.is_authenticated:
+            raise PermissionDenied
+        authors = set(Follow.objects.filter(user=request.user).values_list(
+            'author_id', flat=True,
+        ))
+        return lambda data: data['author_id'] in authors
+    return lambda data: True
+
+
+def new_posts(request):
+    in_feed = feed_filter(request)
+
+    def accept(data):
+        return data.get('moderation') != HIDDEN and in_feed(data)
+
+    cursor = longpoll.parse_cursor(request.GET.get('cursor', ''))
+    ids = []
+    if cursor is None:
+        cursor = longpoll.current_cursor()
+    else:
+        try:
+            timeout = float(request.GET['timeout'])
+        except (KeyError, ValueError):
+            timeout = settings.NEW_POSTS_TIMEOUT
+        timeout = max(0, min(timeout, settings.NEW_POSTS_TIMEOUT))
+        try:
+            ids, cursor = longpoll.wait(cursor, accept, timeout)
+        except longpoll.Busy:
+            retry_after = settings.NEW_POSTS_RETRY_AFTER
+            response = JsonResponse({
+                'cursor': longpoll.format_cursor(cursor),
+                'retry_after': retry_after,
+            }, status=429)
+            response['Retry-After'] = retry_after
+            return response
+    return JsonResponse({
+        'cursor': longpoll.format_cursor(cursor),
+        'count': len(ids),
+        'ids': ids,
+    })
@@ -0,0 +1,65 @@
+(function () {
+  var banner = document.getElementById('new-posts');
+  if (!banner) {
+    return;
+  }
+  // Первый запрос без курсора сразу возвращает текущую позицию журнала:
+  // так страница не зависит от курсора и остаётся кешируемой.
+  var cursor = '';
+  var total = 0;
+  // Пауза после ошибки растёт вдвое до MAX_DELAY и сбрасывается после
+  // первого удачного ответа. Занятый сервер (429) сам говорит, сколько
+  // ждать, в Retry-After.
+  var MIN_DELAY = 1000;
+  var MAX_DELAY = 60000;
+  var delay = MIN_DELAY;
+
+  function retryAfter(response) {
+    var seconds = parseFloat(response.headers.get('Retry-After'));
+    return isNaN(seconds) ? null : seconds * 1000;
+  }
+
+  function backOff(wait) {
+    setTimeout(poll, Math.max(wait || 0, delay));
+    delay = Math.min(delay * 2, MAX_DELAY);
+  }
+
+  function poll() {
+    var params = new URLSearchParams({feed: banner.dataset.feed});
+    if (cursor) {
+      params.set('cursor', cursor);
+    }
+    if (banner.dataset.slug) {
+      params.set('slug', banner.dataset.slug);
+    }
+    fetch(banner.dataset.url + '?' + params, {credentials: 'same-origin'})
+      .then(function (response) {
+        if (response.status === 429) {
+          backOff(retryAfter(response));
+          return null;
+        }
+        if (!response.ok) {
+          throw new Error(response.status);
+        }
+        return response.json();
+      })
+      .then(function (data) {
+        if (!data) {
+          return;
+        }
+        delay = MIN_DELAY;
+        cursor = data.cursor;
+        if (data.count) {
+          total += data.count;
+          banner.querySelector('.count').textContent = total;
+          banner.classList.remove('d-none');
+        }
+        poll();
+      })
+      .catch(function () {
+        backOff();
+      });
+  }
+
+  poll();
+})();
@@ -0,0 +1,46 @@
+from django.contrib import admin
+from django.utils import timezone
+
+from .models import Delivery, Endpoint, Subscription
+
+
+class SubscriptionInline(admin.TabularInline):
+    model = Subscription
+    raw_id_fields = ('author',)
+    extra = 1
+
+
+class EndpointAdmin(admin.ModelAdmin):
+    list_display = ('pk', 'url', 'is_active', 'failures', 'open_until')
+    list_filter = ('is_active',)
+    search_fields = ('url',)
+    readonly_fields = ('failures', 'open_until', 'created')
+    inlines = (SubscriptionInline,)
+    actions = ('close_circuit',)
+
+    def close_circuit(self, request, queryset):
+        updated = queryset.update(failures=0, open_until=None)
+        self.message_user(request, f'Возобновлено адресов: {updated}')
+    close_circuit.short_description = 'Возобновить отправку'
+
+
+class DeliveryAdmin(admin.ModelAdmin):
+    list_display = (
+        'pk', 'event_id', 'endpoint', 'status', 'attempts', 'send_after',
+        'created', 'sent',
+    )
+    list_filter = ('status', 'endpoint')
+    search_fields = ('event_id',)
+    readonly_fields = ('attempts', 'last_error', 'created', 'sent')
+    actions = ('retry',)
+
+    def retry(self, request, queryset):
+        updated = queryset.exclude(status=Delivery.SENT).update(
+            status=Delivery.QUEUED, attempts=0, send_after=timezone.now(),
+        )
+        self.message_user(request, f'Возвращено в очередь: {updated}')
+    retry.short_description = 'Повторить выбранные доставки'
+
+
+admin.site.register(Endpoint, EndpointAdmin)
+admin.site.register(Delivery, DeliveryAdmin)
@@ -0,0 +1,253 @@
+"""Отправка событий о новых постах на адреса партнёров.
+
+``Dispatcher`` читает журнал изменений (``posts.changelog``) читателем
+``webhooks`` и для каждого нового поста создаёт ``Delivery`` на все
+адреса с подходящей подпиской. Затем доставки каждого адреса уходят
+пачками — одним POST ``{"events": [...]}`` на пачку — через общую
+``requests.Session``, которая держит соединения открытыми.
+
+Тело подписывается HMAC-SHA256 секретом адреса::
+
+    X-Yatube-Timestamp: 1700000000
+    X-Yatube-Signature: sha256=<hex от "<timestamp>.<тело>">
+
+Неудачная пачка повторяется с растущей задержкой, а после
+``WEBHOOK_CIRCUIT_THRESHOLD`` неудач подряд адрес приостанавливается
+на ``WEBHOOK_CIRCUIT_SECONDS``; затем уходит одна пробная пачка.
+Доставка «хотя бы один раз»: получатель отсеивает повторы по ``id``
+события. Диспетчер рассчитан на один процесс, как и ``send_outbox``.
+
+Скрытые модерацией посты партнёрам не отправляются. Доставки постов,
+помеченных проверкой на дубли, создаются в состоянии ``HELD`` и уходят,
+только когда модератор снимет пометку.
+"""
+import hashlib
+import hmac
+import json
+import logging
+import random
+import time
+from datetime import timedelta
+
+import requests
+from django.conf import settings
+from django.db.models import F
+from django.urls import reverse
+from django.utils import timezone
+
+from core.metrics import WEBHOOK_SECONDS
+from posts import sharding
+from posts.changelog import Consumer
+from posts.models import FLAGGED, HIDDEN, VISIBLE, ChangeLog, Post
+
+from .models import Delivery, Endpoint, Subscription
+
+logger = logging.getLogger(__name__)
+
+CONSUMER = 'webhooks'
+
+
+def sign(secret, timestamp, body):
+    return hmac.new(
+        secret.encode(), f'{timestamp}.'.encode() + body, hashlib.sha256
+    ).hexdigest()
+
+
+def retry_delay(attempts):
+    delay = min(
+        settings.WEBHOOK_RETRY_BACKOFF * 2 ** (attempts - 1),
+        settings.WEBHOOK_RETRY_MAX_BACKOFF,
+    )
+    return random.uniform(delay / 2, delay)
+
+
+def post_event(event_id, post):
+    return json.dumps({
+        'id': event_id,
+        'type': 'post.created',
+        'post': {
+            'id': post.pk,
+            'text': post.text,
+            'pub_date': post.pub_date.isoformat(),
+            'author': post.author.username,
+            'group': post.group.slug if post.group_id else None,
+            'url': settings.WEBHOOK_BASE_URL + reverse(
+                'posts:post_detail', args=(post.pk,)
+            ),
+        },
+    }, ensure_ascii=False)
+
+
+def release_held(entries):
+    """Решения модераторов по постам с отложенными доставками: снятая
+    пометка отправляет их, скрытие или удаление поста — отменяет."""
+    moderation = {}
+    for entry in entries:
+        if entry.action == ChangeLog.UPDATE:
+            moderation[entry.object_id] = json.loads(entry.data).get(
+                'moderation'
+            )
+        elif entry.action == ChangeLog.DELETE:
+            moderation[entry.object_id] = HIDDEN
+    held = Delivery.objects.filter(status=Delivery.HELD)
+    released = [pk for pk, status in moderation.items() if status == VISIBLE]
+    if released:
+        held.filter(post_id__in=released).update(
+            status=Delivery.QUEUED, send_after=timezone.now()
+        )
+    dropped = [pk for pk, status in moderation.items() if status == HIDDEN]
+    if dropped:
+        held.filter(post_id__in=dropped).delete()
+
+
+def enqueue(entries, using):
+    """Создаёт доставки для новых постов из пачки журнала. Скрытые
+    модерацией посты не отправляются, помеченные ждут решения
+    модератора в ``HELD``."""
+    entries = [entry for entry in entries if entry.model == 'posts.post']
+    release_held(entries)
+    created = [
+        entry for entry in entries if entry.action == ChangeLog.CREATE
+    ]
+    if not created:
+        return 0
+    subscriptions = list(
+        Subscription.objects.filter(endpoint__is_active=True)
+        .values_list('endpoint_id', 'group_id', 'author_id')
+    )
+    if not subscriptions:
+        return 0
+    posts = Post.objects.using(using).select_related(
+        'author', 'group'
+    ).exclude(moderation=HIDDEN).in_bulk(
+        [entry.object_id for entry in created]
+    )
+    deliveries = []
+    for entry in created:
+        post = posts.get(entry.object_id)
+        if post is None:
+            continue
+        endpoints = {
+            endpoint_id
+            for endpoint_id, group_id, author_id in subscriptions
+            if group_id in (None, post.group_id)
+            and author_id in (None, post.author_id)
+        }
+        if not endpoints:
+            continue
+        event_id = f'{using}:{entry.seq}'
+        payload = post_event(event_id, post)
+        status = (
+            Delivery.HELD if post.moderation == FLAGGED else Delivery.QUEUED
+        )
+        deliveries.extend(
+            Delivery(endpoint_id=endpoint_id, event_id=event_id,
+                     post_id=post.pk, payload=payload, status=status)
+            for endpoint_id in sorted(endpoints)
+        )
+    Delivery.objects.bulk_create(deliveries, ignore_conflicts=True)
+    return len(deliveries)
+
+
+class Dispatcher:
+    def __init__(self, batch_size=None, timeout=None):
+        self.batch_size = batch_size or settings.WEBHOOK_BATCH_SIZE
+        self.timeout = timeout or settings.WEBHOOK_TIMEOUT
+        self.session = requests.Session()
+
+    def collect(self):
+        """Переносит новые посты из журналов всех шардов в доставки."""
+        return sum(
+            Consumer(CONSUMER, using=db).run(
+                lambda entries, db=db: enqueue(entries, db)
+            )
+            for db in sharding.shards()
+        )
+
+    def ready_endpoints(self):
+        now = timezone.now()
+        return Endpoint.objects.filter(
+            is_active=True,
+            deliveries__status=Delivery.QUEUED,
+            deliveries__send_after__lte=now,
+        ).exclude(open_until__gt=now).distinct()
+
+    def dispatch(self):
+        """Один проход; возвращает число отправленных пачек."""
+        self.collect()
+        return sum(self.send(endpoint) for endpoint in self.ready_endpoints())
+
+    def send(self, endpoint):
+        """Отправляет одну пачку адреса; True при успехе."""
+        deliveries = list(
+            endpoint.deliveries.filter(
+                status=Delivery.QUEUED, send_after__lte=timezone.now(),
+            ).order_by('id')[:self.batch_size]
+        )
+        if not deliveries:
+            return False
+        body = '{{"events": [{}]}}'.format(
+            ', '.join(delivery.payload for delivery in deliveries)
+        ).encode()
+        timestamp = str(int(time.time()))
+        start = time.perf_counter()
+        try:
+            response = self.session.post(
+                endpoint.url,
+                data=body,
+                headers={
+                    'Content-Type': 'application/json',
+                    'X-Yatube-Timestamp': timestamp,
+                    'X-Yatube-Signature': 'sha256=' + sign(
+                        endpoint.secret, timestamp, body
+                    ),
+                },
+                timeout=self.timeout,
+            )
+            response.raise_for_status()
+        except requests.RequestException as error:
+            WEBHOOK_SECONDS.observe(
+                time.perf_counter() - start, result='failed'
+            )
+            self.failed(endpoint, deliveries, error)
+            return False
+        WEBHOOK_SECONDS.observe(time.perf_counter() - start, result='sent')
+        Delivery.objects.filter(
+            pk__in=[delivery.pk for delivery in deliveries]
+        ).update(
+            status=Delivery.SENT, sent=timezone.now(),
+            attempts=F('attempts') + 1,
+        )
+        if endpoint.failures or endpoint.open_until:
+            endpoint.failures = 0
+            endpoint.open_until = None
+            endpoint.save(update_fields=('failures', 'open_until'))
+        return True
+
+    def failed(self, endpoint, deliveries, error):
+        """Пачка откладывается целиком, исчерпавшие попытки доставки — в
+        ``DEAD``; адрес после серии неудач приостанавливается."""
+        now = timezone.now()
+        attempts = max(delivery.attempts for delivery in deliveries) + 1
+        batch = Delivery.objects.filter(
+            pk__in=[delivery.pk for delivery in deliveries]
+        )
+        batch.update(
+            attempts=F('attempts') + 1,
+            last_error=repr(error),
+            send_after=now + timedelta(seconds=retry_delay(attempts)),
+        )
+        batch.filter(attempts__gte=settings.WEBHOOK_MAX_ATTEMPTS).update(
+            status=Delivery.DEAD,
+        )
+        endpoint.failures += 1
+        if endpoint.failures >= settings.WEBHOOK_CIRCUIT_THRESHOLD:
+            endpoint.open_until = now + timedelta(
+                seconds=settings.WEBHOOK_CIRCUIT_SECONDS
+            )
+            logger.warning('Адрес %s приостановлен после %s ошибок: %r',
+                           endpoint.url, endpoint.failures, error)
+        endpoint.save(update_fields=('failures', 'open_until'))
+
+    def close(self):
+        self.session.close()
@@ -0,0 +1,39 @@
+import signal
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from webhooks.dispatcher import Dispatcher
+
+
+class Command(BaseCommand):
+    help = 'Отправляет события о новых постах на адреса вебхуков.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch', type=int, default=None)
+        parser.add_argument(
+            '--drain', action='store_true',
+            help='Завершиться, когда готовых доставок не останется.',
+        )
+
+    def handle(self, *args, **options):
+        dispatcher = Dispatcher(options['batch'])
+        self.stopped = False
+        signal.signal(signal.SIGTERM, self.stop)
+        batches = 0
+        try:
+            while not self.stopped:
+                sent = dispatcher.dispatch()
+                batches += sent
+                if sent:
+                    continue
+                if options['drain']:
+                    break
+                time.sleep(settings.WEBHOOK_POLL_INTERVAL)
+        finally:
+            dispatcher.close()
+        self.stdout.write(f'Отправлено пачек: {batches}')
+
+    def stop(self, signum, frame):
+        self.stopped = True
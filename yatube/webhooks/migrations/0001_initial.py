@@ -0,0 +1,76 @@
+# Generated by Django 2.2.16 on 2026-10-19 09:31
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('posts', '0010_changelog_changelogcheckpoint'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Endpoint',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('url', models.URLField(unique=True, verbose_name='Адрес')),
+                ('secret', models.CharField(max_length=100, verbose_name='Секрет для подписи')),
+                ('is_active', models.BooleanField(default=True, verbose_name='Включён')),
+                ('failures', models.PositiveIntegerField(default=0, verbose_name='Ошибок подряд')),
+                ('open_until', models.DateTimeField(blank=True, null=True, verbose_name='Приостановлен до')),
+                ('created', models.DateTimeField(auto_now_add=True, verbose_name='Создан')),
+            ],
+            options={
+                'verbose_name': 'адрес вебхука',
+                'verbose_name_plural': 'адреса вебхуков',
+            },
+        ),
+        migrations.CreateModel(
+            name='Subscription',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('author', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='webhook_subscriptions', to=settings.AUTH_USER_MODEL, verbose_name='Автор')),
+                ('endpoint', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='subscriptions', to='webhooks.Endpoint', verbose_name='Адрес')),
+                ('group', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='webhook_subscriptions', to='posts.Group', verbose_name='Группа')),
+            ],
+            options={
+                'verbose_name': 'подписка',
+                'verbose_name_plural': 'подписки',
+            },
+        ),
+        migrations.CreateModel(
+            name='Delivery',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('event_id', models.CharField(max_length=100, verbose_name='id события')),
+                ('payload', models.TextField(verbose_name='Событие, JSON')),
+                ('status', models.CharField(choices=[('queued', 'В очереди'), ('sent', 'Доставлено'), ('dead', 'Не доставлено')], default='queued', max_length=10, verbose_name='Состояние')),
+                ('attempts', models.PositiveSmallIntegerField(default=0, verbose_name='Попыток')),
+                ('send_after', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Отправить не раньше')),
+                ('last_error', models.TextField(blank=True, verbose_name='Последняя ошибка')),
+                ('created', models.DateTimeField(auto_now_add=True, verbose_name='Создано')),
+                ('sent', models.DateTimeField(blank=True, null=True, verbose_name='Доставлено')),
+                ('endpoint', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='deliveries', to='webhooks.Endpoint', verbose_name='Адрес')),
+            ],
+            options={
+                'verbose_name': 'доставка',
+                'verbose_name_plural': 'доставки',
+                'ordering': ['-created'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='delivery',
+            index=models.Index(fields=['endpoint', 'status', 'send_after'], name='webhooks_delivery_ready_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='delivery',
+            unique_together={('endpoint', 'event_id')},
+        ),
+    ]
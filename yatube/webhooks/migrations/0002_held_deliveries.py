@@ -0,0 +1,23 @@
+# Generated by Django 2.2.16 on 2026-10-19 10:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webhooks', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='delivery',
+            name='post_id',
+            field=models.BigIntegerField(db_index=True, null=True, verbose_name='id поста'),
+        ),
+        migrations.AlterField(
+            model_name='delivery',
+            name='status',
+            field=models.CharField(choices=[('held', 'Ждёт модерации'), ('queued', 'В очереди'), ('sent', 'Доставлено'), ('dead', 'Не доставлено')], default='queued', max_length=10, verbose_name='Состояние'),
+        ),
+    ]
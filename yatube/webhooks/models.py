@@ -0,0 +1,108 @@
+from django.conf import settings
+from django.db import models
+from django.utils import timezone
+
+from posts.models import Group
+
+
+class Endpoint(models.Model):
+    """Адрес партнёра. События для него отправляются пачками, а после
+    серии ошибок отправка приостанавливается (circuit breaker)."""
+
+    url = models.URLField('Адрес', unique=True)
+    secret = models.CharField('Секрет для подписи', max_length=100)
+    is_active = models.BooleanField('Включён', default=True)
+    failures = models.PositiveIntegerField('Ошибок подряд', default=0)
+    open_until = models.DateTimeField(
+        'Приостановлен до', blank=True, null=True
+    )
+    created = models.DateTimeField('Создан', auto_now_add=True)
+
+    def __str__(self):
+        return self.url
+
+    class Meta:
+        verbose_name = 'адрес вебхука'
+        verbose_name_plural = 'адреса вебхуков'
+
+
+class Subscription(models.Model):
+    """Подписка на посты группы или автора; пустые поля — любые."""
+
+    endpoint = models.ForeignKey(
+        Endpoint,
+        on_delete=models.CASCADE,
+        related_name='subscriptions',
+        verbose_name='Адрес',
+    )
+    group = models.ForeignKey(
+        Group,
+        blank=True,
+        null=True,
+        on_delete=models.CASCADE,
+        related_name='webhook_subscriptions',
+        verbose_name='Группа',
+    )
+    author = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        blank=True,
+        null=True,
+        on_delete=models.CASCADE,
+        related_name='webhook_subscriptions',
+        verbose_name='Автор',
+    )
+
+    def __str__(self):
+        return f'{self.endpoint}: {self.group or "*"} / {self.author or "*"}'
+
+    class Meta:
+        verbose_name = 'подписка'
+        verbose_name_plural = 'подписки'
+
+
+class Delivery(models.Model):
+    HELD = 'held'
+    QUEUED = 'queued'
+    SENT = 'sent'
+    DEAD = 'dead'
+    STATUS_CHOICES = (
+        (HELD, 'Ждёт модерации'),
+        (QUEUED, 'В очереди'),
+        (SENT, 'Доставлено'),
+        (DEAD, 'Не доставлено'),
+    )
+
+    endpoint = models.ForeignKey(
+        Endpoint,
+        on_delete=models.CASCADE,
+        related_name='deliveries',
+        verbose_name='Адрес',
+    )
+    event_id = models.CharField('id события', max_length=100)
+    post_id = models.BigIntegerField('id поста', null=True, db_index=True)
+    payload = models.TextField('Событие, JSON')
+    status = models.CharField(
+        'Состояние', max_length=10, choices=STATUS_CHOICES, default=QUEUED
+    )
+    attempts = models.PositiveSmallIntegerField('Попыток', default=0)
+    send_after = models.DateTimeField(
+        'Отправить не раньше', default=timezone.now
+    )
+    last_error = models.TextField('Последняя ошибка', blank=True)
+    created = models.DateTimeField('Создано', auto_now_add=True)
+    sent = models.DateTimeField('Доставлено', blank=True, null=True)
+
+    def __str__(self):
+        return f'{self.event_id} → {self.endpoint}'
+
+    class Meta:
+        ordering = ['-created']
+        unique_together = ['endpoint', 'event_id']
+        indexes = [
+            models.Index(
+                fields=['endpoint', 'status', 'send_after'],
+                name='webhooks_delivery_ready_idx',
+            ),
+        ]
+        verbose_name = 'доставка'
+        verbose_name_plural = 'доставки'
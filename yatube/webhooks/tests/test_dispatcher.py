@@ -0,0 +1,226 @@
+import json
+import threading
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from posts.admin import moderate
+from posts.models import FLAGGED, HIDDEN, VISIBLE, Group, Post
+
+from ..dispatcher import Dispatcher, sign
+from ..models import Delivery, Endpoint, Subscription
+
+User = get_user_model()
+
+
+class HookHandler(BaseHTTPRequestHandler):
+    """Принимает POST и отвечает кодом из ``server.statuses``
+    (по умолчанию 200); соединения держит открытыми."""
+
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        super().setup()
+        self.server.connections += 1
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        self.server.requests.append((dict(self.headers), body))
+        status = self.server.statuses.pop(0) if self.server.statuses else 200
+        self.send_response(status)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+class HookServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), HookHandler)
+        self.connections = 0
+        self.requests = []
+        self.statuses = []
+
+    @property
+    def url(self):
+        return 'http://127.0.0.1:{}/hook'.format(self.server_address[1])
+
+
+@override_settings(
+    WEBHOOK_CIRCUIT_THRESHOLD=2, WEBHOOK_MAX_ATTEMPTS=3,
+    WEBHOOK_BASE_URL='http://testserver',
+)
+class DispatcherTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = HookServer()
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        self.server.connections = 0
+        self.server.requests.clear()
+        self.server.statuses.clear()
+        self.author = User.objects.create_user(username='author')
+        self.other = User.objects.create_user(username='other')
+        self.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание'
+        )
+        self.endpoint = Endpoint.objects.create(
+            url=self.server.url, secret='secret'
+        )
+        self.dispatcher = Dispatcher()
+        self.addCleanup(self.dispatcher.close)
+
+    def events(self, request):
+        return [event['post']['id']
+                for event in json.loads(request[1])['events']]
+
+    def test_subscription_filters(self):
+        Subscription.objects.create(endpoint=self.endpoint, group=self.group)
+        in_group = Post.objects.create(
+            author=self.other, text='В группе', group=self.group
+        )
+        Post.objects.create(author=self.other, text='Без группы')
+        Subscription.objects.create(endpoint=self.endpoint, author=self.author)
+        by_author = Post.objects.create(author=self.author, text='Автора')
+        self.assertEqual(self.dispatcher.dispatch(), 1)
+        self.assertEqual(
+            self.events(self.server.requests[0]), [in_group.pk, by_author.pk]
+        )
+
+    def test_moderated_posts(self):
+        Subscription.objects.create(endpoint=self.endpoint)
+        visible = Post.objects.create(author=self.author, text='Обычный')
+        flagged = Post.objects.create(
+            author=self.author, text='Помеченный', moderation=FLAGGED
+        )
+        Post.objects.create(
+            author=self.author, text='Скрытый', moderation=HIDDEN
+        )
+        self.assertEqual(self.dispatcher.dispatch(), 1)
+        self.assertEqual(self.events(self.server.requests[0]), [visible.pk])
+        self.assertEqual(
+            Delivery.objects.get(status=Delivery.HELD).post_id, flagged.pk
+        )
+        moderate(Post.objects.filter(pk=flagged.pk), VISIBLE)
+        self.assertEqual(self.dispatcher.dispatch(), 1)
+        self.assertEqual(self.events(self.server.requests[1]), [flagged.pk])
+
+        held = Post.objects.create(
+            author=self.author, text='Спам', moderation=FLAGGED
+        )
+        self.dispatcher.dispatch()
+        moderate(Post.objects.filter(pk=held.pk), HIDDEN)
+        self.assertEqual(self.dispatcher.dispatch(), 0)
+        self.assertEqual(len(self.server.requests), 2)
+        self.assertFalse(Delivery.objects.filter(post_id=held.pk).exists())
+
+    def test_batch_is_signed(self):
+        Subscription.objects.create(endpoint=self.endpoint)
+        posts = [
+            Post.objects.create(author=self.author, text=f'Пост {number}')
+            for number in range(3)
+        ]
+        self.assertEqual(self.dispatcher.dispatch(), 1)
+        self.assertEqual(len(self.server.requests), 1)
+        headers, body = self.server.requests[0]
+        self.assertEqual(self.events((headers, body)),
+                         [post.pk for post in posts])
+        self.assertEqual(
+            headers['X-Yatube-Signature'],
+            'sha256=' + sign('secret', headers['X-Yatube-Timestamp'], body),
+        )
+        event = json.loads(body)['events'][0]
+        self.assertEqual(event['post']['author'], 'author')
+        self.assertEqual(
+            event['post']['url'], f'http://testserver/posts/{posts[0].pk}/'
+        )
+        self.assertFalse(
+            Delivery.objects.exclude(status=Delivery.SENT).exists()
+        )
+
+    def test_connection_is_reused(self):
+        Subscription.objects.create(endpoint=self.endpoint)
+        dispatcher = Dispatcher(batch_size=1)
+        self.addCleanup(dispatcher.close)
+        for number in range(3):
+            Post.objects.create(author=self.author, text=f'Пост {number}')
+        dispatcher.collect()
+        while dispatcher.dispatch():
+            pass
+        self.assertEqual(len(self.server.requests), 3)
+        self.assertEqual(self.server.connections, 1)
+
+    def test_retry_with_backoff(self):
+        Subscription.objects.create(endpoint=self.endpoint)
+        Post.objects.create(author=self.author, text='Пост')
+        self.server.statuses.append(500)
+        self.assertEqual(self.dispatcher.dispatch(), 0)
+        delivery = Delivery.objects.get()
+        self.assertEqual(delivery.status, Delivery.QUEUED)
+        self.assertEqual(delivery.attempts, 1)
+        self.assertIn('500', delivery.last_error)
+        self.assertGreater(delivery.send_after, timezone.now())
+        self.assertEqual(self.dispatcher.dispatch(), 0)
+
+        Delivery.objects.update(send_after=timezone.now())
+        self.assertEqual(self.dispatcher.dispatch(), 1)
+        delivery.refresh_from_db()
+        self.assertEqual(delivery.status, Delivery.SENT)
+        self.endpoint.refresh_from_db()
+        self.assertEqual(self.endpoint.failures, 0)
+
+    def test_circuit_breaker(self):
+        Subscription.objects.create(endpoint=self.endpoint)
+        Post.objects.create(author=self.author, text='Пост')
+        self.server.statuses.extend([503, 503])
+        for _ in range(2):
+            Delivery.objects.update(send_after=timezone.now())
+            self.dispatcher.dispatch()
+        self.endpoint.refresh_from_db()
+        self.assertEqual(self.endpoint.failures, 2)
+        self.assertGreater(self.endpoint.open_until, timezone.now())
+
+        Delivery.objects.update(send_after=timezone.now())
+        self.assertEqual(self.dispatcher.dispatch(), 0)
+        self.assertEqual(len(self.server.requests), 2)
+
+        Endpoint.objects.update(
+            open_until=timezone.now() - timedelta(seconds=1)
+        )
+        self.assertEqual(self.dispatcher.dispatch(), 1)
+        self.endpoint.refresh_from_db()
+        self.assertIsNone(self.endpoint.open_until)
+
+    def test_dead_after_max_attempts(self):
+        Subscription.objects.create(endpoint=self.endpoint)
+        Post.objects.create(author=self.author, text='Пост')
+        self.server.statuses.extend([500] * 3)
+        for _ in range(3):
+            Delivery.objects.update(send_after=timezone.now())
+            Endpoint.objects.update(open_until=None)
+            self.dispatcher.dispatch()
+        self.assertEqual(Delivery.objects.get().status, Delivery.DEAD)
+
+    def test_command_drain(self):
+        Subscription.objects.create(endpoint=self.endpoint)
+        Post.objects.create(author=self.author, text='Пост')
+        out = StringIO()
+        call_command('dispatch_webhooks', '--drain', stdout=out)
+        self.assertIn('1', out.getvalue())
+        self.assertEqual(len(self.server.requests), 1)
@@ -11,11 +11,18 @@ https://docs.djangoproject.com/en/2.2/ref/settings/
 """
 
 import os
+import sys
+import tempfile
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
-EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
+# manage.py test или pytest.
+TESTING = sys.argv[1:2] == ['test'] or 'pytest' in sys.modules
+
+EMAIL_BACKEND = 'core.mail.OutboxEmailBackend'
+
+OUTBOX_EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
 
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 
@@ -48,6 +55,8 @@ INSTALLED_APPS = [
     'core.apps.CoreConfig',
     'users.apps.UsersConfig',
     'posts.apps.PostsConfig',
+    'jobs.apps.JobsConfig',
+    'webhooks.apps.WebhooksConfig',
     'django.contrib.admin',
     'django.contrib.auth',
     'django.contrib.contenttypes',
@@ -59,11 +68,16 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.middleware.CachedUserMiddleware',
+    'core.middleware.ProfilerMiddleware',
+    'core.middleware.MemoryMonitorMiddleware',
+    'core.middleware.ReplicaMiddleware',
+    'core.middleware.IdentityMapMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'debug_toolbar.middleware.DebugToolbarMiddleware',
@@ -98,11 +112,65 @@ WSGI_APPLICATION = 'yatube.wsgi.application'
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        'ENGINE': 'core.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        'CONN_MAX_AGE': 600,
+        'OPTIONS': {
+            'timeout': 20,
+            'optimize_on_close': True,
+            'pragmas': {
+                'journal_mode': 'WAL',
+                'synchronous': 'NORMAL',
+                'mmap_size': 256 * 1024 * 1024,
+                'cache_size': -64 * 1024,
+                'busy_timeout': 20000,
+                'temp_store': 'MEMORY',
+            },
+        },
     }
 }
 
+if TESTING:
+    # Второй шард для тестов переноса бакетов (rebalance_shards).
+    DATABASES['shard2'] = {
+        'ENGINE': 'core.db.backends.sqlite3',
+        'NAME': os.path.join(BASE_DIR, 'shard2.sqlite3'),
+    }
+
+DATABASE_ROUTERS = [
+    'posts.routers.ShardRouter',
+    'core.db.routers.ReplicaRouter',
+]
+
+# Алиасы из DATABASES, по которым шардируются посты; пусто — без шардов.
+POST_SHARDS = []
+
+SHARD_MAP_TTL = 5
+
+# Алиасы из DATABASES, которые команда replicate_db держит копиями default.
+REPLICA_DATABASES = []
+
+REPLICA_VIEWS = (
+    'posts:index',
+    'posts:group_list',
+    'posts:profile',
+    'posts:post_detail',
+    'about:author',
+    'about:tech',
+)
+
+REPLICA_PIN_VIEWS = (
+    'posts:post_create',
+    'posts:post_edit',
+    'posts:add_comment',
+    'posts:profile_follow',
+    'posts:profile_unfollow',
+)
+
+REPLICA_PIN_COOKIE = 'pin_primary'
+
+REPLICA_PIN_SECONDS = 30
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -154,6 +222,72 @@ NUMBER_ONE = 1
 
 TEST_NUMBER = 15
 
+POST_EXCERPT_LENGTH = 300
+
+TAG_MAX_PER_POST = 10
+
+TRENDING_WINDOW_HOURS = 24
+
+TRENDING_LIMIT = 10
+
+TRENDING_CACHE_SECONDS = 60
+
+HOT_DECAY_SECONDS = 12 * 60 * 60
+
+HOT_COMMENT_WEIGHT = 1.0
+
+HOT_REACH_WEIGHT = 1.0
+
+HOT_WINDOW_DAYS = 7
+
+HOT_RANK_INTERVAL = 60
+
+FOLLOW_GRAPH_DIR = os.path.join(BASE_DIR, 'cache', 'follow_graph')
+
+FOLLOW_GRAPH_INTERVAL = 600
+
+FOLLOW_GRAPH_CHECK_INTERVAL = 30
+
+FOLLOW_SUGGESTIONS = 5
+
+SIMILAR_POSTS_DIR = os.path.join(BASE_DIR, 'cache', 'similar_posts')
+
+SIMILAR_POSTS_INTERVAL = 300
+
+SIMILAR_POSTS_CHECK_INTERVAL = 30
+
+SIMILAR_POSTS_COUNT = 5
+
+SIMILAR_POSTS_MIN_SCORE = 0.05
+
+SIMILAR_POSTS_FEATURES = 2 ** 18
+
+SIMILAR_POSTS_MAX_DF = 0.01
+
+SIMILAR_POSTS_CHUNK_SIZE = 2000
+
+SIMILAR_POSTS_BLOCK_PAIRS = 4000000
+
+DUPLICATE_ACTION = 'flag'
+
+DUPLICATE_THRESHOLD = 0.8
+
+DUPLICATE_MIN_LENGTH = 50
+
+DUPLICATE_SHINGLE = 5
+
+DUPLICATE_PERMUTATIONS = 64
+
+DUPLICATE_BANDS = 16
+
+DUPLICATE_MAX_CANDIDATES = 1000
+
+DUPLICATE_INDEX_DIR = os.path.join(BASE_DIR, 'cache', 'duplicates')
+
+DUPLICATE_INDEX_INTERVAL = 3600
+
+DUPLICATE_INDEX_CHECK_INTERVAL = 30
+
 LOGIN_URL = 'users:login'
 
 LOGIN_REDIRECT_URL = 'posts:index'
@@ -162,6 +296,156 @@ CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-    }
+        'BACKEND': 'core.cache.backends.LocMemCache',
+        'OPTIONS': {'ALIAS': 'default'},
+    },
+    'shared': {
+        'BACKEND': 'core.cache.backends.FileBasedCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache', 'shared'),
+        'OPTIONS': {'ALIAS': 'shared'},
+    },
+    'two_tier': {
+        'BACKEND': 'core.cache.backends.TwoTierCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache', 'generations'),
+        'OPTIONS': {'ALIAS': 'two_tier', 'L2': 'shared'},
+    },
+    'shm': {
+        'BACKEND': 'core.cache.backends.SharedMemoryCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache', 'shm', 'cache.shm'),
+        'OPTIONS': {'ALIAS': 'shm', 'SIZE': 64 * 1024 * 1024},
+    },
 }
+
+if TESTING:
+    # Общие между процессами кеши тестов — в своём каталоге на прогон,
+    # чтобы версии таблиц и флаги не смешивались с рабочими.
+    _test_cache_dir = tempfile.TemporaryDirectory(prefix='yatube-cache-')
+    for _alias, _name in (
+        ('shared', 'shared'), ('two_tier', 'generations'),
+        ('shm', 'cache.shm'),
+    ):
+        CACHES[_alias]['LOCATION'] = os.path.join(_test_cache_dir.name, _name)
+
+METRICS_DIR = os.path.join(BASE_DIR, 'metrics')
+
+METRICS_NAMESPACES = ('posts', 'users', 'about')
+
+PROFILER_DIR = os.path.join(BASE_DIR, 'profiles')
+
+PROFILER_QUERY_PARAM = '_profile'
+
+PROFILER_INTERVAL = 0.005
+
+PROFILER_MAX_SECONDS = 30
+
+PROFILER_TOKEN_MAX_AGE = 60 * 60
+
+MEMORY_MONITOR_ENABLED = False
+
+MEMORY_SNAPSHOT_INTERVAL = 300
+
+MEMORY_TRACE_FRAMES = 1
+
+MEMORY_TOP_STATS = 10
+
+MEMORY_MAX_RSS_MB = None
+
+MEMORY_RECYCLE_SIGNAL = 'SIGTERM'
+
+WRITE_QUEUE_SIZE = 32
+
+WRITE_QUEUE_TIMEOUT = 10
+
+WRITE_RETRIES = 5
+
+WRITE_RETRY_BACKOFF = 0.05
+
+WRITE_RETRY_MAX_BACKOFF = 1.0
+
+WRITE_DEGRADE_SECONDS = 30
+
+READ_ONLY_MODE = False
+
+READ_ONLY_CACHE_ALIAS = 'shm'
+
+STAMPEDE_STALE_SECONDS = 60
+
+STAMPEDE_LOCK_SECONDS = 10
+
+STAMPEDE_WAIT_SECONDS = 2
+
+STAMPEDE_BETA = 1.0
+
+STAMPEDE_BACKGROUND = True
+
+QUERY_CACHE_ALIAS = 'shm'
+
+QUERY_CACHE_TIMEOUT = 300
+
+HOT_ROW_CACHE_SIZE = 1024
+
+HOT_ROW_TTL = 60
+
+HOT_ROW_NEGATIVE_TTL = 10
+
+JOBS_MAX_ATTEMPTS = 5
+
+JOBS_RETRY_BACKOFF = 2
+
+JOBS_RETRY_MAX_BACKOFF = 600
+
+JOBS_POLL_INTERVAL = 1.0
+
+JOBS_LOCK_TIMEOUT = 300
+
+OUTBOX_BATCH_SIZE = 50
+
+OUTBOX_RATE_LIMIT = 10
+
+OUTBOX_MAX_ATTEMPTS = 5
+
+OUTBOX_RETRY_BACKOFF = 30
+
+OUTBOX_RETRY_MAX_BACKOFF = 3600
+
+OUTBOX_POLL_INTERVAL = 2
+
+CHANGELOG_BATCH_SIZE = 500
+
+CHANGELOG_CACHE_ALIAS = 'shm'
+
+NEW_POSTS_TIMEOUT = 25
+
+NEW_POSTS_CHECK_INTERVAL = 0.5
+
+NEW_POSTS_MAX_WAITERS = 16
+
+NEW_POSTS_RETRY_AFTER = 5
+
+NEW_POSTS_LIMIT = 100
+
+WEBHOOK_BASE_URL = 'http://localhost:8000'
+
+WEBHOOK_BATCH_SIZE = 100
+
+WEBHOOK_TIMEOUT = 5
+
+WEBHOOK_MAX_ATTEMPTS = 8
+
+WEBHOOK_RETRY_BACKOFF = 10
+
+WEBHOOK_RETRY_MAX_BACKOFF = 3600
+
+WEBHOOK_CIRCUIT_THRESHOLD = 5
+
+WEBHOOK_CIRCUIT_SECONDS = 300
+
+WEBHOOK_POLL_INTERVAL = 1
+
+SESSION_ENGINE = 'core.sessions.cached'
+
+SESSION_CACHE_ALIAS = 'shm'
+
+SESSION_WRITE_BEHIND_SECONDS = 30
+
+THUMBNAIL_BACKEND = 'core.thumbnail.MetricsThumbnailBackend'